@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Benchmark of daemon loop against a local fake bot API
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+import importlib
+import optparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import stampy.fakeapi
+import stampy.workload
+
+description = """
+Runs stampy daemon loop against a local fake Telegram bot API and reports
+updates per second, reply latency and API calls per update
+
+"""
+
+# Option parsing
+p = optparse.OptionParser("benchmark.py [arguments]", description=description)
+p.add_option("-n", "--updates", dest="updates", type="int", default=100,
+             help="Number of updates to process")
+p.add_option("-c", "--chats", dest="chats", type="int", default=5,
+             help="Number of chats sending updates")
+p.add_option("-s", "--seed", dest="seed", type="int", default=None,
+             help="Seed for workload generator to repeat same traffic")
+p.add_option("-m", "--mix", dest="mix", action="append", default=[],
+             help="Workload setting as key=value (see stampy/workload.py)")
+p.add_option("-l", "--latency", dest="latency", type="float", default=0,
+             help="Seconds the fake API waits before each answer")
+p.add_option("-j", "--jitter", dest="jitter", type="float", default=0,
+             help="Maximum random seconds added to latency")
+p.add_option("-e", "--errors", dest="errors", type="float", default=0,
+             help="Fraction of API calls answered with an error")
+p.add_option("--error-code", dest="errorcode", type="int", default=500,
+             help="Error code for injected errors (429 adds retry_after)")
+p.add_option("--timeout", dest="timeout", type="int", default=600,
+             help="Maximum seconds to wait for all updates to be processed")
+p.add_option("-k", "--keep", dest="keep", default=False,
+             action="store_true", help="Keep database and log after run")
+
+(options, args) = p.parse_args()
+
+
+def percentile(values, pct):
+    """
+    Gets percentile from a list of values
+    :param values: list of values
+    :param pct: percentile to get (0-100)
+    :return: value at that percentile
+    """
+
+    if not values:
+        return 0
+    values = sorted(values)
+    index = int(round((len(values) - 1) * pct / 100.0))
+    return values[index]
+
+
+def runmain(daemon):
+    """
+    Runs the daemon main loop, which exits via sys.exit
+    :param daemon: stampy.stampy module
+    """
+
+    try:
+        daemon.main()
+    except SystemExit:
+        pass
+
+
+def getmix():
+    """
+    Gets workload settings from command line
+    :return: dict of settings
+    """
+
+    mix = {"chats": options.chats}
+    for setting in options.mix:
+        (key, sep, value) = setting.partition("=")
+        mix[key] = float(value) if "." in value else int(value)
+    return mix
+
+
+def report(fake, count, elapsed, drained):
+    """
+    Prints results of the benchmark
+    :param fake: fake API used
+    :param count: number of updates sent
+    :param elapsed: seconds taken to process them
+    :param drained: seconds taken after that to send replies still queued
+    :return:
+    """
+
+    # Latency from update delivery to first reply for it
+    replies = {}
+    for (date, method, args) in fake.sent:
+        key = (args.get("chat_id"), args.get("reply_to_message_id"))
+        if key in fake.delivered and key not in replies:
+            replies[key] = date - fake.delivered[key]
+    latencies = replies.values()
+
+    calls = sum(fake.calls.values())
+    print "Updates processed:  %s in %.2fs" % (count, elapsed)
+    print "Updates/sec:        %.2f" % (count / elapsed)
+    print "Outbox drained in:  %.2fs" % drained
+    print "Reply latency p50:  %.3fs" % percentile(latencies, 50)
+    print "Reply latency p99:  %.3fs" % percentile(latencies, 99)
+    print "API calls/update:   %.2f" % (float(calls) / count)
+    for method in sorted(fake.calls):
+        print "    %-20s %s (%s errors)" % (method, fake.calls[method],
+                                            fake.errors[method])
+    return
+
+
+def benchmark():
+    """
+    Runs the benchmark
+    :return: exit code
+    """
+
+    fake = stampy.fakeapi.FakeAPI(latency=options.latency,
+                                  jitter=options.jitter,
+                                  errorrate=options.errors,
+                                  errorcode=options.errorcode)
+    url = fake.start()
+
+    (handle, database) = tempfile.mkstemp(suffix=".db")
+    os.close(handle)
+    os.remove(database)
+
+    # Daemon reads its options from command line on import
+    sys.argv = [sys.argv[0], "-b", database, "-t", "benchmark", "-u", url,
+                "-d", "-v", "critical"]
+    daemon = importlib.import_module("stampy.stampy")
+    config = importlib.import_module("stampy.plugin.config")
+    outbox = importlib.import_module("stampy.outbox")
+
+    mix = getmix()
+    stampy.workload.setup(**mix)
+    fake.addupdates(stampy.workload.updates(count=options.updates,
+                                            seed=options.seed, **mix))
+    lastid = str(options.updates)
+
+    thread = threading.Thread(target=runmain, name="daemon", args=(daemon,))
+    thread.daemon = True
+    thread.start()
+
+    start = time.time()
+    done = False
+    while time.time() - start < options.timeout:
+        if config.config(key='lastupdateid') == lastid:
+            done = True
+            break
+        time.sleep(0.05)
+    end = time.time()
+
+    if fake.delivered:
+        start = min(fake.delivered.values())
+
+    # Replies still queued count for latency and calls, so wait for them
+    # and for the daemon loop to finish before the fake API goes away
+    if done:
+        done = outbox.flush(timeout=options.timeout)
+    drained = time.time() - end
+    config.setconfig(key='daemon', value=False)
+    thread.join(timeout=options.timeout)
+    fake.stop()
+
+    if done:
+        report(fake, options.updates, end - start, drained)
+    else:
+        print "Timeout waiting for updates to be processed and replied"
+
+    if not options.keep:
+        name = os.path.splitext(database)[0]
+        for filename in (database, "%s.log" % name,
+                         "%s-deadletter.jsonl" % name):
+            if os.path.exists(filename):
+                os.remove(filename)
+    else:
+        print "Database kept at %s" % database
+
+    if done:
+        return 0
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(benchmark())
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Micro-benchmarks for plugin hot functions, run with `tox -e bench` or
+# `nosetests benchmarks`. Each timing is compared with the one stored in
+# baseline.json and fails if slower than BENCHMARK_THRESHOLD percent
+# (25 by default). Missing entries are added to the baseline, set
+# BENCHMARK_SAVE=1 to store all the new timings as baseline.
+
+import json
+import logging
+import os
+import sys
+import tempfile
+import timeit
+from unittest import TestCase
+
+import stampy.plugin.alias
+import stampy.plugin.autokarma
+import stampy.plugin.config
+import stampy.plugin.karma
+import stampy.plugin.stats
+import stampy.stampy
+import stampy.workload
+
+baselinefile = os.path.join(os.path.dirname(__file__), "baseline.json")
+threshold = float(os.environ.get("BENCHMARK_THRESHOLD", 25))
+save = os.environ.get("BENCHMARK_SAVE", "") not in ["", "0"]
+
+# Rows in tables for functions depending on their size
+sizes = [100, 1000, 10000]
+
+results = {}
+baseline = {}
+if os.path.exists(baselinefile):
+    with open(baselinefile) as f:
+        baseline = json.load(f)
+
+database = stampy.stampy.options.database
+message = next(stampy.workload.updates(count=1, seed=1, date=1478361249))
+
+
+def measure(function, mintime=0.2, repeat=5):
+    """
+    Gets time per call of function, as best of several repeats
+    :param function: function to call without arguments
+    :param mintime: minimum seconds for each repeat
+    :param repeat: number of repeats
+    :return: seconds per call
+    """
+
+    timer = timeit.Timer(function)
+    number = 1
+    while timer.timeit(number) < mintime / 10:
+        number *= 10
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def fill(table, rows):
+    """
+    Replaces contents of table
+    :param table: name of table
+    :param rows: list of tuples to insert
+    :return:
+    """
+
+    stampy.stampy.dbsql("DELETE FROM %s;" % table)
+    if rows:
+        sql = "INSERT INTO %s VALUES(%s);" % (
+              table, ", ".join(["?"] * len(rows[0])))
+        stampy.stampy.dbsql(sql, params=rows, many=True)
+    return
+
+
+def karmarows(size):
+    return [(stampy.workload.getword(index), index) for index in
+            range(0, size)]
+
+
+def setup():
+    # Replies are counted instead of sent, so the time measured is the one
+    # spent preparing them. Log records kept by nose would make timings
+    # grow along the run
+    logging.disable(logging.CRITICAL)
+    (handle, stampy.stampy.options.database) = tempfile.mkstemp(suffix=".db")
+    os.close(handle)
+    os.remove(stampy.stampy.options.database)
+    stampy.stampy.capture["enabled"] = True
+    stampy.plugin.config.setconfig('url', 'https://api.telegram.org/bot')
+    stampy.plugin.config.setconfig('token', 'benchmark')
+    stampy.plugin.config.setconfig('verbosity', 'CRITICAL')
+
+
+def teardown():
+    stampy.stampy.capture["enabled"] = False
+    logging.disable(logging.NOTSET)
+    os.remove(stampy.stampy.options.database)
+    stampy.stampy.options.database = database
+
+    for name in sorted(results):
+        sys.stderr.write("%-30s %10.1f us\n" % (name, results[name] * 1000000))
+
+    if save:
+        baseline.update(results)
+    else:
+        for name in results:
+            baseline.setdefault(name, results[name])
+    with open(baselinefile, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+class TestStampy(TestCase):
+    def setUp(self):
+        self.regressions = []
+
+    def tearDown(self):
+        # Report all sizes measured, not only the first one regressing
+        self.assertEqual(self.regressions, [])
+
+    def check(self, name, function):
+        # Plugins run within the transaction of the batch of updates, and
+        # discarding it keeps table sizes for the next measurement
+        stampy.stampy.dbbegin()
+        try:
+            results[name] = measure(function)
+        finally:
+            stampy.stampy.dbrollback()
+        if name in baseline and not save:
+            limit = baseline[name] * (1 + threshold / 100)
+            if results[name] > limit:
+                self.regressions.append(
+                    "%s regressed: %.1f us, baseline %.1f us" % (
+                        name, results[name] * 1000000,
+                        baseline[name] * 1000000))
+
+    def test_getmsgdetail(self):
+        self.check("getmsgdetail",
+                   lambda: stampy.stampy.getmsgdetail(message))
+
+    def test_karmaprocess(self):
+        for size in sizes:
+            fill("karma", karmarows(size))
+            msgdetail = stampy.stampy.getmsgdetail(message)
+            msgdetail["text"] = "%s++ %s-- and some text" % (
+                stampy.workload.getword(1), stampy.workload.getword(2))
+            self.check("karmaprocess[%s]" % size,
+                       lambda: stampy.plugin.karma.karmaprocess(
+                           dict(msgdetail)))
+
+    def test_getalias(self):
+        for depth in [1, 5, 10]:
+            # Chain of aliases alias0 -> alias1 -> ... -> word
+            rows = [("alias%s" % index, "alias%s" % (index + 1)) for
+                    index in range(0, depth - 1)]
+            rows.append(("alias%s" % (depth - 1), "word"))
+            fill("alias", rows)
+            self.check("getalias[%s]" % depth,
+                       lambda: stampy.plugin.alias.getalias("alias0"))
+
+    def test_autokarmawords(self):
+        text = {"message": dict(message["message"])}
+        for size in sizes[:2]:
+            fill("autokarma", [("autok%s" % index, "value%s" % index) for
+                               index in range(0, size)])
+            text["message"]["text"] = "talking about autok%s" % (size - 1)
+            self.check("autokarmawords[%s]" % size,
+                       lambda: stampy.plugin.autokarma.autokarmawords(text))
+
+    def test_updatestats(self):
+        for size in sizes:
+            fill("stats", [("user", index, "user%s" % index, "2016-11-05",
+                            1, "[]") for index in range(0, size)])
+            self.check("updatestats[%s]" % size,
+                       lambda: stampy.plugin.stats.updatestats(
+                           type="user", id=size // 2, name="user",
+                           date="2016-11-05", memberid=-158164217))
+
+    def test_sendmessage(self):
+        for lines in [10, 100, 1000]:
+            text = "\n".join(["line %s of text" % line for line in
+                              range(0, lines)])
+            self.check("sendmessage[%s]" % lines,
+                       lambda: stampy.stampy.sendmessage(chat_id=-158164217,
+                                                         text=text))
+
+    def test_rank(self):
+        for size in sizes:
+            fill("karma", karmarows(size))
+            word = stampy.workload.getword(size // 2)
+            self.check("rank[%s]" % size,
+                       lambda: stampy.plugin.karma.rank(word))
+            self.check("ranktop[%s]" % size,
+                       lambda: stampy.plugin.karma.rank())
+            self.check("srank[%s]" % size,
+                       lambda: stampy.plugin.karma.srank(word[:3]))
@@ -4,6 +4,12 @@
 # Description: Main module importer
 # Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
 
+import sys
+
+if "--startup-profile" in sys.argv:
+    # Imports are timed from here, so this goes before importing the bot
+    import stampy.startup
+    stampy.startup.install()
 
 import stampy.stampy as stampy
 
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Cache for chat and member details asked to Telegram
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+from __future__ import absolute_import
+
+import collections
+import logging
+import threading
+import time
+
+import stampy.metrics
+import stampy.plugin.config
+
+# (method, chat_id, ...) -> (time it expires, value), oldest used first
+entries = collections.OrderedDict()
+
+# (method, chat_id, ...) -> call being done by another thread
+inflight = {}
+
+# Times each chat was invalidated, to discard answers asked before
+generation = collections.Counter()
+
+lock = threading.Lock()
+
+
+def getkey(method, chat_id, *args):
+    """
+    Gets key for a lookup
+    :param method: API method, like getChatMembersCount
+    :param chat_id: chat asked for
+    :param args: other arguments, like user_id
+    :return: key
+    """
+
+    return (method, str(chat_id)) + tuple(str(arg) for arg in args)
+
+
+def get(key, function):
+    """
+    Gets value for key from cache, or from function if missing or expired,
+    threads asking for the same key meanwhile wait for that same call
+    :param key: key as per getkey
+    :param function: function getting the value when not cached
+    :return: value
+    """
+
+    logger = logging.getLogger(__name__)
+    now = time.time()
+    with lock:
+        if key in entries:
+            (expires, value) = entries.pop(key)
+            if expires > now:
+                # Moved to the end as most recently used
+                entries[key] = (expires, value)
+                stampy.metrics.inc("api_cache", method=key[0], result="hit")
+                return value
+        call = inflight.get(key)
+        leader = call is None
+        if leader:
+            call = {"event": threading.Event(), "value": None, "error": None,
+                    "generation": generation[key[1]]}
+            inflight[key] = call
+
+    if not leader:
+        stampy.metrics.inc("api_cache", method=key[0], result="coalesced")
+        call["event"].wait()
+        if call["error"]:
+            raise call["error"]
+        return call["value"]
+
+    stampy.metrics.inc("api_cache", method=key[0], result="miss")
+    ttl = float(stampy.plugin.config.config(key='cachettl', default=300))
+    size = int(stampy.plugin.config.config(key='cachesize', default=1000))
+    try:
+        call["value"] = function()
+    except Exception, e:
+        call["error"] = e
+        raise
+    finally:
+        with lock:
+            del inflight[key]
+            # Not stored if invalidated while asking or failed
+            if not call["error"] and \
+                    call["generation"] == generation[key[1]]:
+                store(key, call["value"], now + ttl, size)
+        call["event"].set()
+    logger.debug("Cached %s: %s", key, call["value"])
+    return call["value"]
+
+
+def store(key, value, expires, size):
+    """
+    Stores value, forgetting the least recently used when full, called
+    holding the lock
+    :param key: key as per getkey
+    :param value: value to store
+    :param expires: time it expires
+    :param size: maximum number of entries
+    :return:
+    """
+
+    entries[key] = (expires, value)
+    while len(entries) > size:
+        entries.popitem(last=False)
+    return
+
+
+def invalidate(chat_id):
+    """
+    Forgets everything cached about a chat, like when members join or leave
+    :param chat_id: chat to forget
+    :return:
+    """
+
+    logger = logging.getLogger(__name__)
+    chat_id = str(chat_id)
+    with lock:
+        generation[chat_id] += 1
+        for key in [key for key in entries if key[1] == chat_id]:
+            del entries[key]
+    logger.debug("Cache invalidated for chat %s", chat_id)
+    return
+
+
+def clear():
+    """
+    Forgets everything cached
+    :return:
+    """
+
+    with lock:
+        entries.clear()
+    return
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Filter for updates already processed
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+from __future__ import absolute_import
+
+import collections
+import logging
+
+import stampy.plugin.config
+import stampy.stampy
+
+# Keys of recently processed updates, in order and as set for O(1) lookups
+window = {"keys": collections.deque(), "set": set(), "loaded": False,
+          "batch": [], "added": 0}
+
+
+def getkeys(msgdetail):
+    """
+    Gets keys identifying an update
+    :param msgdetail: message details as per getmsgdetail
+    :return: list of keys for update_id and chat_id, message_id pair
+    """
+
+    keys = []
+    if msgdetail["update_id"]:
+        keys.append(("update", msgdetail["update_id"]))
+    if msgdetail["chat_id"] and msgdetail["message_id"]:
+        keys.append(("message", msgdetail["chat_id"],
+                     msgdetail["message_id"]))
+    return keys
+
+
+def windowsize():
+    """
+    Gets number of updates to remember
+    :return: size of window
+    """
+
+    return int(stampy.plugin.config.config(key='dedupwindow', default=1000))
+
+
+def load():
+    """
+    Loads the window from database, keeping the last updates processed
+    :return:
+    """
+
+    size = windowsize()
+    window["keys"] = collections.deque(maxlen=size)
+    window["set"] = set()
+    sql = "SELECT update_id, chat_id, message_id FROM dedup ORDER BY rowid " \
+          "DESC LIMIT %s;" % size
+    cur = stampy.stampy.dbsql(sql)
+    for (update_id, chat_id, message_id) in reversed(cur.fetchall()):
+        remember(getkeys({"update_id": update_id, "chat_id": chat_id,
+                          "message_id": message_id}))
+    window["loaded"] = True
+    return
+
+
+def remember(keys):
+    """
+    Adds keys of an update to the window, forgetting the oldest update
+    when full
+    :param keys: keys to add
+    :return:
+    """
+
+    if len(window["keys"]) == window["keys"].maxlen:
+        window["set"].difference_update(window["keys"].popleft())
+    window["keys"].append(keys)
+    window["set"].update(keys)
+    return
+
+
+def seen(msgdetail):
+    """
+    Checks if an update was already processed
+    :param msgdetail: message details as per getmsgdetail
+    :return: True if any of its keys is in the window
+    """
+
+    if not window["loaded"]:
+        load()
+    for key in getkeys(msgdetail):
+        if key in window["set"]:
+            return True
+    return False
+
+
+def add(msgdetail):
+    """
+    Adds update to the window and database, within batch transaction
+    :param msgdetail: message details as per getmsgdetail
+    :return:
+    """
+
+    if not window["loaded"]:
+        load()
+    keys = getkeys(msgdetail)
+    remember(keys)
+    window["batch"].append(keys)
+
+    sql = "INSERT INTO dedup VALUES(?, ?, ?);"
+    stampy.stampy.dbsql(sql, params=(msgdetail["update_id"] or None,
+                                     msgdetail["chat_id"] or None,
+                                     msgdetail["message_id"] or None))
+
+    # Remove old rows from time to time to keep table size bounded
+    window["added"] += 1
+    if window["added"] >= window["keys"].maxlen:
+        compact()
+    return
+
+
+def commit():
+    """
+    Confirms keys added in the batch
+    :return:
+    """
+
+    window["batch"] = []
+    return
+
+
+def rollback():
+    """
+    Forgets keys added in the batch, as their processing was discarded
+    :return:
+    """
+
+    for keys in window["batch"]:
+        try:
+            window["keys"].remove(keys)
+        except ValueError:
+            # Already out of the window
+            pass
+        window["set"].difference_update(keys)
+    window["batch"] = []
+    return
+
+
+def compact():
+    """
+    Removes rows outside of the window from database
+    :return:
+    """
+
+    logger = logging.getLogger(__name__)
+    sql = "DELETE FROM dedup WHERE rowid <= (SELECT MAX(rowid) FROM dedup)" \
+          " - %s;" % window["keys"].maxlen
+    stampy.stampy.dbsql(sql)
+    window["added"] = 0
+    logger.debug(msg="Compacted dedup table")
+    return
+
+
+def clear():
+    """
+    Empties the window and database table
+    :return:
+    """
+
+    stampy.stampy.dbsql("DELETE FROM dedup;")
+    window["loaded"] = False
+    window["batch"] = []
+    window["added"] = 0
+    return
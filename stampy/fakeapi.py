@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Local stand-in for Telegram bot API used for benchmarks
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+import BaseHTTPServer
+import collections
+import json
+import logging
+import random
+import SocketServer
+import threading
+import time
+import urlparse
+
+
+class FakeAPIHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Answers bot API methods as /bot<token>/<method>?<arguments>, keeping
+    connections open like the real one
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    # Write each answer at once, small writes on a kept alive connection
+    # otherwise wait for delayed acks
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        with self.server.api.lock:
+            self.server.api.connections += 1
+
+    def do_GET(self):
+        (path, sep, query) = self.path.partition("?")
+        method = path.split("/")[-1]
+        args = dict((key, value[0]) for (key, value) in
+                    urlparse.parse_qs(query).iteritems())
+        (code, result) = self.server.api.call(method, args)
+
+        body = json.dumps(result)
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return
+
+    do_POST = do_GET
+
+    def log_message(self, format, *args):
+        return
+
+
+class FakeAPIServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Threaded HTTP server for the fake API
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeAPI(object):
+    """
+    Implements the bot API methods used by stampy, keeping track of the
+    calls received and messages sent
+    """
+
+    methods = ("getUpdates", "sendMessage", "sendSticker", "sendPhoto",
+               "getChatMembersCount", "leaveChat", "setWebhook")
+
+    def __init__(self, latency=0, jitter=0, errorrate=0, errorcode=500,
+                 members=10):
+        """
+        :param latency: seconds to wait before answering each call
+        :param jitter: maximum random seconds added to latency
+        :param errorrate: fraction of calls answered with an error
+        :param errorcode: error code to answer with (429 includes retry_after)
+        :param members: number of members for getChatMembersCount
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.errorrate = errorrate
+        self.errorcode = errorcode
+        self.members = members
+
+        self.lock = threading.Lock()
+        self.updates = collections.deque()
+        self.calls = collections.Counter()
+        self.errors = collections.Counter()
+        # update_id and (chat_id, message_id) delivered, with time
+        self.delivered = {}
+        # (time, method, arguments) for each message, sticker or photo sent
+        self.sent = []
+        # Connections opened by clients
+        self.connections = 0
+        self.server = False
+        self.url = ""
+
+    def start(self, port=0, address="127.0.0.1"):
+        """
+        Starts serving in a background thread
+        :param port: port to listen on (0 for a random one)
+        :param address: address to bind to
+        :return: url to use as 'url' in config
+        """
+
+        logger = logging.getLogger(__name__)
+        self.server = FakeAPIServer((address, int(port)), FakeAPIHandler)
+        self.server.api = self
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  name="fakeapi")
+        thread.daemon = True
+        thread.start()
+        self.url = "http://%s:%s/bot" % self.server.server_address
+        logger.info("Fake API listening on %s", self.url)
+        return self.url
+
+    def stop(self):
+        """
+        Stops serving
+        :return:
+        """
+
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        return
+
+    def addupdates(self, updates):
+        """
+        Queues updates to be returned by getUpdates
+        :param updates: iterable of updates
+        :return:
+        """
+
+        with self.lock:
+            self.updates.extend(updates)
+        return
+
+    def call(self, method, args):
+        """
+        Answers a call to a method
+        :param method: method name
+        :param args: dict of arguments
+        :return: tuple of http code and result
+        """
+
+        delay = self.latency
+        if self.jitter:
+            delay += random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+
+        with self.lock:
+            self.calls[method] += 1
+
+        if self.errorrate and random.random() < self.errorrate:
+            with self.lock:
+                self.errors[method] += 1
+            result = {"ok": False, "error_code": self.errorcode,
+                      "description": "Injected error"}
+            if self.errorcode == 429:
+                result["parameters"] = {"retry_after": 1}
+            return self.errorcode, result
+
+        if method not in self.methods:
+            return 404, {"ok": False, "error_code": 404,
+                         "description": "Not Found"}
+        return 200, {"ok": True, "result": getattr(self, method)(args)}
+
+    def getUpdates(self, args):
+        offset = int(args.get("offset", 0))
+        limit = int(args.get("limit", 100))
+
+        with self.lock:
+            # Asking for an offset confirms all the previous updates
+            while self.updates and self.updates[0]["update_id"] < offset:
+                self.updates.popleft()
+            result = []
+            for update in self.updates:
+                if len(result) >= limit:
+                    break
+                result.append(update)
+
+            now = time.time()
+            for update in result:
+                for kind in ("message", "channel_post"):
+                    if kind in update:
+                        key = (str(update[kind]["chat"]["id"]),
+                               str(update[kind]["message_id"]))
+                        self.delivered.setdefault(key, now)
+                self.delivered.setdefault(update["update_id"], now)
+        return result
+
+    def store(self, method, args):
+        with self.lock:
+            self.sent.append((time.time(), method, args))
+        return {"message_id": len(self.sent), "chat": {"id": args.get(
+                "chat_id")}}
+
+    def sendMessage(self, args):
+        return self.store("sendMessage", args)
+
+    def sendSticker(self, args):
+        return self.store("sendSticker", args)
+
+    def sendPhoto(self, args):
+        return self.store("sendPhoto", args)
+
+    def getChatMembersCount(self, args):
+        return self.members
+
+    def leaveChat(self, args):
+        return True
+
+    def setWebhook(self, args):
+        return True
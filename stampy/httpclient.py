@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Shared HTTP session keeping connections to Telegram alive
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+import threading
+
+import plugin.config
+
+state = {"session": None, "timeout": None}
+lock = threading.Lock()
+
+
+def getsession():
+    """
+    Gets session shared by all threads, creating it on first use
+    :return: requests session
+    """
+
+    with lock:
+        if not state["session"]:
+            # Imported here so one-shot runs without API calls skip it
+            import requests
+            import requests.adapters
+
+            connections = int(plugin.config.config(key='httpconnections',
+                                                   default=10))
+            # Threads wait for a free connection when all are in use
+            # instead of opening more to the same host
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=4, pool_maxsize=connections,
+                pool_block=True)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            state["timeout"] = (
+                float(plugin.config.config(key='httpconnecttimeout',
+                                           default=10)),
+                float(plugin.config.config(key='httptimeout', default=60)))
+            state["session"] = session
+        return state["session"]
+
+
+def getjson(url):
+    """
+    Gets url reusing a pooled connection, gzip is accepted by default
+    :param url: url to get
+    :return: body decoded from JSON, also for HTTP errors
+    """
+
+    session = getsession()
+    return session.get(url, timeout=state["timeout"]).json()
+
+
+def reset():
+    """
+    Closes pooled connections, next call creates a new session with the
+    current settings
+    :return:
+    """
+
+    with lock:
+        session = state["session"]
+        state["session"] = None
+    if session:
+        session.close()
+    return
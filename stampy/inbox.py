@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Durable inbox for updates fetched but not yet processed
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+from __future__ import absolute_import
+
+import datetime
+import json
+import logging
+
+import stampy.scheduler
+import stampy.stampy
+
+# Status of the updates stored in the inbox
+PENDING = 0
+CLAIMED = 1
+DONE = 2
+
+# Seconds between removals of processed updates from the inbox
+compactevery = 600
+
+
+def add(updates):
+    """
+    Stores updates in the inbox with a single transaction before they are
+    acknowledged at the server
+    :param updates: list of updates to store
+    :return: number of updates stored, raises if they couldn't be
+    """
+
+    logger = logging.getLogger(__name__)
+    date = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    rows = [(item['update_id'], PENDING, date, json.dumps(item))
+            for item in updates]
+    if rows:
+        sql = "INSERT OR IGNORE INTO inbox VALUES(?, ?, ?, ?);"
+        stampy.stampy.dbsql(sql, params=rows, many=True, strict=True)
+        logger.debug("Stored %s updates in inbox", len(rows))
+    return len(rows)
+
+
+def pending():
+    """
+    Gets updates not processed yet, releasing the ones that were claimed
+    but never completed (process stopped in the middle)
+    :return: list of updates in update_id order
+    """
+
+    sql = "UPDATE inbox SET status=%s WHERE status=%s;" % (PENDING, CLAIMED)
+    stampy.stampy.dbsql(sql)
+    sql = "SELECT data FROM inbox WHERE status=%s ORDER BY update_id;" % (
+          PENDING)
+    cur = stampy.stampy.dbsql(sql)
+    return [json.loads(row[0]) for row in cur.fetchall()]
+
+
+def claim(updates):
+    """
+    Marks updates as being processed
+    :param updates: list of updates to claim
+    :return:
+    """
+
+    ids = [(item['update_id'],) for item in updates]
+    sql = "UPDATE inbox SET status=%s WHERE update_id=?;" % CLAIMED
+    stampy.stampy.dbsql(sql, params=ids, many=True)
+    return
+
+
+def complete(ids):
+    """
+    Marks updates as processed, to be called within the transaction of
+    the batch so effects and completion are stored together
+    :param ids: list of update_id processed
+    :return:
+    """
+
+    rows = [(update_id,) for update_id in ids]
+    if rows:
+        sql = "UPDATE inbox SET status=%s WHERE update_id=?;" % DONE
+        stampy.stampy.dbsql(sql, params=rows, many=True)
+    return
+
+
+def lastid():
+    """
+    Gets highest update_id stored in the inbox
+    :return: update_id or 0 if empty
+    """
+
+    cur = stampy.stampy.dbsql("SELECT MAX(update_id) FROM inbox;")
+    value = cur.fetchone()
+    if value and value[0]:
+        return value[0]
+    return 0
+
+
+def waiting():
+    """
+    Gets number of updates not yet processed
+    :return: count of pending and claimed updates
+    """
+
+    sql = "SELECT COUNT(*) FROM inbox WHERE status!=%s;" % DONE
+    return stampy.stampy.dbsql(sql).fetchone()[0]
+
+
+def compact():
+    """
+    Removes processed updates from the inbox
+    :return:
+    """
+
+    logger = logging.getLogger(__name__)
+    sql = "DELETE FROM inbox WHERE status=%s;" % DONE
+    stampy.stampy.dbsql(sql)
+    logger.debug(msg="Compacted inbox")
+    return
+
+
+def schedulecompact():
+    """
+    Removes processed updates every compactevery seconds once the
+    scheduler is started, whether they came from polling or the webhook
+    :return:
+    """
+
+    stampy.scheduler.add_job('inboxcompact', compact, 'interval',
+                             seconds=compactevery)
+    return
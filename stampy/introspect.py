@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: On demand CPU profiling and memory snapshots of the daemon
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+import cProfile
+import collections
+import datetime
+import gc
+import pstats
+import resource
+import StringIO
+
+# Profiler only exists between start and stop, so no overhead otherwise
+state = {"profiler": None, "started": None, "types": None}
+
+
+def filename(prefix, kind, extension):
+    """
+    Gets name for a results file
+    :param prefix: path and base name, like the database without extension
+    :param kind: profile or memsnap
+    :param extension: file extension
+    :return: filename with current date
+    """
+
+    return "%s-%s-%s.%s" % (prefix, kind,
+                            datetime.datetime.now().strftime('%Y%m%d%H%M%S'),
+                            extension)
+
+
+def start():
+    """
+    Starts profiling the calling thread, which processes the updates
+    :return: False if already running
+    """
+
+    if state["profiler"]:
+        return False
+    state["profiler"] = cProfile.Profile()
+    state["started"] = datetime.datetime.now()
+    state["profiler"].enable()
+    return True
+
+
+def stop(prefix, limit=15):
+    """
+    Stops profiling and stores the stats in a file
+    :param prefix: path and base name for the file
+    :param limit: number of functions to report
+    :return: tuple of filename and text with top functions, or False
+    """
+
+    profiler = state["profiler"]
+    if not profiler:
+        return False
+    profiler.disable()
+    state["profiler"] = None
+
+    name = filename(prefix, "profile", "prof")
+    profiler.dump_stats(name)
+
+    output = StringIO.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.sort_stats("cumulative").print_stats(limit)
+
+    # Keep only the table, with file paths shortened
+    lines = []
+    for line in output.getvalue().splitlines():
+        if line.strip() and "function calls" not in line and \
+                "Ordered by" not in line and "restriction" not in line:
+            lines.append(line.rstrip().replace(" filename:lineno(function)",
+                                               " function"))
+    text = "Profile since %s stored in %s:\n```\n%s\n```" % (
+        state["started"].strftime('%Y-%m-%d %H:%M:%S'), name,
+        "\n".join([shorten(line) for line in lines]))
+    return name, text
+
+
+def shorten(line):
+    """
+    Removes directories from paths in a pstats line
+    :param line: line of pstats output
+    :return: line with file names only
+    """
+
+    if "/" in line:
+        (head, sep, tail) = line.rpartition(" ")
+        return "%s %s" % (head, tail.rsplit("/", 1)[-1])
+    return line
+
+
+def gettypes():
+    """
+    Counts live objects tracked by the garbage collector by type
+    :return: Counter of type name -> objects
+    """
+
+    gc.collect()
+    types = collections.Counter()
+    for item in gc.get_objects():
+        types[type(item).__name__] += 1
+    return types
+
+
+def memsnap(prefix, limit=15):
+    """
+    Takes a snapshot of live objects by type, stores it in a file and
+    compares it with the previous one
+    :param prefix: path and base name for the file
+    :param limit: number of types to report
+    :return: tuple of filename and text with top types and growth
+    """
+
+    types = gettypes()
+    previous = state["types"]
+    state["types"] = types
+
+    name = filename(prefix, "memsnap", "txt")
+    with open(name, "w") as f:
+        for (typename, count) in types.most_common():
+            f.write("%s %s\n" % (count, typename))
+
+    # Max resident size is in KiB on Linux
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    text = "Memory snapshot stored in %s\n" % name
+    text += "Max RSS: %.1f MiB, objects: %s\n```\n" % (
+        rss / 1024.0, sum(types.values()))
+    text += "%-24s %9s %9s\n" % ("type", "objects", "growth")
+    if previous is None:
+        for (typename, count) in types.most_common(limit):
+            text += "%-24s %9s %9s\n" % (typename[:24], count, "")
+    else:
+        # Types growing most since last snapshot point to leaks
+        growth = types.copy()
+        growth.subtract(previous)
+        for (typename, change) in growth.most_common(limit):
+            text += "%-24s %9s %+9d\n" % (typename[:24], types[typename],
+                                          change)
+    text += "```"
+    return name, text
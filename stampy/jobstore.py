@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Job store for the scheduler keeping jobs in the bot database
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+from __future__ import absolute_import
+
+import cPickle as pickle
+import logging
+
+from apscheduler.job import Job
+from apscheduler.jobstores.base import BaseJobStore, ConflictingIdError, \
+    JobLookupError
+from apscheduler.util import datetime_to_utc_timestamp, \
+    utc_timestamp_to_datetime
+
+import stampy.stampy
+
+
+class SQLiteJobStore(BaseJobStore):
+    """
+    Stores jobs in the jobs table, so their next run survives restarts
+    """
+
+    def lookup_job(self, job_id):
+        cur = stampy.stampy.dbsql("SELECT job_state FROM jobs WHERE id=?;",
+                                  params=(job_id,))
+        row = cur.fetchone()
+        return self.reconstitute(row[0]) if row else None
+
+    def get_due_jobs(self, now):
+        return self.getjobs("WHERE next_run_time <= ?",
+                            (datetime_to_utc_timestamp(now),))
+
+    def get_next_run_time(self):
+        cur = stampy.stampy.dbsql("SELECT next_run_time FROM jobs WHERE "
+                                  "next_run_time IS NOT NULL ORDER BY "
+                                  "next_run_time LIMIT 1;")
+        row = cur.fetchone()
+        return utc_timestamp_to_datetime(row[0]) if row else None
+
+    def get_all_jobs(self):
+        jobs = self.getjobs()
+        self._fix_paused_jobs_sorting(jobs)
+        return jobs
+
+    def add_job(self, job):
+        if self.lookup_job(job.id):
+            raise ConflictingIdError(job.id)
+        stampy.stampy.dbsql("INSERT INTO jobs VALUES(?, ?, ?);",
+                            params=(job.id, datetime_to_utc_timestamp(
+                                job.next_run_time), self.getstate(job)))
+
+    def update_job(self, job):
+        cur = stampy.stampy.dbsql("UPDATE jobs SET next_run_time=?, "
+                                  "job_state=? WHERE id=?;",
+                                  params=(datetime_to_utc_timestamp(
+                                      job.next_run_time), self.getstate(job),
+                                      job.id))
+        if cur.rowcount == 0:
+            raise JobLookupError(job.id)
+
+    def remove_job(self, job_id):
+        cur = stampy.stampy.dbsql("DELETE FROM jobs WHERE id=?;",
+                                  params=(job_id,))
+        if cur.rowcount == 0:
+            raise JobLookupError(job_id)
+
+    def remove_all_jobs(self):
+        stampy.stampy.dbsql("DELETE FROM jobs;")
+
+    def getstate(self, job):
+        """
+        Gets job state to store
+        :param job: job to store
+        :return: pickled state for a BLOB column
+        """
+
+        return buffer(pickle.dumps(job.__getstate__(),
+                                   pickle.HIGHEST_PROTOCOL))
+
+    def reconstitute(self, state):
+        """
+        Gets job back from stored state
+        :param state: pickled state
+        :return: job
+        """
+
+        state = pickle.loads(str(state))
+        state['jobstore'] = self
+        job = Job.__new__(Job)
+        job.__setstate__(state)
+        job._scheduler = self._scheduler
+        job._jobstore_alias = self._alias
+        return job
+
+    def getjobs(self, where="", params=False):
+        """
+        Gets jobs from the table, removing the ones that can't be restored
+        :param where: condition for the jobs to get
+        :param params: values for the placeholders in where
+        :return: list of jobs sorted by next run
+        """
+
+        logger = logging.getLogger(__name__)
+        cur = stampy.stampy.dbsql("SELECT id, job_state FROM jobs %s ORDER "
+                                  "BY next_run_time;" % where, params=params)
+        jobs = []
+        for (job_id, state) in cur.fetchall():
+            try:
+                jobs.append(self.reconstitute(state))
+            except Exception:
+                logger.exception("Unable to restore job %s, removing it",
+                                 job_id)
+                stampy.stampy.dbsql("DELETE FROM jobs WHERE id=?;",
+                                    params=(job_id,))
+        return jobs
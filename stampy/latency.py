@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Latency from Telegram message date to pickup, processing
+#              and reply, per chat and global
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+import collections
+import threading
+import time
+
+import metrics
+
+stages = ["pickup", "processed", "replied"]
+
+# Samples kept for rolling percentiles, globally and for each chat
+globalsamples = 1000
+chatsamples = 100
+maxchats = 1000
+
+# update_id -> time it was received, until processed
+maxpickups = 10000
+
+# (chat_id, message_id) -> date, for messages that may still get a reply
+maxtracked = 1000
+
+samples = {"global": dict((stage, collections.deque(maxlen=globalsamples))
+                          for stage in stages),
+           "chats": collections.OrderedDict()}
+pickups = collections.OrderedDict()
+tracked = collections.OrderedDict()
+lock = threading.Lock()
+
+
+def bounded(items, maxsize):
+    """
+    Removes oldest items of an ordered dict above its size
+    :param items: ordered dict
+    :param maxsize: maximum number of items
+    :return:
+    """
+
+    while len(items) > maxsize:
+        items.popitem(last=False)
+    return
+
+
+def add(stage, chat_id, seconds):
+    """
+    Adds latency sample for a stage
+    :param stage: pickup, processed or replied
+    :param chat_id: chat of the message
+    :param seconds: time since message date
+    :return:
+    """
+
+    seconds = max(0.0, seconds)
+    chat_id = str(chat_id)
+    with lock:
+        samples["global"][stage].append(seconds)
+        chat = samples["chats"].pop(chat_id, None)
+        if chat is None:
+            chat = dict((name, collections.deque(maxlen=chatsamples))
+                        for name in stages)
+        chat[stage].append(seconds)
+        # Most recently active chats are kept at the end
+        samples["chats"][chat_id] = chat
+        bounded(samples["chats"], maxchats)
+    metrics.observe("lag_seconds", seconds, bounds=metrics.lagbounds,
+                    stage=stage)
+    return
+
+
+def pickedup(updates, now=False):
+    """
+    Notes time updates were received from Telegram
+    :param updates: list of updates
+    :param now: time received, for tests
+    :return:
+    """
+
+    if not now:
+        now = time.time()
+    with lock:
+        for update in updates:
+            if 'update_id' in update:
+                pickups[update['update_id']] = now
+        bounded(pickups, maxpickups)
+    return
+
+
+def started(msgdetail, now=False):
+    """
+    Records pickup latency of an update about to be processed
+    :param msgdetail: message details as per getmsgdetail
+    :param now: current time, for tests
+    :return:
+    """
+
+    if not msgdetail["date"] or not msgdetail["chat_id"]:
+        return
+    if not now:
+        now = time.time()
+    with lock:
+        # Updates not seen by getupdates, like replayed ones, start now
+        pickup = pickups.pop(msgdetail["update_id"], now)
+        tracked[(str(msgdetail["chat_id"]),
+                 str(msgdetail["message_id"]))] = msgdetail["date"]
+        bounded(tracked, maxtracked)
+    add("pickup", msgdetail["chat_id"], pickup - msgdetail["date"])
+    return
+
+
+def processed(msgdetail, now=False):
+    """
+    Records processing latency of an update after plugins ran on it
+    :param msgdetail: message details as per getmsgdetail
+    :param now: current time, for tests
+    :return:
+    """
+
+    if not msgdetail["date"] or not msgdetail["chat_id"]:
+        return
+    if not now:
+        now = time.time()
+    add("processed", msgdetail["chat_id"], now - msgdetail["date"])
+    return
+
+
+def replied(chat_id, message_id, now=False):
+    """
+    Records reply latency for the first reply to a message
+    :param chat_id: chat of the message replied
+    :param message_id: message replied
+    :param now: current time, for tests
+    :return:
+    """
+
+    if not message_id:
+        return
+    with lock:
+        date = tracked.pop((str(chat_id), str(message_id)), None)
+    if date is None:
+        return
+    if not now:
+        now = time.time()
+    add("replied", chat_id, now - date)
+    return
+
+
+def percentile(values, pct):
+    """
+    Gets percentile of a list of values
+    :param values: values
+    :param pct: percentile (0-100)
+    :return: value at percentile
+    """
+
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[int(round((len(values) - 1) * pct / 100.0))]
+
+
+def getpercentiles(chat_id=False):
+    """
+    Gets p50, p90 and p99 latency for each stage
+    :param chat_id: chat to get them for, global if False
+    :return: dict of stage -> (count, p50, p90, p99)
+    """
+
+    with lock:
+        if chat_id is False:
+            source = samples["global"]
+        else:
+            source = samples["chats"].get(str(chat_id), {})
+        copies = dict((stage, list(source.get(stage, []))) for stage in
+                      stages)
+
+    result = {}
+    for stage in stages:
+        values = copies[stage]
+        result[stage] = (len(values), percentile(values, 50),
+                         percentile(values, 90), percentile(values, 99))
+    return result
+
+
+def slowest(stage="replied", limit=10):
+    """
+    Gets chats with highest p99 latency for a stage
+    :param stage: pickup, processed or replied
+    :param limit: number of chats to return
+    :return: list of (chat_id, p99)
+    """
+
+    with lock:
+        chats = [(chat_id, list(chat[stage])) for (chat_id, chat) in
+                 samples["chats"].items()]
+    result = [(chat_id, percentile(values, 99)) for (chat_id, values) in
+              chats if values]
+    result.sort(key=lambda item: item[1], reverse=True)
+    return result[:limit]
+
+
+def showlatency(chat_id=False):
+    """
+    Shows latency percentiles globally or for a chat, and slowest chats
+    :param chat_id: chat to show, global if False
+    :return: text with the table
+    """
+
+    if chat_id is False:
+        text = "Latency since message date (last %s updates):\n" % (
+            globalsamples)
+    else:
+        text = "Latency since message date for chat %s:\n" % chat_id
+    text += "```\n"
+    text += "%-10s %6s %8s %8s %8s\n" % ("stage", "count", "p50 s", "p90 s",
+                                         "p99 s")
+    percentiles = getpercentiles(chat_id=chat_id)
+    for stage in stages:
+        (count, p50, p90, p99) = percentiles[stage]
+        text += "%-10s %6s %8.2f %8.2f %8.2f\n" % (stage, count, p50, p90,
+                                                   p99)
+    if chat_id is False:
+        text += "\nSlowest chats to reply (p99 s):\n"
+        for (chat, p99) in slowest():
+            text += "%-16s %8.2f\n" % (chat, p99)
+    text += "```"
+    return text
+
+
+def reset():
+    """
+    Forgets all samples
+    :return:
+    """
+
+    with lock:
+        for stage in stages:
+            samples["global"][stage].clear()
+        samples["chats"].clear()
+        pickups.clear()
+        tracked.clear()
+    return
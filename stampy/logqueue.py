@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Logging handler passing records through a queue to a
+#              background thread that formats and writes them
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+import logging
+import Queue
+import threading
+
+import metrics
+
+# Records waiting to be written, new ones are dropped when full
+maxrecords = 10000
+
+# Marks end of records for the writer thread
+stop = object()
+
+
+class QueueHandler(logging.Handler):
+    """
+    Puts records in a queue so the caller doesn't wait for the disk, they're
+    formatted and written by the handlers in a background thread
+    """
+
+    def __init__(self, handlers, maxsize=maxrecords):
+        logging.Handler.__init__(self)
+        self.handlers = handlers
+        self.queue = Queue.Queue(maxsize=maxsize)
+        self.writer = threading.Thread(target=self.write, name="logwriter")
+        self.writer.daemon = True
+        self.writer.start()
+
+    def emit(self, record):
+        # Message is merged with its args now, as callers may change them
+        # right after logging, the writer only adds time and level. Only
+        # enabled levels get here, so disabled debug calls cost nothing
+        record.msg = record.getMessage()
+        record.args = None
+        # Tracebacks can't be formatted later either, as frames change
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(
+                    record.exc_info)
+            record.exc_info = None
+        try:
+            self.queue.put_nowait(record)
+        except Queue.Full:
+            metrics.inc("log_dropped")
+        return
+
+    def write(self):
+        """
+        Writes records from the queue until stopped
+        :return:
+        """
+
+        while True:
+            record = self.queue.get()
+            if record is stop:
+                break
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    try:
+                        handler.handle(record)
+                    except Exception:
+                        handler.handleError(record)
+        return
+
+    def waiting(self):
+        """
+        Gets number of records not yet written
+        :return: queue size
+        """
+
+        return self.queue.qsize()
+
+    def close(self):
+        # Write what's left before closing the handlers
+        if self.writer.is_alive():
+            self.queue.put(stop)
+            self.writer.join()
+        for handler in self.handlers:
+            handler.close()
+        logging.Handler.close(self)
+        return
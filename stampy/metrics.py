@@ -0,0 +1,434 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Timing histograms for plugins, SQL and API calls, counters
+#              and their export to Prometheus
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+import BaseHTTPServer
+import bisect
+import collections
+import contextlib
+import logging
+import SocketServer
+import threading
+import time
+
+# Upper bound in seconds of each bucket, doubling from 0.1ms to ~52s plus
+# one more bucket for anything slower
+bounds = [0.0001 * 2 ** i for i in range(0, 20)]
+
+# Seconds per slot of the sliding window and number of slots kept
+slotsize = 60
+maxslots = 60
+
+# Bounds for histograms of sizes, like updates per batch
+sizebounds = [1, 2, 5, 10, 20, 50, 100]
+
+# Bounds in seconds for histograms of delays, like polling lag
+lagbounds = [0.5, 1, 2, 5, 10, 30, 60, 300, 600]
+
+# Histograms since start and per slot for each timer name
+timers = {}
+
+# Counters and value histograms by (name, labels)
+counters = collections.Counter()
+values = {}
+
+# Functions returning current value of gauges by (name, labels)
+gauges = {}
+
+# All of them are updated holding the lock just for the update itself
+lock = threading.Lock()
+started = time.time()
+
+
+def newhistogram():
+    """
+    Creates empty histogram
+    :return: histogram as dict
+    """
+
+    return {"count": 0, "total": 0.0, "max": 0.0,
+            "buckets": [0] * (len(bounds) + 1)}
+
+
+def getbucket(seconds):
+    """
+    Gets bucket for a duration
+    :param seconds: duration
+    :return: index of bucket
+    """
+
+    return bisect.bisect_left(bounds, seconds)
+
+
+def add(histogram, seconds, bucket):
+    """
+    Adds duration to histogram
+    :param histogram: histogram to update
+    :param seconds: duration
+    :param bucket: index of bucket for duration
+    :return:
+    """
+
+    histogram["count"] += 1
+    histogram["total"] += seconds
+    if seconds > histogram["max"]:
+        histogram["max"] = seconds
+    histogram["buckets"][bucket] += 1
+    return
+
+
+def record(name, seconds, now=False):
+    """
+    Records a duration for a timer
+    :param name: name of timer, like plugin.karma or sql
+    :param seconds: duration
+    :param now: time of the measurement, for tests
+    :return:
+    """
+
+    if not now:
+        now = time.time()
+    slot = int(now // slotsize)
+    bucket = getbucket(seconds)
+
+    with lock:
+        if name not in timers:
+            timers[name] = {"total": newhistogram(),
+                            "slots": collections.deque(maxlen=maxslots)}
+        timer = timers[name]
+        if not timer["slots"] or timer["slots"][-1][0] != slot:
+            timer["slots"].append((slot, newhistogram()))
+        add(timer["total"], seconds, bucket)
+        add(timer["slots"][-1][1], seconds, bucket)
+    return
+
+
+@contextlib.contextmanager
+def timed(name):
+    """
+    Records the time spent in the with block, even if it raises
+    :param name: name of timer
+    """
+
+    start = time.time()
+    try:
+        yield
+    finally:
+        record(name, time.time() - start)
+
+
+def getkey(name, labels):
+    """
+    Gets key for a metric with labels
+    :param name: name of metric
+    :param labels: dict of labels
+    :return: tuple of name and sorted labels
+    """
+
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """
+    Increments a counter
+    :param name: name of counter, like updates
+    :param value: amount to add
+    :param labels: labels for the counter, like method="sendMessage"
+    :return:
+    """
+
+    key = getkey(name, labels)
+    with lock:
+        counters[key] += value
+    return
+
+
+def observe(name, value, bounds=sizebounds, **labels):
+    """
+    Adds a value to a histogram with fixed bounds
+    :param name: name of histogram, like batch_size
+    :param value: value observed
+    :param bounds: upper bounds of buckets, used when first observed
+    :param labels: labels for the histogram
+    :return:
+    """
+
+    key = getkey(name, labels)
+    with lock:
+        if key not in values:
+            values[key] = {"bounds": bounds, "count": 0, "total": 0.0,
+                           "max": 0.0, "buckets": [0] * (len(bounds) + 1)}
+        histogram = values[key]
+        add(histogram, value, bisect.bisect_left(histogram["bounds"], value))
+    return
+
+
+def gauge(name, function, **labels):
+    """
+    Registers a gauge, which is read when exported
+    :param name: name of gauge, like queue_depth
+    :param function: function returning current value
+    :param labels: labels for the gauge
+    :return:
+    """
+
+    gauges[getkey(name, labels)] = function
+    return
+
+
+def merge(histograms):
+    """
+    Merges several histograms into one
+    :param histograms: list of histograms
+    :return: merged histogram
+    """
+
+    result = newhistogram()
+    for histogram in histograms:
+        result["count"] += histogram["count"]
+        result["total"] += histogram["total"]
+        result["max"] = max(result["max"], histogram["max"])
+        for index, value in enumerate(histogram["buckets"]):
+            result["buckets"][index] += value
+    return result
+
+
+def percentile(histogram, pct):
+    """
+    Gets an upper bound for percentile of durations
+    :param histogram: histogram to check
+    :param pct: percentile (0-100)
+    :return: seconds
+    """
+
+    if not histogram["count"]:
+        return 0.0
+    wanted = histogram["count"] * pct / 100.0
+    seen = 0
+    for index, value in enumerate(histogram["buckets"]):
+        seen += value
+        if seen >= wanted:
+            if index < len(bounds):
+                return min(bounds[index], histogram["max"])
+            break
+    return histogram["max"]
+
+
+def gethistogram(name, window=False, now=False):
+    """
+    Gets histogram for a timer
+    :param name: name of timer
+    :param window: minutes to consider, or since start if False
+    :param now: current time, for tests
+    :return: histogram
+    """
+
+    with lock:
+        if name not in timers:
+            return newhistogram()
+        timer = timers[name]
+        if not window:
+            return merge([timer["total"]])
+        if not now:
+            now = time.time()
+        first = int(now // slotsize) - int(window * 60 // slotsize) + 1
+        return merge([histogram for (slot, histogram) in timer["slots"]
+                      if slot >= first])
+
+
+def top(key="total", window=False, limit=10, now=False):
+    """
+    Gets timers with highest total or p99 time
+    :param key: total or p99
+    :param window: minutes to consider, or since start if False
+    :param limit: number of timers to return
+    :param now: current time, for tests
+    :return: list of (name, count, total, p99) sorted by key
+    """
+
+    with lock:
+        names = list(timers)
+
+    result = []
+    for name in names:
+        histogram = gethistogram(name, window=window, now=now)
+        if histogram["count"]:
+            result.append((name, histogram["count"], histogram["total"],
+                           percentile(histogram, 99)))
+
+    index = 3 if key == "p99" else 2
+    result.sort(key=lambda item: item[index], reverse=True)
+    return result[:limit]
+
+
+def showperf(key="total", window=False):
+    """
+    Shows timers with highest total or p99 time
+    :param key: total or p99
+    :param window: minutes to consider, or since start if False
+    :return: text with the table
+    """
+
+    if window:
+        text = "Top timers by %s over last %s minutes:\n" % (key, window)
+    else:
+        text = "Top timers by %s since %s:\n" % (
+            key, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started)))
+    text += "```\n"
+    text += "%-22s %7s %9s %9s\n" % ("name", "count", "total ms", "p99 ms")
+    for (name, count, total, p99) in top(key=key, window=window):
+        text += "%-22s %7s %9.1f %9.1f\n" % (name[:22], count, total * 1000,
+                                             p99 * 1000)
+    text += "```"
+    return text
+
+
+def reset():
+    """
+    Forgets all the timers
+    :return:
+    """
+
+    global started
+    with lock:
+        timers.clear()
+        counters.clear()
+        values.clear()
+    started = time.time()
+    return
+
+
+def formatlabels(labels):
+    """
+    Formats labels for Prometheus
+    :param labels: tuple of (key, value) pairs
+    :return: text like {key="value"}
+    """
+
+    if not labels:
+        return ""
+    return "{%s}" % ",".join(['%s="%s"' % (key, str(value).replace(
+        "\\", "\\\\").replace('"', '\\"')) for (key, value) in labels])
+
+
+def formathistogram(name, labels, histogram, bounds):
+    """
+    Formats histogram for Prometheus, with cumulative buckets
+    :param name: name of metric
+    :param labels: tuple of (key, value) pairs
+    :param histogram: histogram to format
+    :param bounds: upper bounds of buckets
+    :return: list of lines
+    """
+
+    lines = []
+    seen = 0
+    for (index, bound) in enumerate(bounds + ["+Inf"]):
+        seen += histogram["buckets"][index]
+        lines.append("%s_bucket%s %s" % (name, formatlabels(
+            labels + (("le", bound),)), seen))
+    lines.append("%s_sum%s %s" % (name, formatlabels(labels),
+                                  histogram["total"]))
+    lines.append("%s_count%s %s" % (name, formatlabels(labels),
+                                    histogram["count"]))
+    return lines
+
+
+def exposition():
+    """
+    Gets all metrics in Prometheus text format
+    :return: text
+    """
+
+    logger = logging.getLogger(__name__)
+    lines = []
+    with lock:
+        counted = sorted(counters.items())
+        histograms = sorted((key, dict(value, buckets=list(value["buckets"])))
+                            for (key, value) in values.items())
+        durations = sorted((name, merge([timer["total"]])) for
+                           (name, timer) in timers.items())
+
+    typed = set()
+    for ((name, labels), value) in counted:
+        if name not in typed:
+            lines.append("# TYPE stampy_%s_total counter" % name)
+            typed.add(name)
+        lines.append("stampy_%s_total%s %s" % (name, formatlabels(labels),
+                                               value))
+
+    for ((name, labels), histogram) in histograms:
+        if name not in typed:
+            lines.append("# TYPE stampy_%s histogram" % name)
+            typed.add(name)
+        lines.extend(formathistogram("stampy_%s" % name, labels, histogram,
+                                     histogram["bounds"]))
+
+    if durations:
+        lines.append("# TYPE stampy_duration_seconds histogram")
+    for (name, histogram) in durations:
+        lines.extend(formathistogram("stampy_duration_seconds",
+                                     (("timer", name),), histogram, bounds))
+
+    for ((name, labels), function) in sorted(gauges.items()):
+        try:
+            value = function()
+        except Exception, e:
+            logger.debug("Error reading gauge %s: %s", name, e)
+            continue
+        if name not in typed:
+            lines.append("# TYPE stampy_%s gauge" % name)
+            typed.add(name)
+        lines.append("stampy_%s%s %s" % (name, formatlabels(labels), value))
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Answers scrapes of /metrics
+    """
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = exposition()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return
+
+    def log_message(self, format, *args):
+        return
+
+
+class MetricsServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Threaded HTTP server for metrics
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(port=9090, address="127.0.0.1"):
+    """
+    Starts metrics server in background thread
+    :param port: port to listen on (0 for a random one)
+    :param address: address to bind to (localhost by default)
+    :return: server instance
+    """
+
+    logger = logging.getLogger(__name__)
+    server = MetricsServer((address, int(port)), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics")
+    thread.daemon = True
+    thread.start()
+    logger.info("Metrics available at http://%s:%s/metrics",
+                *server.server_address)
+    return server
@@ -0,0 +1,460 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Queue of outgoing calls sent by worker threads within
+#              Telegram limits per chat and for the whole bot
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+from __future__ import absolute_import
+
+import collections
+import datetime
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import stampy.latency
+import stampy.metrics
+import stampy.plugin.config
+import stampy.stampy
+
+# Chats kept when idle, to remember their bucket
+maxchats = 1000
+
+# Attempts when sending without workers, as the caller waits meanwhile
+syncattempts = 3
+
+# chat_id -> {"queue": deque of calls, "bucket": bucket, "busy": sending}
+chats = {}
+
+# Heap of (time it can send, order, chat_id) for chats with calls waiting
+ready = []
+order = itertools.count()
+
+state = {"workers": [], "stop": False, "bucket": None, "chatrate": 1.0,
+         "globalrate": 30.0, "attempts": 8, "retrydelay": 1.0,
+         "maxdelay": 300.0, "until": 0}
+condition = threading.Condition()
+
+# Writes to the dead letter file, apart so workers don't wait for the disk
+filelock = threading.Lock()
+
+# Calls kept by each thread while its update is being processed
+held = threading.local()
+
+
+def newbucket(rate, now):
+    """
+    Creates a full token bucket
+    :param rate: tokens per second, also the maximum burst
+    :param now: current time
+    :return: bucket as dict
+    """
+
+    rate = float(rate)
+    return {"rate": rate, "capacity": max(1.0, rate), "tokens": max(1.0, rate),
+            "updated": now}
+
+
+def wait(bucket, now):
+    """
+    Gets time until a bucket has a token
+    :param bucket: bucket to check
+    :param now: current time
+    :return: seconds to wait, 0 if a token is available
+    """
+
+    bucket["tokens"] = min(bucket["capacity"], bucket["tokens"] +
+                           (now - bucket["updated"]) * bucket["rate"])
+    bucket["updated"] = now
+    if bucket["tokens"] >= 1:
+        return 0
+    return (1 - bucket["tokens"]) / bucket["rate"]
+
+
+def start(workers=False):
+    """
+    Starts worker threads sending queued calls
+    :param workers: number of threads, from config if not provided
+    :return:
+    """
+
+    logger = logging.getLogger(__name__)
+    if not workers:
+        workers = int(stampy.plugin.config.config(key='outboxworkers',
+                                                  default=4))
+    with condition:
+        if state["workers"]:
+            return
+        state["stop"] = False
+        state["until"] = 0
+        state["chatrate"] = float(stampy.plugin.config.config(
+            key='chatrate', default=1))
+        state["globalrate"] = float(stampy.plugin.config.config(
+            key='globalrate', default=30))
+        state["bucket"] = newbucket(state["globalrate"], time.time())
+        loadretry()
+        for number in range(workers):
+            thread = threading.Thread(target=work, name="outbox-%s" % number)
+            thread.daemon = True
+            thread.start()
+            state["workers"].append(thread)
+    stampy.metrics.gauge("queue_depth", waiting, queue="outbox")
+    logger.debug("Outbox started with %s workers", workers)
+    return
+
+
+def loadretry():
+    """
+    Loads retry policy from config
+    :return:
+    """
+
+    state["attempts"] = int(stampy.plugin.config.config(
+        key='retryattempts', default=8))
+    state["retrydelay"] = float(stampy.plugin.config.config(
+        key='retrydelay', default=1))
+    state["maxdelay"] = float(stampy.plugin.config.config(
+        key='retrymaxdelay', default=300))
+    return
+
+
+def retryable(result):
+    """
+    Checks if a failed call may work later
+    :param result: result of the call
+    :return: True for rate limits, server and network errors
+    """
+
+    # Others like 400 bad request or 403 bot kicked won't change
+    code = result.get('error_code')
+    return not code or code == 429 or code >= 500
+
+
+def backoff(attempts, result):
+    """
+    Gets delay before next attempt, doubling each time with jitter so
+    calls failing together don't retry together
+    :param attempts: attempts done
+    :param result: result of last attempt
+    :return: seconds to wait
+    """
+
+    # Telegram tells how long to wait when limiting us
+    parameters = result.get('parameters') or {}
+    if parameters.get('retry_after'):
+        return float(parameters['retry_after'])
+    delay = min(state["maxdelay"], state["retrydelay"] * 2 ** (attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+
+def attempt(call):
+    """
+    Sends call once
+    :param call: call to send
+    :return: result, with the exception as description if it raised
+    """
+
+    try:
+        return stampy.stampy.apicall(call["url"])
+    except Exception, e:
+        # Network errors include the url, which has the token
+        description = str(e)
+        token = stampy.plugin.config.config(key='token')
+        if token:
+            description = description.replace(token, "<token>")
+        return {"ok": False, "description": description}
+
+
+def deadletter(chat_id, call, result):
+    """
+    Logs call given up to the dead letter file next to the database
+    :param chat_id: chat of the call
+    :param call: call not sent
+    :param result: result of last attempt
+    :return:
+    """
+
+    logger = logging.getLogger(__name__)
+    stampy.metrics.inc("dead_letters", method=call["method"])
+    logger.warning("Giving up sending %s to %s after %s attempts: %s",
+                   call["method"], chat_id, call["attempts"], result)
+    filename = '%s-deadletter.jsonl' % (
+        os.path.splitext(stampy.stampy.options.database)[0])
+    # Only the arguments, as the url includes the token
+    line = json.dumps({"date": datetime.datetime.now().strftime(
+        '%Y-%m-%d %H:%M:%S'), "chat_id": chat_id, "method": call["method"],
+        "attempts": call["attempts"], "result": result,
+        "args": call["url"].partition("?")[2]})
+    try:
+        with filelock:
+            with open(filename, "a") as f:
+                f.write(line + "\n")
+    except IOError, e:
+        logger.error("Error writing dead letter to %s: %s", filename, e)
+    return
+
+
+def hold():
+    """
+    Keeps calls sent from this thread until release(), so they go out once
+    the effects of the update causing them are stored
+    :return:
+    """
+
+    held.calls = []
+    return
+
+
+def release():
+    """
+    Sends calls kept since hold()
+    :return:
+    """
+
+    calls = getattr(held, "calls", None)
+    held.calls = None
+    for (chat_id, method, url, reply_to_message_id) in calls or []:
+        send(chat_id, method, url, reply_to_message_id=reply_to_message_id)
+    return
+
+
+def discard():
+    """
+    Drops calls kept since hold(), as the update causing them failed
+    :return:
+    """
+
+    held.calls = None
+    return
+
+
+def send(chat_id, method, url, reply_to_message_id=False):
+    """
+    Queues call if workers are running, or sends it now retrying a few
+    times if it fails
+    :param chat_id: chat the call goes to
+    :param method: API method, like sendMessage
+    :param url: url for the method including the arguments
+    :param reply_to_message_id: message replied, for latency
+    :return: result of the call, or queued
+    """
+
+    calls = getattr(held, "calls", None)
+    if calls is not None:
+        calls.append((chat_id, method, url, reply_to_message_id))
+        return {"ok": True, "result": "held"}
+
+    if started():
+        return enqueue(chat_id, method, url,
+                       reply_to_message_id=reply_to_message_id)
+
+    loadretry()
+    call = {"method": method, "url": url, "attempts": 0,
+            "reply_to_message_id": reply_to_message_id}
+    while True:
+        result = attempt(call)
+        if result.get('ok'):
+            stampy.latency.replied(chat_id, reply_to_message_id)
+            return result
+        call["attempts"] += 1
+        if not retryable(result) or call["attempts"] >= min(
+                syncattempts, state["attempts"]):
+            deadletter(chat_id, call, result)
+            return result
+        stampy.metrics.inc("retries", method=method)
+        time.sleep(backoff(call["attempts"], result))
+
+
+def started():
+    """
+    Checks if workers are sending queued calls
+    :return: True if started
+    """
+
+    return bool(state["workers"])
+
+
+def enqueue(chat_id, method, url, reply_to_message_id=False):
+    """
+    Queues call to be sent after the ones already queued for the chat
+    :param chat_id: chat the call goes to
+    :param method: API method, like sendMessage
+    :param url: url for the method including the arguments
+    :param reply_to_message_id: message replied, for latency
+    :return: result to return to the caller
+    """
+
+    chat_id = str(chat_id)
+    call = {"method": method, "url": url, "attempts": 0,
+            "reply_to_message_id": reply_to_message_id}
+    with condition:
+        if chat_id not in chats:
+            if len(chats) >= maxchats:
+                prune()
+            chats[chat_id] = {"queue": collections.deque(), "busy": False,
+                              "bucket": newbucket(state["chatrate"],
+                                                  time.time()),
+                              "until": 0}
+        chat = chats[chat_id]
+        chat["queue"].append(call)
+        # Chats already waiting in the heap or sending keep their turn
+        if len(chat["queue"]) == 1 and not chat["busy"]:
+            heapq.heappush(ready, (chat["until"], next(order), chat_id))
+        condition.notify()
+    return {"ok": True, "result": "queued"}
+
+
+def prune():
+    """
+    Forgets idle chats, called holding the condition
+    :return:
+    """
+
+    for chat_id in [chat_id for (chat_id, chat) in chats.items() if
+                    not chat["queue"] and not chat["busy"]]:
+        del chats[chat_id]
+    return
+
+
+def nextcall():
+    """
+    Waits for a chat allowed to send by its bucket and the global one
+    :return: tuple of chat_id and call, or None when stopping
+    """
+
+    with condition:
+        while not state["stop"]:
+            if not ready:
+                condition.wait()
+                continue
+            now = time.time()
+            (when, number, chat_id) = ready[0]
+            if when > now:
+                condition.wait(when - now)
+                continue
+            heapq.heappop(ready)
+            chat = chats[chat_id]
+            delay = max(wait(chat["bucket"], now),
+                        wait(state["bucket"], now), state["until"] - now)
+            if delay:
+                heapq.heappush(ready, (now + delay, number, chat_id))
+                continue
+            chat["bucket"]["tokens"] -= 1
+            state["bucket"]["tokens"] -= 1
+            chat["busy"] = True
+            return chat_id, chat["queue"][0]
+    return None
+
+
+def work():
+    """
+    Sends queued calls until stopped
+    :return:
+    """
+
+    while True:
+        item = nextcall()
+        if item is None:
+            break
+        (chat_id, call) = item
+        done(chat_id, call, attempt(call))
+    return
+
+
+def done(chat_id, call, result):
+    """
+    Removes call from the queue if sent or given up, or leaves it for a
+    retry once the backoff is over, meanwhile other chats go on
+    :param chat_id: chat of the call
+    :param call: call sent
+    :param result: result of the call
+    :return:
+    """
+
+    logger = logging.getLogger(__name__)
+    now = time.time()
+    retry = False
+    if result.get('ok'):
+        stampy.latency.replied(chat_id, call["reply_to_message_id"])
+    else:
+        call["attempts"] += 1
+        retry = retryable(result) and call["attempts"] < state["attempts"]
+        if retry:
+            logger.debug("Error (%s) sending %s, retrying: %s",
+                         call["attempts"], call["method"], result)
+        else:
+            deadletter(chat_id, call, result)
+
+    with condition:
+        chat = chats[chat_id]
+        chat["busy"] = False
+        if retry:
+            stampy.metrics.inc("retries", method=call["method"])
+            chat["until"] = now + backoff(call["attempts"], result)
+            # Flood limits are for the whole bot, so other chats wait too
+            if result.get('error_code') == 429:
+                state["until"] = max(state["until"], chat["until"])
+        else:
+            chat["queue"].popleft()
+        if chat["queue"]:
+            heapq.heappush(ready, (max(now, chat["until"]), next(order),
+                                   chat_id))
+        condition.notify_all()
+    return
+
+
+def waiting():
+    """
+    Gets number of calls queued, including the ones being sent
+    :return: number of calls
+    """
+
+    with condition:
+        return sum(len(chat["queue"]) for chat in chats.values())
+
+
+def flush(timeout=None):
+    """
+    Waits until queued calls are sent
+    :param timeout: maximum seconds to wait
+    :return: True if all were sent
+    """
+
+    limit = time.time() + timeout if timeout is not None else None
+    with condition:
+        while any(chat["queue"] for chat in chats.values()):
+            if not state["workers"]:
+                return False
+            if limit is not None:
+                remaining = limit - time.time()
+                if remaining <= 0:
+                    return False
+                condition.wait(remaining)
+            else:
+                condition.wait(1)
+    return True
+
+
+def stop(timeout=30):
+    """
+    Sends what's queued and stops the workers, calls not sent in time are
+    kept for a later start
+    :param timeout: maximum seconds to wait for queued calls
+    :return:
+    """
+
+    flush(timeout=timeout)
+    with condition:
+        state["stop"] = True
+        workers = state["workers"]
+        state["workers"] = []
+        condition.notify_all()
+    for thread in workers:
+        thread.join()
+    return
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Prefetching of update batches while others are processed
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+import logging
+import Queue
+import threading
+from time import sleep
+
+import inbox
+import plugin.config
+import polling
+
+# Batches fetched and waiting to be processed, created by start()
+batches = Queue.Queue()
+
+# Cleared to stop the fetcher thread
+running = threading.Event()
+
+
+def batchlimit(maxlimit=100):
+    """
+    Gets number of updates to ask for, smaller when the processor is behind
+    :param maxlimit: maximum number of updates per batch
+    :return: limit to use on next getupdates
+    """
+
+    depth = batches.maxsize
+    if depth <= 0:
+        return maxlimit
+    free = depth - batches.qsize()
+    return max(1, maxlimit * free // depth)
+
+
+def putbatch(batch):
+    """
+    Queues batch for processing, waiting while the queue is full
+    :param batch: list of updates
+    :return:
+    """
+
+    logger = logging.getLogger(__name__)
+    logger.debug("Queueing batch of %s updates, %s waiting", len(batch),
+                 batches.qsize())
+    while running.is_set():
+        try:
+            batches.put(batch, timeout=1)
+            break
+        except Queue.Full:
+            continue
+    return
+
+
+def fetch(getupdates, maxlimit=100):
+    """
+    Fetches batches of updates, stores them in the inbox and queues them
+    for processing, blocking when the queue is full
+    :param getupdates: function to get updates from server
+    :param maxlimit: maximum number of updates per batch
+    :return:
+    """
+
+    logger = logging.getLogger(__name__)
+
+    # Updates left in the inbox by a previous run go first
+    pending = inbox.pending()
+    for i in range(0, len(pending), maxlimit):
+        putbatch(pending[i:i + maxlimit])
+
+    # Continue after last update_id processed or already in the inbox
+    offset = max(int(plugin.config.config(key='lastupdateid', default=0)),
+                 inbox.lastid())
+    if offset:
+        offset += 1
+
+    while running.is_set():
+        limit = batchlimit(maxlimit=maxlimit)
+        batch = list(getupdates(offset=offset, limit=limit))
+
+        if batch:
+            # Asking for next ones acknowledges these at the server, so they
+            # must be safe in the inbox before
+            try:
+                inbox.add(batch)
+            except Exception, e:
+                # Same offset next time, so they are fetched again
+                logger.error("Error storing updates in inbox: %s", e)
+                sleep(1)
+                continue
+            offset = max([item['update_id'] for item in batch]) + 1
+            putbatch(batch)
+
+        wait = polling.nextsleep(count=len(batch), limit=limit)
+        if wait:
+            sleep(wait)
+    return
+
+
+def start(getupdates, depth=3, maxlimit=100):
+    """
+    Starts fetcher thread keeping up to depth batches buffered
+    :param getupdates: function to get updates from server
+    :param depth: maximum number of batches waiting to be processed
+    :param maxlimit: maximum number of updates per batch
+    :return: fetcher thread
+    """
+
+    global batches
+    batches = Queue.Queue(maxsize=depth)
+    running.set()
+
+    thread = threading.Thread(target=fetch, name="fetcher",
+                              kwargs={"getupdates": getupdates,
+                                      "maxlimit": maxlimit})
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def stop():
+    """
+    Stops fetcher thread
+    :return:
+    """
+
+    running.clear()
+    return
+
+
+def getbatch(timeout=10):
+    """
+    Gets next batch of updates to process
+    :param timeout: seconds to wait for a batch
+    :return: list of updates, empty if none arrived in time
+    """
+
+    try:
+        batch = batches.get(timeout=timeout)
+    except Queue.Empty:
+        return []
+    inbox.claim(batch)
+    return batch
@@ -6,8 +6,6 @@
 
 import logging
 
-from prettytable import from_db_cursor
-
 import stampy.stampy
 import stampy.plugin.karma
 import stampy.plugin.config
@@ -28,7 +26,7 @@ def run(message):  # do not edit this line
     :return:
     """
     logger = logging.getLogger(__name__)
-    logger.debug(msg="Processing plugin: Code: %s" % __file__)
+    logger.debug("Processing plugin: Code: %s", __file__)
     text = stampy.stampy.getmsgdetail(message)["text"]
     if text:
         if text.split()[0] == "/alias":
@@ -68,9 +66,9 @@ def aliascommands(message):
     who_un = msgdetail["who_un"]
 
     logger = logging.getLogger(__name__)
-    logger.debug(msg="Command: %s by %s" % (texto, who_un))
+    logger.debug("Command: %s by %s", texto, who_un)
     if who_un == stampy.plugin.config.config('owner'):
-        logger.debug(msg="Command: %s by Owner: %s" % (texto, who_un))
+        logger.debug("Command: %s by Owner: %s", texto, who_un)
         try:
             command = texto.split(' ')[1]
         except:
@@ -120,7 +118,7 @@ def deletealias(word):
 
     logger = logging.getLogger(__name__)
     sql = "DELETE FROM alias WHERE key='%s';" % word
-    logger.debug(msg="rmalias: %s" % word)
+    logger.debug("rmalias: %s", word)
     stampy.stampy.dbsql(sql)
     return
 
@@ -153,9 +151,10 @@ def listalias(word=False):
         sql = "select * from alias ORDER BY key ASC;"
         cur = stampy.stampy.dbsql(sql)
         text = "Defined aliases:\n"
+        from prettytable import from_db_cursor
         table = from_db_cursor(cur)
         text = "%s\n```%s```" % (text, table.get_string())
-    logger.debug(msg="Returning aliases %s for word %s" % (text, word))
+    logger.debug("Returning aliases %s for word %s", text, word)
     return text
 
 
@@ -169,8 +168,7 @@ def createalias(word, value):
 
     logger = logging.getLogger(__name__)
     if getalias(value) == word:
-        logger.error(msg="createalias: circular reference %s=%s" % (
-                         word, value))
+        logger.error("createalias: circular reference %s=%s", word, value)
     else:
         if not getalias(word) or getalias(word) == word:
             # Removing duplicates on karma DB and add
@@ -180,7 +178,7 @@ def createalias(word, value):
             stampy.plugin.karma.updatekarma(word=value, change=old)
 
             sql = "INSERT INTO alias VALUES('%s','%s');" % (word, value)
-            logger.debug(msg="createalias: %s=%s" % (word, value))
+            logger.debug("createalias: %s=%s", word, value)
             stampy.stampy.dbsql(sql)
             return
     return False
@@ -198,7 +196,7 @@ def getalias(word):
     sql = "SELECT * FROM alias WHERE key='%s';" % string
     cur = stampy.stampy.dbsql(sql)
     value = cur.fetchone()
-    logger.debug(msg="getalias: %s" % word)
+    logger.debug("getalias: %s", word)
 
     try:
         # Get value from SQL query
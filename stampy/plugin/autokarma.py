@@ -6,8 +6,6 @@
 
 import logging
 
-from prettytable import from_db_cursor
-
 import stampy.stampy
 import stampy.plugin.config
 import stampy.plugin.karma
@@ -72,10 +70,10 @@ def autokcommands(message):
     message_id = msgdetail["message_id"]
     who_un = msgdetail["who_un"]
 
-    logger.debug(msg="Command: %s by %s" % (texto, who_un))
+    logger.debug("Command: %s by %s", texto, who_un)
 
     if who_un == stampy.plugin.config.config('owner'):
-        logger.debug(msg="Command: %s by Owner: %s" % (texto, who_un))
+        logger.debug("Command: %s by Owner: %s", texto, who_un)
         try:
             command = texto.split(' ')[1]
         except:
@@ -138,7 +136,7 @@ def getautok(key):
         # Fill valid values
         value.append(row[1])
 
-    logger.debug(msg="getautok: %s - %s" % (key, value))
+    logger.debug("getautok: %s - %s", key, value)
 
     return value
 
@@ -153,13 +151,12 @@ def getautokeywords():
     sql = "SELECT distinct key FROM autokarma;"
     cur = stampy.stampy.dbsql(sql)
     data = cur.fetchall()
-    print data
     value = []
     for row in data:
         # Fill valid values
         value.append(row[0])
 
-    logger.debug(msg="getautokeywords: %s" % value)
+    logger.debug("getautokeywords: %s", value)
 
     return value
 
@@ -174,11 +171,11 @@ def createautok(word, value):
 
     logger = logging.getLogger(__name__)
     if value in getautok(word):
-        logger.error(msg="createautok: autok pair %s - %s already exists" % (
-                         word, value))
+        logger.error("createautok: autok pair %s - %s already exists",
+                     word, value)
     else:
         sql = "INSERT INTO autokarma VALUES('%s','%s');" % (word, value)
-        logger.debug(msg="createautok: %s=%s" % (word, value))
+        logger.debug("createautok: %s=%s", word, value)
         stampy.stampy.dbsql(sql)
         return True
     return False
@@ -194,7 +191,7 @@ def deleteautok(key, value):
 
     logger = logging.getLogger(__name__)
     sql = "DELETE FROM autokarma WHERE key='%s' and value='%s';" % (key, value)
-    logger.debug(msg="rmautok: %s=%s" % (key, value))
+    logger.debug("rmautok: %s=%s", key, value)
     stampy.stampy.dbsql(sql)
     return True
 
@@ -222,6 +219,7 @@ def listautok(word=False):
     try:
         # Get value from SQL query
         text = "Defined autokarma triggers %s:\n" % wordtext
+        from prettytable import from_db_cursor
         table = from_db_cursor(cur)
         text = "%s\n```%s```" % (text, table.get_string())
 
@@ -229,7 +227,7 @@ def listautok(word=False):
         # Value didn't exist before
         text = "%s has no trigger autokarma" % word
 
-    logger.debug(msg="Returning autokarma %s for word %s" % (text, word))
+    logger.debug("Returning autokarma %s for word %s", text, word)
     return text
 
 
@@ -250,13 +248,14 @@ def autokarmawords(message):
     keywords = getautokeywords()
     for autok in keywords:
         if autok in text_to_process:
-            # If trigger word is there, add the triggered action
-            wordadd.append(getautok(autok) + "++")
+            # If trigger word is there, add the triggered actions
+            for value in getautok(autok):
+                wordadd.append(value + "++")
 
     if wordadd:
         # Reduce text in message to just the words we encountered to optimize
         msgdetail["text"] = " ".join(wordadd)
-        logger.debug(msg="Autokarma words %s encountered for processing" % msgdetail["text"])
+        logger.debug("Autokarma words %s encountered for processing", msgdetail["text"])
         stampy.plugin.karma.karmaprocess(msgdetail)
 
     return
@@ -6,8 +6,6 @@
 
 import logging
 
-from prettytable import from_db_cursor
-
 import stampy.stampy
 
 
@@ -66,7 +64,7 @@ def configcommands(message):
 
     # Only users defined as 'owner' can perform commands
     if who_un == config('owner'):
-        logger.debug(msg="Command: %s by %s" % (texto, who_un))
+        logger.debug("Command: %s by %s", texto, who_un)
         try:
             command = texto.split(' ')[1]
         except:
@@ -139,9 +137,10 @@ def showconfig(key=False):
         sql = "select * from config ORDER BY key ASC;"
         cur = stampy.stampy.dbsql(sql)
         text = "Defined configurations:\n"
+        from prettytable import from_db_cursor
         table = from_db_cursor(cur)
         text = "%s\n```%s```" % (text, table.get_string())
-    logger.debug(msg="Returning config %s for key %s" % (text, key))
+    logger.debug("Returning config %s for key %s", text, key)
     return text
 
 
@@ -182,7 +181,7 @@ def saveconfig(key, value):
     if value:
         sql = "UPDATE config SET value = '%s' WHERE key = '%s';" % (value, key)
         stampy.stampy.dbsql(sql)
-        logger.debug(msg="Updating config for %s with %s" % (key, value))
+        logger.debug("Updating config for %s with %s", key, value)
     return value
 
 
@@ -198,7 +197,7 @@ def setconfig(key, value):
     if config(key=key):
         deleteconfig(key)
     sql = "INSERT INTO config VALUES('%s','%s');" % (key, value)
-    logger.debug(msg="setconfig: %s=%s" % (key, value))
+    logger.debug("setconfig: %s=%s", key, value)
     stampy.stampy.dbsql(sql)
     return
 
@@ -212,6 +211,6 @@ def deleteconfig(word):
 
     logger = logging.getLogger(__name__)
     sql = "DELETE FROM config WHERE key='%s';" % word
-    logger.debug(msg="rmconfig: %s" % word)
+    logger.debug("rmconfig: %s", word)
     stampy.stampy.dbsql(sql)
     return
@@ -7,17 +7,10 @@
 import datetime
 import logging
 
-import dateutil.parser
-import requests
-from lxml import html
-from apscheduler.schedulers.background import BackgroundScheduler
-
+import stampy.scheduler
 import stampy.stampy
 import stampy.plugin.stats
 
-sched = BackgroundScheduler()
-sched.start()
-
 
 def init():
     """
@@ -25,8 +18,7 @@ def init():
     :return:
     """
 
-    sched.add_job(dilbert, 'cron', id='dilbert', hour='10',
-                  replace_existing=True)
+    stampy.scheduler.add_job('dilbert', dilbert, 'cron', hour='10')
 
     return
 
@@ -70,7 +62,9 @@ def dilbertcommands(message):
     who_un = msgdetail["who_un"]
 
     logger = logging.getLogger(__name__)
-    logger.debug(msg="Command: %s by %s" % (texto, who_un))
+    logger.debug("Command: %s by %s", texto, who_un)
+
+    import dateutil.parser
 
     # We might be have been given no command, just /dilbert
     try:
@@ -103,6 +97,9 @@ def dilbert(chat_id=-1001066352913, date=False, reply_to_message_id=""):
     """
     # http://dilbert.com/strip/2016-11-22
 
+    import requests
+    from lxml import html
+
     if not date:
         datetime.datetime.now()
 
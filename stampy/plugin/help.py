@@ -57,7 +57,7 @@ def helpcommands(message):
     who_un = msgdetail["who_un"]
 
     logger = logging.getLogger(__name__)
-    logger.debug(msg="Command: %s by %s" % (texto, who_un))
+    logger.debug("Command: %s by %s", texto, who_un)
 
     # TODO(iranzo) process code
     # Call plugins to process help messages
@@ -66,7 +66,7 @@ def helpcommands(message):
         plugin = stampy.plugins.loadPlugin(i)
         commandtext += plugin.help(message=message)
 
-    logger.debug(msg="Command: %s" % texto)
+    logger.debug("Command: %s", texto)
 
     return stampy.stampy.sendmessage(chat_id=chat_id, text=commandtext,
                                      reply_to_message_id=message_id,
@@ -5,13 +5,24 @@
 # Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
 
 import logging
+import re
 
-from prettytable import from_db_cursor
-
+import stampy.metrics
 import stampy.plugin.alias
 import stampy.stampy
 import stampy.plugin.config
 
+# Texts without any of these have no karma operators, ' and @ are removed
+# so they may be between the signs
+operators = re.compile(u"\\+['@]*\\+|-['@]*-|\u2014")
+
+# Words of 2 or more characters followed by the operator ending them
+karmaword = re.compile(u"(?<![^ ])([^ ]{2,})(\\+\\+|--)(?![^ ])")
+
+# Removed or replaced before looking for karma words, with long dash as --
+replacements = {ord(u"'"): None, ord(u"@"): None, ord(u"\n"): u" ",
+                0x2014: u"--"}
+
 
 def init():
     """
@@ -113,7 +124,7 @@ def karmacommands(message):
         stampy.stampy.sendmessage(chat_id=chat_id, text=commandtext,
                                   reply_to_message_id=message_id,
                                   parse_mode="Markdown")
-        logger.debug(msg="karmacommand:  %s" % word)
+        logger.debug("karmacommand:  %s", word)
     return
 
 
@@ -149,9 +160,10 @@ def rank(word=False):
 
         text = "Global rankings:\n"
         cur = stampy.stampy.dbsql(sql)
+        from prettytable import from_db_cursor
         table = from_db_cursor(cur)
         text = "%s\n```%s```" % (text, table.get_string())
-    logger.debug(msg="Returning karma %s for word %s" % (text, word))
+    logger.debug("Returning karma %s for word %s", text, word)
     return text
 
 
@@ -172,9 +184,10 @@ def srank(word=False):
         string = "%" + word + "%"
         sql = "SELECT * FROM karma WHERE word LIKE '%s' LIMIT 10;" % string
         cur = stampy.stampy.dbsql(sql)
+        from prettytable import from_db_cursor
         table = from_db_cursor(cur)
         text = "%s\n```%s```" % (text, table.get_string())
-    logger.debug(msg="Returning srank for word: %s" % word)
+    logger.debug("Returning srank for word: %s", word)
     return text
 
 
@@ -189,7 +202,7 @@ def updatekarma(word=False, change=0):
     logger = logging.getLogger(__name__)
     value = getkarma(word=word) + change
     putkarma(word, value)
-    logger.debug(msg="Putting karma of %s to %s" % (value, word))
+    logger.debug("Putting karma of %s to %s", value, word)
     return value
 
 
@@ -213,7 +226,7 @@ def getkarma(word):
     except:
         # Value didn't exist before, return 0
         value = 0
-    logger.debug(msg="Getting karma for %s: %s" % (word, value))
+    logger.debug("Getting karma for %s: %s", word, value)
     return value
 
 
@@ -233,19 +246,17 @@ def putkarma(word, value):
         sql = "INSERT INTO karma VALUES('%s','%s');" % (word, value)
         stampy.stampy.dbsql(sql)
 
-    logger.debug(msg="Putting karma of %s to %s" % (value, word))
+    logger.debug("Putting karma of %s to %s", value, word)
     return
 
 
-def stampyphant(chat_id="", karma=0):
+def getsticker(karma=0):
     """
-    Returns a sticker for big karma values
-    :param chat_id:
-    :param karma:
-    :return:
+    Gets sticker for big karma values
+    :param karma: karma value
+    :return: sticker id or empty if value is not big enough
     """
 
-    logger = logging.getLogger(__name__)
     karma = "%s" % karma
     # Sticker definitions for each rank
     x00 = "BQADBAADYwAD17FYAAEidrCCUFH7AgI"
@@ -262,13 +273,7 @@ def stampyphant(chat_id="", karma=0):
         sticker = x000
     elif karma[-2:] == "00":
         sticker = x00
-
-    text = "Sticker for %s karma points" % karma
-
-    if sticker != "":
-        stampy.stampy.sendsticker(chat_id=chat_id, sticker=sticker, text="%s" % text)
-        logger.debug(msg=text)
-    return
+    return sticker
 
 
 def karmawords(message):
@@ -281,81 +286,93 @@ def karmawords(message):
     return
 
 
-def karmaprocess(msgdetail):
+def karmatokens(text):
     """
-    Processes karma operators in text
+    Finds words with karma operators in text
+    :param text: text to process
+    :return: list of (word, operator) in order, without repetitions
+    """
+
+    tokens = []
+    # Most messages have no operators and end here after a single scan
+    if not operators.search(text):
+        return tokens
+    seen = set()
+    for token in karmaword.findall(unicode(text).translate(
+            replacements).lower()):
+        if token not in seen:
+            seen.add(token)
+            tokens.append(token)
+    return tokens
+
+
+def karmawordlist(msgdetail):
+    """
+    Gets words to increase and decrease, with aliases expanded
     :param msgdetail: message details as per getmsgdetail
-    :return:
+    :return: tuple of lists of words to increase and to decrease
     """
 
     logger = logging.getLogger(__name__)
+    wordadd = []
+    worddel = []
+    seen = set()
+    for (word, oper) in karmatokens(msgdetail["text"]):
+        logger.debug("Processing word %s%s sent by id %s with username %s "
+                     "(%s %s)", word, oper, msgdetail["who_id"],
+                     msgdetail["who_un"], msgdetail["who_gn"],
+                     msgdetail["who_ln"])
+        # Aliases may expand to several words, which may be aliases
+        for item in stampy.plugin.alias.getalias(word).split(" "):
+            item = stampy.plugin.alias.getalias(item)
+            if (item, oper) not in seen:
+                seen.add((item, oper))
+                if oper == "++":
+                    wordadd.append(item)
+                else:
+                    worddel.append(item)
+    return wordadd, worddel
 
-    # Define dictionary for text replacements
-    dictionary = {
-        "'": "",
-        "@": "",
-        "\n": " ",
-        u"—": "--"
-    }
 
-    if not msgdetail["error"] and msgdetail["text"]:
-        # Search for telegram commands and if any disable text processing
-        text_to_process = stampy.stampy.replace_all(msgdetail["text"],
-                                                    dictionary).lower().split(
-            " ")
-    else:
-        text_to_process = ""
+def karmaprocess(msgdetail):
+    """
+    Processes karma operators in text
+    :param msgdetail: message details as per getmsgdetail
+    :return:
+    """
 
-    logger.debug(msg="Text to process: %s" % " ".join(text_to_process))
+    logger = logging.getLogger(__name__)
 
     wordadd = []
     worddel = []
+    if not msgdetail["error"] and msgdetail["text"]:
+        (wordadd, worddel) = karmawordlist(msgdetail)
+    added = set(wordadd)
+    removed = set(worddel)
 
-    # If operators are not there, exit faster
-    if "--" in " ".join(text_to_process) or "++" in " ".join(text_to_process):
-        logger.debug(msg="Text has karma operators")
-        for word in text_to_process:
-            if "++" in word or "--" in word:
-                msg = "Processing word"
-                msg += " %s sent by id %s with username %s (%s %s)" % (
-                    word, msgdetail["who_id"], msgdetail["who_un"], msgdetail["who_gn"], msgdetail["who_ln"])
-                logger.debug(msg)
-
-                # This should help to avoid duplicate karma operations
-                # in the same message
-
-                if len(word) >= 4:
-                    oper = word[-2:]
-                    word = word[:-2]
-                    if stampy.plugin.alias.getalias(word):
-                        word = stampy.plugin.alias.getalias(word).split(" ")
-                    for item in word:
-                        if stampy.plugin.alias.getalias(item):
-                            item = stampy.plugin.alias.getalias(item)
-                        if oper == "++" and item not in wordadd:
-                            wordadd.append(item)
-                        if oper == "--" and item not in worddel:
-                            worddel.append(item)
-
+    # Replies for all words go in a single message
+    replies = []
+    stickers = []
     for word in wordadd + worddel:
         change = 0
         oper = False
-        if word in wordadd:
+        if word in added:
             change += 1
             oper = "++"
-        if word in worddel:
+        if word in removed:
             change -= 1
             oper = "--"
 
         if change != 0:
-            msg = "%s Found in %s at %s with id %s (%s)," \
-                  " sent by id %s named %s (%s %s)" % (
-                      oper, word, msgdetail["chat_id"], msgdetail["message_id"],
-                      msgdetail["chat_name"], msgdetail["who_id"],
-                      msgdetail["who_un"], msgdetail["who_gn"], msgdetail["who_ln"])
-            logger.debug(msg)
+            logger.debug("%s Found in %s at %s with id %s (%s), sent by id "
+                         "%s named %s (%s %s)", oper, word,
+                         msgdetail["chat_id"], msgdetail["message_id"],
+                         msgdetail["chat_name"], msgdetail["who_id"],
+                         msgdetail["who_un"], msgdetail["who_gn"],
+                         msgdetail["who_ln"])
 
             karma = updatekarma(word=word, change=change)
+            stampy.metrics.inc("karma_operations", op=oper)
             if karma != 0:
                 # Karma has changed, report back
                 text = "`%s` now has `%s` karma points." % (
@@ -365,10 +382,20 @@ def karmaprocess(msgdetail):
                 text = "`%s` now has no Karma and has" % word
                 text += " been garbage collected."
 
-            # Send originating user for karma change a reply with
-            # the new value
-            stampy.stampy.sendmessage(chat_id=msgdetail["chat_id"], text=text,
-                                      reply_to_message_id=msgdetail["message_id"],
-                                      parse_mode="Markdown")
-            stampyphant(chat_id=msgdetail["chat_id"], karma=karma)
+            replies.append(text)
+            sticker = getsticker(karma)
+            if sticker and sticker not in stickers:
+                stickers.append(sticker)
+
+    if replies:
+        # Send originating user for karma change a reply with
+        # the new values
+        stampy.stampy.sendmessage(chat_id=msgdetail["chat_id"],
+                                  text="\n".join(replies),
+                                  reply_to_message_id=msgdetail["message_id"],
+                                  parse_mode="Markdown")
+    for sticker in stickers:
+        stampy.stampy.sendsticker(chat_id=msgdetail["chat_id"],
+                                  sticker=sticker,
+                                  text="Sticker for karma points")
     return
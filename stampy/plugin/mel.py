@@ -6,17 +6,11 @@
 
 import datetime
 import logging
-import dateutil.parser
-import feedparser
-from lxml import html
-from apscheduler.schedulers.background import BackgroundScheduler
 
+import stampy.scheduler
 import stampy.stampy
 import stampy.plugin.stats
 
-sched = BackgroundScheduler()
-sched.start()
-
 
 def init():
     """
@@ -24,7 +18,7 @@ def init():
     :return:
     """
 
-    sched.add_job(mel, 'cron', id='mel', hour='11', replace_existing=True)
+    stampy.scheduler.add_job('mel', mel, 'cron', hour='11')
 
     return
 
@@ -69,7 +63,9 @@ def melcommands(message):
     who_un = msgdetail["who_un"]
 
     logger = logging.getLogger(__name__)
-    logger.debug(msg="Command: %s by %s" % (texto, who_un))
+    logger.debug("Command: %s by %s", texto, who_un)
+
+    import dateutil.parser
 
     # We might be have been given no command, just /dilbert
     try:
@@ -101,6 +97,10 @@ def mel(chat_id=-1001066091601, date=False, reply_to_message_id=""):
     :return:
     """
 
+    import dateutil.parser
+    import feedparser
+    from lxml import html
+
     url = "http://elchistedemel.blogspot.com/feeds/posts/default"
 
     # Ping chat ID to not have chat removed
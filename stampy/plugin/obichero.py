@@ -6,17 +6,11 @@
 
 import datetime
 import logging
-import dateutil.parser
-import feedparser
-from apscheduler.schedulers.background import BackgroundScheduler
-from lxml import html
 
+import stampy.scheduler
 import stampy.stampy
 import stampy.plugin.stats
 
-sched = BackgroundScheduler()
-sched.start()
-
 
 def init():
     """
@@ -24,8 +18,7 @@ def init():
     :return:
     """
 
-    sched.add_job(obichero, 'cron', id='obichero', hour='11',
-                  replace_existing=True)
+    stampy.scheduler.add_job('obichero', obichero, 'cron', hour='11')
 
     return
 
@@ -70,7 +63,9 @@ def obicherocommands(message):
     who_un = msgdetail["who_un"]
 
     logger = logging.getLogger(__name__)
-    logger.debug(msg="Command: %s by %s" % (texto, who_un))
+    logger.debug("Command: %s by %s", texto, who_un)
+
+    import dateutil.parser
 
     # We might be have been given no command, just /dilbert
     try:
@@ -101,6 +96,10 @@ def obichero(chat_id=-1001069507044, date=False, reply_to_message_id=""):
     :param reply_to_message_id: Id of the message to send reply to
     :return:
     """
+    import dateutil.parser
+    import feedparser
+    from lxml import html
+
     url = "http://obichero.blogspot.com/feeds/posts/default"
 
     # Ping chat ID to not have chat removed
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Plugin for showing timings of plugins, SQL and API calls
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+import logging
+
+import stampy.latency
+import stampy.metrics
+import stampy.querylog
+import stampy.plugin.config
+import stampy.stampy
+
+
+def init():
+    """
+    Initializes module
+    :return:
+    """
+    return
+
+
+def run(message):  # do not edit this line
+    """
+    Executes plugin
+    :param message: message to run against
+    :return:
+    """
+    text = stampy.stampy.getmsgdetail(message)["text"]
+    if text:
+        if text.split()[0] == "/perf":
+            perfcommands(message)
+    return
+
+
+def help(message):  # do not edit this line
+    """
+    Returns help for plugin
+    :param message: message to process
+    :return: help text
+    """
+
+    commandtext = ""
+    if stampy.plugin.config.config(key='owner') == stampy.stampy.getmsgdetail(message)["who_un"]:
+        commandtext = "Use `/perf [total|p99] [minutes]` to get top " \
+                      "plugins, SQL and API calls by time spent since " \
+                      "start or over last minutes\n\n"
+        commandtext += "Use `/perf sql [total|count|max|slow]` to get " \
+                       "top SQL statements, with plan of slow ones\n\n"
+        commandtext += "Use `/perf latency [chat_id]` to get percentiles " \
+                       "of time from message to pickup, processing and " \
+                       "reply\n\n"
+        commandtext += "Use `/perf reset` to start timing again\n\n"
+    return commandtext
+
+
+def perfcommands(message):
+    """
+    Processes perf commands in the messages
+    :param message: message to process
+    :return:
+    """
+
+    logger = logging.getLogger(__name__)
+
+    msgdetail = stampy.stampy.getmsgdetail(message)
+
+    texto = msgdetail["text"]
+    chat_id = msgdetail["chat_id"]
+    message_id = msgdetail["message_id"]
+    who_un = msgdetail["who_un"]
+
+    if who_un == stampy.plugin.config.config('owner'):
+        logger.debug("Owner Perf: %s by %s", texto, who_un)
+
+        key = "total"
+        window = False
+        sql = False
+        latency = False
+        for word in texto.split()[1:]:
+            for case in stampy.stampy.Switch(word):
+                if case('total', 'p99', 'count', 'max', 'slow'):
+                    key = word
+                    break
+                if case('sql'):
+                    sql = True
+                    break
+                if case('latency'):
+                    latency = True
+                    break
+                if case('reset'):
+                    stampy.metrics.reset()
+                    stampy.querylog.reset()
+                    stampy.latency.reset()
+                    key = False
+                    break
+                if case():
+                    try:
+                        window = int(word)
+                    except ValueError:
+                        window = False
+
+        if not key:
+            text = "Timers reset"
+        elif latency:
+            # Number after latency is a chat_id instead of minutes
+            text = stampy.latency.showlatency(chat_id=window)
+        elif sql:
+            text = stampy.querylog.showqueries(key=key)
+        else:
+            text = stampy.metrics.showperf(key=key, window=window)
+        stampy.stampy.sendmessage(chat_id=chat_id, text=text,
+                                  reply_to_message_id=message_id,
+                                  disable_web_page_preview=True,
+                                  parse_mode="Markdown")
+    return
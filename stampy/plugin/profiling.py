@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Plugin for profiling CPU and memory of the running bot
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+import logging
+import os
+
+import stampy.introspect
+import stampy.plugin.config
+import stampy.stampy
+
+
+def init():
+    """
+    Initializes module
+    :return:
+    """
+    return
+
+
+def run(message):  # do not edit this line
+    """
+    Executes plugin
+    :param message: message to run against
+    :return:
+    """
+    text = stampy.stampy.getmsgdetail(message)["text"]
+    if text:
+        if text.split()[0] in ["/profile", "/memsnap"]:
+            profilecommands(message)
+    return
+
+
+def help(message):  # do not edit this line
+    """
+    Returns help for plugin
+    :param message: message to process
+    :return: help text
+    """
+
+    commandtext = ""
+    if stampy.plugin.config.config(key='owner') == stampy.stampy.getmsgdetail(message)["who_un"]:
+        commandtext = "Use `/profile start` and `/profile stop` to " \
+                      "profile processing of updates and get top " \
+                      "functions\n\n"
+        commandtext += "Use `/memsnap` to get objects in memory by type " \
+                       "and growth since previous snapshot\n\n"
+    return commandtext
+
+
+def getprefix():
+    """
+    Gets path and base name for result files, next to the database
+    :return: database file name without extension
+    """
+
+    return os.path.splitext(os.path.abspath(
+        stampy.stampy.options.database))[0]
+
+
+def profilecommands(message):
+    """
+    Processes profile and memsnap commands in the messages
+    :param message: message to process
+    :return:
+    """
+
+    logger = logging.getLogger(__name__)
+
+    msgdetail = stampy.stampy.getmsgdetail(message)
+
+    texto = msgdetail["text"]
+    chat_id = msgdetail["chat_id"]
+    message_id = msgdetail["message_id"]
+    who_un = msgdetail["who_un"]
+
+    if who_un == stampy.plugin.config.config('owner'):
+        logger.debug("Owner Profile: %s by %s", texto, who_un)
+        command = texto.split()[0]
+        try:
+            action = texto.split()[1]
+        except IndexError:
+            action = False
+
+        text = False
+        for case in stampy.stampy.Switch(command):
+            if case('/memsnap'):
+                (name, text) = stampy.introspect.memsnap(prefix=getprefix())
+                logger.info("Memory snapshot stored in %s", name)
+                break
+            if case('/profile'):
+                if action == "start":
+                    if stampy.introspect.start():
+                        text = "Profiling started"
+                    else:
+                        text = "Profiling already running"
+                elif action == "stop":
+                    result = stampy.introspect.stop(prefix=getprefix())
+                    if result:
+                        (name, text) = result
+                        logger.info("Profile stored in %s", name)
+                    else:
+                        text = "Profiling not running"
+                break
+
+        if text:
+            stampy.stampy.sendmessage(chat_id=chat_id, text=text,
+                                      reply_to_message_id=message_id,
+                                      disable_web_page_preview=True,
+                                      parse_mode="Markdown")
+    return
@@ -64,7 +64,7 @@ def quotecommands(message):
     who_un = msgdetail["who_un"]
 
     logger = logging.getLogger(__name__)
-    logger.debug(msg="Command: %s by %s" % (texto, who_un))
+    logger.debug("Command: %s by %s", texto, who_un)
 
     # We might be have been given no command, just /quote
     try:
@@ -136,7 +136,7 @@ def getquote(username=False):
         sql = "SELECT * FROM quote ORDER BY RANDOM() LIMIT 1;"
     cur = stampy.stampy.dbsql(sql)
     value = cur.fetchone()
-    logger.debug(msg="getquote: %s" % username)
+    logger.debug("getquote: %s", username)
     try:
         # Get value from SQL query
         (quoteid, username, date, quote) = value
@@ -167,7 +167,7 @@ def addquote(username=False, date=False, text=False):
     sql = "INSERT INTO quote(username, date, text) VALUES('%s','%s', '%s');" % (
           username, date, text)
     cur = stampy.stampy.dbsql(sql)
-    logger.debug(msg="createquote: %s=%s on %s" % (username, text, date))
+    logger.debug("createquote: %s=%s on %s", username, text, date)
     # Retrieve last id
     sql = "select last_insert_rowid();"
     cur = stampy.stampy.dbsql(sql)
@@ -184,5 +184,5 @@ def deletequote(id=False):
 
     logger = logging.getLogger(__name__)
     sql = "DELETE FROM quote WHERE id='%s';" % id
-    logger.debug(msg="deletequote: %s" % id)
+    logger.debug("deletequote: %s", id)
     return stampy.stampy.dbsql(sql)
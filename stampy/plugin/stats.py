@@ -7,18 +7,13 @@
 import datetime
 import json
 import logging
-import urllib
-
-from prettytable import from_db_cursor
 
+import stampy.apicache
 import stampy.stampy
 import stampy.plugin.config
 import stampy.plugin.karma
-
-from apscheduler.schedulers.background import BackgroundScheduler
-
-sched = BackgroundScheduler()
-sched.start()
+import stampy.polling
+import stampy.scheduler
 
 
 def init():
@@ -26,10 +21,10 @@ def init():
     Initializes module
     :return:
     """
-    sched.add_job(dochatcleanup, 'interval', minutes=int(stampy.plugin.config.config('sleep')), id='dochatcleanup',
-                  replace_existing=True)
-    sched.add_job(dousercleanup, 'interval', minutes=int(stampy.plugin.config.config('sleep')), id='dousercleanup',
-                  replace_existing=True)
+    stampy.scheduler.add_job('dochatcleanup', dochatcleanup, 'interval',
+                             minutes=int(stampy.plugin.config.config('sleep')))
+    stampy.scheduler.add_job('dousercleanup', dousercleanup, 'interval',
+                             minutes=int(stampy.plugin.config.config('sleep')))
 
     return
 
@@ -52,6 +47,12 @@ def run(message):  # do not edit this line
         updatestats(type="user", id=msgdetail["who_id"], name=msgdetail["name"], date=msgdetail["datefor"],
                     memberid=msgdetail["chat_id"])
 
+    # Cached member counts change when someone joins or leaves
+    update = message.get('message', {})
+    if 'new_chat_member' in update or 'new_chat_members' in update or \
+            'left_chat_member' in update:
+        stampy.apicache.invalidate(msgdetail["chat_id"])
+
     if text:
         if text.split()[0] == "/stats":
             statscommands(message)
@@ -74,6 +75,8 @@ def help(message):  # do not edit this line
     if stampy.plugin.config.config(key='owner') == stampy.stampy.getmsgdetail(message)["who_un"]:
         commandtext += "Use `/stats show <user|chat>` " \
                        "to get stats on last usage\n\n"
+        commandtext += "Use `/stats polling` " \
+                       "to get polling interval decisions\n\n"
     return commandtext
 
 
@@ -94,7 +97,7 @@ def statscommands(message):
     who_un = msgdetail["who_un"]
 
     if who_un == stampy.plugin.config.config('owner'):
-        logger.debug(msg="Owner Stat: %s by %s" % (texto, who_un))
+        logger.debug("Owner Stat: %s by %s", texto, who_un)
         try:
             command = texto.split(' ')[1]
         except:
@@ -117,6 +120,13 @@ def statscommands(message):
                 dochatcleanup()
 
                 break
+            if case('polling'):
+                text = stampy.polling.showpolling()
+                stampy.stampy.sendmessage(chat_id=chat_id, text=text,
+                                          reply_to_message_id=message_id,
+                                          disable_web_page_preview=True,
+                                          parse_mode="Markdown")
+                break
             if case():
                 break
 
@@ -135,10 +145,11 @@ def showstats(type=False):
     else:
         sql = "select * from stats ORDER BY count DESC"
     cur = stampy.stampy.dbsql(sql)
+    from prettytable import from_db_cursor
     table = from_db_cursor(cur)
     text = "Defined stats:\n"
     text = "%s\n```%s```" % (text, table.get_string())
-    logger.debug(msg="Returning stats %s" % text)
+    logger.debug("Returning stats %s", text)
     return text
 
 
@@ -185,9 +196,8 @@ def updatestats(type=False, id=0, name=False, date=False, memberid=[]):
     sql = "INSERT INTO stats VALUES('%s', '%s', '%s', '%s', '%s', '%s');" % (
         type, id, name, date, count, json.dumps(newmemberid))
 
-    logger.debug(msg="values: type:%s, id:%s, name:%s, date:%s, count:%s, "
-                     "memberid: %s" % (type, id, name, date, count,
-                                       newmemberid))
+    logger.debug("values: type:%s, id:%s, name:%s, date:%s, count:%s, "
+                 "memberid: %s", type, id, name, date, count, newmemberid)
 
     if id:
         try:
@@ -199,7 +209,7 @@ def updatestats(type=False, id=0, name=False, date=False, memberid=[]):
 
 def getchatmemberscount(chat_id=False):
     """
-    Get number of users in the actual chat_id
+    Get number of users in the actual chat_id, cached for a while
     :param chat_id: Channel ID to query for the number of users
     :return: number of members in chat ID.
     """
@@ -208,12 +218,15 @@ def getchatmemberscount(chat_id=False):
     url = "%s%s/getChatMembersCount?chat_id=%s" % (stampy.plugin.config.config(key='url'),
                                                    stampy.plugin.config.config(key='token'),
                                                    chat_id)
+    key = stampy.apicache.getkey("getChatMembersCount", chat_id)
     try:
-        result = str(json.load(urllib.urlopen(url))['result'])
+        # Errors raise so they are not cached
+        result = str(stampy.apicache.get(
+            key, lambda: stampy.stampy.apicall(url)['result']))
     except:
         result = 0
 
-    logger.info(msg="Chat id %s users %s" % (chat_id, result))
+    logger.info("Chat id %s users %s", chat_id, result)
     return result
 
 
@@ -228,11 +241,11 @@ def getoutofchat(chat_id=False):
                                          stampy.plugin.config.config(key='token'),
                                          chat_id)
     try:
-        result = str(json.load(urllib.urlopen(url))['result'])
+        result = str(stampy.stampy.apicall(url)['result'])
     except:
         result = 0
 
-    logger.info(msg="Chat id %s left" % chat_id)
+    logger.info("Chat id %s left", chat_id)
     return result
 
 
@@ -259,7 +272,7 @@ def dochatcleanup(chat_id=False,
         chatid = row[1]
         chatids.append(chatid)
 
-    logger.debug(msg="Processing chat_ids for cleanup: %s" % chatids)
+    logger.debug("Processing chat_ids for cleanup: %s", chatids)
 
     for chatid in chatids:
         (type, id, name, date, count, memberid) = getstats(type='chat',
@@ -272,8 +285,8 @@ def dochatcleanup(chat_id=False,
         now = datetime.datetime.now()
 
         if (now - chatdate).days > maxage:
-            logger.debug(msg="CHAT ID %s with name %s and %s inactivity days is going to be purged" % (
-                chatid, name, (now - chatdate).days))
+            logger.debug("CHAT ID %s with name %s and %s inactivity days is going to be purged",
+                         chatid, name, (now - chatdate).days)
             # The last update was older than maxage days ago, get out of chat and
             #  remove karma
             texto = "Due to inactivity of more than %s days, this bot will " \
@@ -292,7 +305,7 @@ def dochatcleanup(chat_id=False,
 
             for line in cur:
                 (type, id, name, date, count, memberid) = line
-                logger.debug(msg="LINE for user %s and memberid: %s will be deleted" % (name, memberid))
+                logger.debug("LINE for user %s and memberid: %s will be deleted", name, memberid)
                 memberid.remove(chatid)
                 # Update stats entry in database without the removed chat
                 updatestats(type=type, id=id, name=name, date=date, memberid=memberid)
@@ -322,7 +335,7 @@ def dousercleanup(user_id=False,
         userid = row[1]
         userids.append(userid)
 
-    logger.debug(msg="Processing userids for cleanup: %s" % userids)
+    logger.debug("Processing userids for cleanup: %s", userids)
 
     for userid in userids:
         (type, id, name, date, count, memberid) = getstats(type='user',
@@ -335,8 +348,8 @@ def dousercleanup(user_id=False,
         now = datetime.datetime.now()
 
         if (now - chatdate).days > maxage:
-            logger.debug(msg="USER ID %s with name %s and %s inactivity days is going to be purged" % (
-                userid, name, (now - chatdate).days))
+            logger.debug("USER ID %s with name %s and %s inactivity days is going to be purged",
+                         userid, name, (now - chatdate).days)
 
             # Remove channel stats
             sql = "DELETE from stats where id='%s';" % userid
@@ -348,7 +361,7 @@ def dousercleanup(user_id=False,
 
             for line in cur:
                 (type, id, name, date, count, memberid) = line
-                logger.debug(msg="LINE for user %s and memberid: %s will be deleted" % (name, memberid))
+                logger.debug("LINE for user %s and memberid: %s will be deleted", name, memberid)
                 memberid.remove(userid)
                 # Update stats entry in database without the removed chat
                 updatestats(type=type, id=id, name=name, date=date, memberid=memberid)
@@ -385,8 +398,8 @@ def getstats(type=False, id=0, name=False, date=False, count=0):
     if not count:
         count = 0
 
-    logger.debug(msg="values: type:%s, id:%s, name:%s, date:%s, count:%s, "
-                     "memberid:%s" % (type, id, name, date, count, memberid))
+    logger.debug("values: type:%s, id:%s, name:%s, date:%s, count:%s, "
+                 "memberid:%s", type, id, name, date, count, memberid)
 
     # Ensure we return the modified values
     return type, id, name, date, count, memberid
@@ -448,7 +461,7 @@ def pingchat(chatid):
     date = datetime.datetime.now()
     datefor = datetime.datetime.fromtimestamp(float(date)).strftime('%Y-%m-%d '
                                                                     '%H:%M:%S')
-    logger.debug(msg="Pinging chat %s: %name on %s" % (chatid, name, datefor))
+    logger.debug("Pinging chat %s: %s on %s", chatid, name, datefor)
     updatestats(type="chat", id=chatid, name=name,
                 date=datefor, memberid=memberid)
     return
@@ -9,7 +9,6 @@
 import json
 import logging
 import urllib2
-import requests
 
 import stampy.stampy
 import stampy.plugin.config
@@ -56,6 +55,7 @@ class CurrencyConverter:
         split1 = (': 1 %s = ') % 'United States Dollar'
         strip1 = (' %s</h3>') % 'Euro'
 
+        import requests
         rate = requests.get(url)
         a = float(rate.text.split(split1)[1].split(strip1)[0].strip())
         return a
@@ -97,7 +97,7 @@ def stock(message):
     message_id = msgdetail["message_id"]
     who_un = msgdetail["who_un"]
 
-    logger.debug(msg="Command: %s by %s" % (texto, who_un))
+    logger.debug("Command: %s by %s", texto, who_un)
 
     # We might be have been given no command, just stock
     try:
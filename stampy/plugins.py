@@ -8,10 +8,14 @@
 import imp
 import os
 import logging
+import sys
 
 PluginFolder = "./stampy/plugin"
 MainModule = "__init__"
 
+# Plugins found, scanned again only when the folder changes
+found = {"mtime": None, "plugins": []}
+
 
 def getPlugins():
     """
@@ -20,6 +24,11 @@ def getPlugins():
     """
 
     logger = logging.getLogger(__name__)
+
+    # Called for every update, so avoid listing the folder each time
+    mtime = os.stat(PluginFolder).st_mtime
+    if mtime == found["mtime"]:
+        return found["plugins"]
     plugins = []
 
     possibleplugins = os.listdir(PluginFolder)
@@ -31,9 +40,14 @@ def getPlugins():
         except:
             info = False
         if i and info:
-            logger.debug(msg="Plugging added: %s" % i)
+            # File is opened again when loading the plugin
+            if info[0]:
+                info[0].close()
+            logger.debug("Plugging added: %s", i)
             plugins.append({"name": i, "info": info})
 
+    found["mtime"] = mtime
+    found["plugins"] = plugins
     return plugins
 
 
@@ -43,4 +57,17 @@ def loadPlugin(plugin):
     :param plugin: plugin to load
     :return: loader for plugin
     """
-    return imp.load_module("stampy.stampy." + plugin["name"], *plugin["info"])
+
+    # Load each plugin once instead of running its code for every update
+    name = "stampy.stampy." + plugin["name"]
+    if name in sys.modules:
+        return sys.modules[name]
+
+    (handle, path, description) = plugin["info"]
+    if handle:
+        handle = open(path, description[1])
+    try:
+        return imp.load_module(name, handle, path, description)
+    finally:
+        if handle:
+            handle.close()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Adaptive polling interval based on observed message rates
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+import datetime
+import json
+import logging
+
+import plugin.config
+
+# Weight of the newest batch in the moving averages
+alpha = 0.2
+
+# Moving averages of updates per batch: global and per hour of the day
+rates = {"batch": 0.0, "hours": [0.0] * 24, "loaded": False,
+         "savedhour": None}
+
+# Last decision taken, reported via /stats polling
+decision = {"count": 0, "hour": 0, "expected": 0.0, "sleep": 0,
+            "minsleep": 0, "maxsleep": 0}
+
+
+def loadrates():
+    """
+    Loads the stored moving averages from the database
+    :return:
+    """
+
+    logger = logging.getLogger(__name__)
+    try:
+        stored = json.loads(plugin.config.config(key='pollrates'))
+        rates["batch"] = float(stored["batch"])
+        rates["hours"] = [float(value) for value in stored["hours"]][0:24]
+    except (ValueError, KeyError, TypeError):
+        logger.debug(msg="No stored polling rates, starting from scratch")
+    rates["loaded"] = True
+    return
+
+
+def saverates():
+    """
+    Stores the moving averages in the database to survive restarts
+    :return:
+    """
+
+    value = json.dumps({"batch": round(rates["batch"], 3),
+                        "hours": [round(i, 3) for i in rates["hours"]]})
+    plugin.config.setconfig(key='pollrates', value=value)
+    return
+
+
+def nextsleep(count=0, limit=100, now=False):
+    """
+    Records the number of updates in last batch and returns the time to
+    wait before polling again, using 'sleep' from config as maximum
+    :param count: number of updates received in last batch
+    :param limit: maximum number of updates requested in last batch
+    :param now: datetime of the batch, defaults to current time
+    :return: seconds to sleep
+    """
+
+    logger = logging.getLogger(__name__)
+
+    if not rates["loaded"]:
+        loadrates()
+    if not now:
+        now = datetime.datetime.now()
+    hour = now.hour
+
+    rates["batch"] = alpha * count + (1 - alpha) * rates["batch"]
+    rates["hours"][hour] = alpha * count + (1 - alpha) * rates["hours"][hour]
+
+    maxsleep = int(plugin.config.config(key='sleep', default=10))
+    minsleep = int(plugin.config.config(key='minsleep', default=1))
+    minsleep = min(minsleep, maxsleep)
+
+    # Expect as much traffic as the busiest of recent batches or this hour
+    expected = max(rates["batch"], rates["hours"][hour])
+
+    if limit and count >= limit:
+        # Batch was full, so there's backlog waiting on the server
+        sleep = 0
+    else:
+        sleep = int(round(maxsleep / (1.0 + expected)))
+        sleep = max(minsleep, min(maxsleep, sleep))
+
+    # Store averages once per hour of the day
+    if rates["savedhour"] != hour:
+        saverates()
+        rates["savedhour"] = hour
+
+    decision.update({"count": count, "hour": hour, "expected": expected,
+                     "sleep": sleep, "minsleep": minsleep,
+                     "maxsleep": maxsleep})
+
+    logger.debug("Polling: %s updates, expected %.2f, sleeping %ss",
+                 count, expected, sleep)
+    return sleep
+
+
+def showpolling():
+    """
+    Shows the current polling decisions
+    :return: text with the polling status
+    """
+
+    if not rates["loaded"]:
+        loadrates()
+    hour = decision["hour"]
+    text = "Polling status:\n"
+    text += "```\n"
+    text += "Last batch: %s updates at hour %s\n" % (decision["count"], hour)
+    text += "Average per batch: %.2f\n" % rates["batch"]
+    text += "Average for hour %s: %.2f\n" % (hour, rates["hours"][hour])
+    text += "Sleep: %ss (min %ss, max %ss)\n" % (
+        decision["sleep"], decision["minsleep"], decision["maxsleep"])
+    text += "```"
+    return text
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Statistics per statement shape and slow query log for dbsql
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+import logging
+import re
+import sqlite3 as lite
+import sys
+import threading
+
+import plugin.config
+
+# Literals replaced to get the shape of a statement
+literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+spaces = re.compile(r"\s+")
+lists = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+# Maximum number of shapes tracked, others are counted together
+maxshapes = 500
+
+# Statistics per shape
+shapes = {}
+lock = threading.Lock()
+
+# Shapes of statements recently seen, emptied when reaching maxshapes
+normalized = {}
+
+# Threshold in seconds, reloaded from config every some statements
+settings = {"threshold": 0.1, "calls": 0, "loading": False}
+reloadevery = 1000
+
+
+def normalize(sql):
+    """
+    Gets shape of statement, replacing literals by ?
+    :param sql: statement
+    :return: normalized statement
+    """
+
+    # Most statements are repeated, like the ones reading config
+    shape = normalized.get(sql)
+    if shape is None:
+        shape = literals.sub("?", sql)
+        shape = lists.sub("(...)", shape)
+        shape = spaces.sub(" ", shape).strip()
+        if len(normalized) >= maxshapes:
+            normalized.clear()
+        normalized[sql] = shape
+    return shape
+
+
+def getthreshold():
+    """
+    Gets threshold for slow queries from config 'slowquery', in ms
+    :return: threshold in seconds
+    """
+
+    # Reading config runs SQL too, so keep the old value meanwhile
+    settings["calls"] -= 1
+    if settings["loading"] or settings["calls"] > 0:
+        return settings["threshold"]
+    settings["loading"] = True
+    try:
+        settings["threshold"] = float(plugin.config.config(
+            key='slowquery', default=100)) / 1000
+    finally:
+        settings["calls"] = reloadevery
+        settings["loading"] = False
+    return settings["threshold"]
+
+
+def getcaller():
+    """
+    Gets plugin or module that ran the statement
+    :return: name like plugin.karma
+    """
+
+    frame = sys._getframe(1)
+    while frame:
+        name = frame.f_globals.get("__name__", "")
+        if ".plugin." in name and not name.endswith(".config"):
+            return "plugin.%s" % name.split(".")[-1]
+        frame = frame.f_back
+
+    # Not from a plugin, so report first caller outside of stampy core
+    frame = sys._getframe(1)
+    while frame:
+        name = frame.f_globals.get("__name__", "")
+        if name not in [__name__, "stampy.stampy", "stampy.plugin.config"]:
+            return "%s.%s" % (name, frame.f_code.co_name)
+        frame = frame.f_back
+    return "unknown"
+
+
+def explain(database, sql, params=False):
+    """
+    Gets query plan of a statement, using its own connection as on the one
+    running the statement sqlite3 would commit the transaction open
+    :param database: database file
+    :param sql: statement
+    :param params: values for the placeholders
+    :return: text with one line per step of the plan
+    """
+
+    con = None
+    try:
+        con = lite.connect(database, timeout=1)
+        cur = con.cursor()
+        if params:
+            cur.execute("EXPLAIN QUERY PLAN %s" % sql, params)
+        else:
+            cur.execute("EXPLAIN QUERY PLAN %s" % sql)
+        return "; ".join([str(row[-1]) for row in cur.fetchall()])
+    except Exception, e:
+        return "unavailable (%s)" % e
+    finally:
+        if con:
+            con.close()
+
+
+def record(database, sql, seconds, params=False, many=False):
+    """
+    Adds statement to statistics and logs it if slow, once per shape
+    :param database: database file used, to get the query plan
+    :param sql: statement
+    :param seconds: time it took
+    :param params: values for the placeholders
+    :param many: statement was run once for each one of params
+    :return:
+    """
+
+    shape = normalize(sql)
+    slow = seconds >= getthreshold()
+
+    with lock:
+        if shape not in shapes:
+            if len(shapes) >= maxshapes:
+                shape = "other"
+            shapes.setdefault(shape, {"count": 0, "total": 0.0, "max": 0.0,
+                                      "slow": 0, "caller": "", "plan": ""})
+        stats = shapes[shape]
+        stats["count"] += 1
+        stats["total"] += seconds
+        if seconds > stats["max"]:
+            stats["max"] = seconds
+        if slow:
+            stats["slow"] += 1
+        first = slow and stats["slow"] == 1
+
+    if first:
+        logger = logging.getLogger(__name__)
+        if many:
+            try:
+                params = list(params)[0]
+            except (TypeError, IndexError):
+                params = False
+        stats["caller"] = getcaller()
+        stats["plan"] = explain(database, sql, params)
+        logger.warning("Slow query %.1f ms from %s: %s | Plan: %s",
+                       seconds * 1000, stats["caller"], shape, stats["plan"])
+    return
+
+
+def top(key="total", limit=10):
+    """
+    Gets statement shapes with highest total, count, max or slow
+    :param key: field to sort by
+    :param limit: number of shapes to return
+    :return: list of (shape, stats) sorted by key
+    """
+
+    if key not in ["total", "count", "max", "slow"]:
+        key = "total"
+    with lock:
+        items = [(shape, dict(stats)) for (shape, stats) in shapes.items()]
+    items.sort(key=lambda item: item[1][key], reverse=True)
+    return items[:limit]
+
+
+def showqueries(key="total"):
+    """
+    Shows statement shapes with highest total, count, max or slow
+    :param key: field to sort by
+    :return: text with the list
+    """
+
+    text = "Top SQL statements by %s (slow >= %s ms):\n" % (
+        key, int(getthreshold() * 1000))
+    text += "```\n"
+    for (shape, stats) in top(key=key):
+        text += "%s\n" % shape[:200]
+        text += "    count %s, total %.1f ms, max %.1f ms, slow %s\n" % (
+            stats["count"], stats["total"] * 1000, stats["max"] * 1000,
+            stats["slow"])
+        if stats["slow"]:
+            text += "    from %s, plan: %s\n" % (
+                stats["caller"], stats["plan"])
+    text += "```"
+    return text
+
+
+def reset():
+    """
+    Forgets statistics of all shapes
+    :return:
+    """
+
+    with lock:
+        shapes.clear()
+    return
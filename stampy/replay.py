@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Record and replay of raw update streams
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+from __future__ import absolute_import
+
+import gzip
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import stampy.dedup
+import stampy.stampy
+
+
+def record(updates, filename):
+    """
+    Appends raw updates to a gzip compressed file, one JSON per line
+    :param updates: list of updates as received from server
+    :param filename: file to append to
+    :return:
+    """
+
+    lines = "".join(["%s\n" % json.dumps(item) for item in updates])
+    recfile = gzip.open(filename, 'ab')
+    try:
+        recfile.write(lines)
+    finally:
+        recfile.close()
+    return
+
+
+def readupdates(filename):
+    """
+    Reads recorded updates lazily
+    :param filename: file with the updates recorded
+    :return: returns the items recorded
+    """
+
+    recfile = gzip.open(filename, 'rb')
+    try:
+        for line in recfile:
+            if line.strip():
+                yield json.loads(line)
+    finally:
+        recfile.close()
+
+
+def getdate(update):
+    """
+    Gets date the update was sent at
+    :param update: update to check
+    :return: date as epoch or False if not available
+    """
+
+    date = stampy.stampy.getmsgdetail(update)["date"]
+    if date:
+        return date
+    return False
+
+
+def paced(updates):
+    """
+    Waits before each update for the same time it took originally
+    :param updates: updates to replay
+    :return: returns the items at the original pace
+    """
+
+    start = False
+    first = False
+    for update in updates:
+        date = getdate(update)
+        if date:
+            if not first:
+                first = date
+                start = time.time()
+            wait = (date - first) - (time.time() - start)
+            if wait > 0:
+                time.sleep(wait)
+        yield update
+
+
+def batches(updates, limit=100):
+    """
+    Groups updates in batches like the ones received from server
+    :param updates: updates to group
+    :param limit: maximum number of updates per batch
+    :return: returns lists of updates
+    """
+
+    batch = []
+    for update in updates:
+        batch.append(update)
+        if len(batch) >= limit:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def scratch(database=False):
+    """
+    Copies the database to use it while replaying, so karma, stats, the
+    last update_id and the updates already seen are not changed in the
+    real one
+    :param database: file to copy to, a temporary one if not provided
+    :return: real database file
+    """
+
+    logger = logging.getLogger(__name__)
+    real = stampy.stampy.options.database
+    if not database:
+        (handle, database) = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+    # Nothing pending in our connection before copying the file
+    stampy.stampy.dbconnect().commit()
+    shutil.copyfile(real, database)
+    stampy.stampy.options.database = database
+    stampy.dedup.window["loaded"] = False
+    logger.info("Replaying on a copy of %s in %s", real, database)
+    return real
+
+
+def replay(filename, pacing=False, database=False):
+    """
+    Processes recorded updates on a copy of the database capturing
+    outbound calls instead of sending
+    :param filename: file with the updates recorded
+    :param pacing: wait between updates as much as originally elapsed
+    :param database: file to keep the copy of the database in, removed
+                     afterwards if not provided
+    :return: number of updates processed, duplicates not included
+    """
+
+    logger = logging.getLogger(__name__)
+
+    real = scratch(database=database)
+    copy = stampy.stampy.options.database
+    stampy.stampy.capture["enabled"] = True
+    stampy.stampy.capture["calls"].clear()
+
+    updates = readupdates(filename)
+    if pacing:
+        # Process each update as soon as it's its time
+        updates = paced(updates)
+        limit = 1
+    else:
+        limit = 100
+
+    start = time.time()
+    count = 0
+    try:
+        for batch in batches(updates, limit=limit):
+            count += stampy.stampy.process(batch)
+    finally:
+        stampy.stampy.capture["enabled"] = False
+        stampy.stampy.dbconnect().close()
+        stampy.stampy.db.con = False
+        stampy.stampy.options.database = real
+        stampy.dedup.window["loaded"] = False
+        if not database:
+            os.remove(copy)
+    elapsed = time.time() - start
+
+    calls = stampy.stampy.capture["calls"]
+
+    rate = 0
+    if elapsed:
+        rate = count / elapsed
+    logger.info("Replayed %s updates in %.2fs (%.2f updates/s)", count,
+                elapsed, rate)
+    logger.info("Captured %s API calls: %s", sum(calls.values()),
+                dict(calls))
+    return count
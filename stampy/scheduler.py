@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Scheduler shared by plugins, only started when running as
+#              daemon so one-shot runs don't load apscheduler
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+import logging
+import threading
+
+import metrics
+import plugin.config
+
+# Functions that can be scheduled, by job name
+registry = {}
+
+# Jobs added before start, as name -> (trigger, trigger arguments)
+pending = {}
+
+state = {"scheduler": None}
+lock = threading.Lock()
+
+
+def runjob(name):
+    """
+    Runs a registered job, stored jobs refer to it instead of to the
+    function as plugins are not importable by their loaded name
+    :param name: name of the job
+    :return:
+    """
+
+    logger = logging.getLogger(__name__)
+    function = registry.get(name)
+    if not function:
+        logger.warning("Job %s is not registered, skipping", name)
+        return
+    with metrics.timed("job.%s" % name):
+        return function()
+
+
+def gettrigger(trigger, **kwargs):
+    """
+    Creates trigger for a job, cron ones get jitter so jobs at the same
+    hour don't all run at once
+    :param trigger: cron, interval or date
+    :param kwargs: arguments for the trigger
+    :return: trigger
+    """
+
+    from apscheduler.triggers.cron import CronTrigger
+    from apscheduler.triggers.date import DateTrigger
+    from apscheduler.triggers.interval import IntervalTrigger
+
+    if trigger == 'cron':
+        kwargs.setdefault("jitter", int(plugin.config.config(
+            key='schedjitter', default=300)))
+        return CronTrigger(**kwargs)
+    if trigger == 'interval':
+        return IntervalTrigger(**kwargs)
+    return DateTrigger(**kwargs)
+
+
+def add_job(name, function, trigger, **kwargs):
+    """
+    Registers a job, which is scheduled when the scheduler starts
+    :param name: name of the job, used as its id
+    :param function: function to run, without arguments
+    :param trigger: cron, interval or date
+    :param kwargs: arguments for the trigger, like hour='10' or minutes=30
+    :return:
+    """
+
+    with lock:
+        registry[name] = function
+        if state["scheduler"]:
+            schedule(state["scheduler"], name, trigger, kwargs)
+        else:
+            pending[name] = (trigger, kwargs)
+    return
+
+
+def schedule(scheduler, name, trigger, kwargs):
+    """
+    Adds job to scheduler unless stored already with the same trigger, so
+    restarts keep its next run
+    :param scheduler: scheduler to add the job to
+    :param name: name of the job
+    :param trigger: cron, interval or date
+    :param kwargs: arguments for the trigger
+    :return:
+    """
+
+    logger = logging.getLogger(__name__)
+    trigger = gettrigger(trigger, **kwargs)
+    stored = scheduler.get_job(name)
+    if stored and str(stored.trigger) == str(trigger):
+        logger.debug("Job %s kept, next run at %s", name,
+                     stored.next_run_time)
+        return
+    scheduler.add_job(runjob, trigger=trigger, args=[name], id=name,
+                      name=name, replace_existing=True)
+    return
+
+
+def start(persistent=True):
+    """
+    Starts scheduler with a bounded pool of threads, adding the jobs
+    pending and removing stored ones no longer registered
+    :param persistent: keep jobs in the database instead of memory
+    :return: scheduler
+    """
+
+    logger = logging.getLogger(__name__)
+    with lock:
+        if not state["scheduler"]:
+            from apscheduler.executors.pool import ThreadPoolExecutor
+            from apscheduler.schedulers.background import BackgroundScheduler
+
+            jobstores = {}
+            if persistent:
+                import jobstore
+                jobstores["default"] = jobstore.SQLiteJobStore()
+
+            # Runs missed while stopped are done once, if not too late
+            defaults = {"coalesce": True, "max_instances": 1,
+                        "misfire_grace_time": int(plugin.config.config(
+                            key='schedgrace', default=3600))}
+            workers = int(plugin.config.config(key='schedworkers',
+                                               default=2))
+
+            scheduler = BackgroundScheduler(
+                jobstores=jobstores, job_defaults=defaults,
+                executors={"default": ThreadPoolExecutor(workers)})
+            scheduler.start(paused=True)
+            for job in scheduler.get_jobs():
+                if job.id not in registry:
+                    logger.debug("Removing stale job %s", job.id)
+                    job.remove()
+            for (name, (trigger, kwargs)) in pending.items():
+                schedule(scheduler, name, trigger, kwargs)
+            pending.clear()
+            scheduler.resume()
+            state["scheduler"] = scheduler
+            logger.debug("Scheduler started with %s jobs",
+                         len(scheduler.get_jobs()))
+    return state["scheduler"]
+
+
+def running():
+    """
+    Checks if scheduler was started
+    :return: True if started
+    """
+
+    return state["scheduler"] is not None
+
+
+def shutdown(wait=False):
+    """
+    Stops scheduler if started, jobs stored are kept for next start
+    :param wait: wait for the jobs running to finish
+    :return:
+    """
+
+    with lock:
+        scheduler = state["scheduler"]
+        state["scheduler"] = None
+        pending.clear()
+    if scheduler:
+        scheduler.shutdown(wait=wait)
+    return
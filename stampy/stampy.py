@@ -13,20 +13,37 @@
 # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.   See the
 # GNU General Public License for more details.
 
+import binascii
+import collections
 import datetime
-import json
 import logging
 import optparse
+import os
+import re
 import sqlite3 as lite
-import string
 import sys
+import threading
+import time
 import urllib
+from logging.handlers import RotatingFileHandler
 from time import sleep
 
-from apscheduler.schedulers.background import BackgroundScheduler
-
 import plugins
+import dedup
+import httpclient
+import inbox
+import latency
+import logqueue
+import metrics
+import outbox
+import pipeline
 import plugin.config
+import polling
+import querylog
+import replay
+import scheduler
+import startup
+import webhook
 
 
 description = """
@@ -53,13 +70,45 @@ p.add_option('-o', '--owner', dest='owner',
              default="iranzo")
 p.add_option('-d', '--daemon', dest='daemon', help="Run as daemon",
              default=False, action="store_true")
+p.add_option('-w', '--webhook', dest='webhook',
+             help="Run as daemon receiving updates via webhook",
+             default=False, action="store_true")
+p.add_option('--webhook-port', dest='webhookport',
+             help="Port for the local webhook server", default=8443,
+             type='int')
+p.add_option('--webhook-secret', dest='webhooksecret',
+             help="Secret path Telegram will post updates to",
+             default=False)
+p.add_option('--webhook-url', dest='webhookurl',
+             help="Public URL to register with Telegram for the webhook",
+             default=False)
+p.add_option('--record', dest='record',
+             help="Append raw updates received to compressed file",
+             default=False)
+p.add_option('--replay', dest='replay',
+             help="Process updates recorded in file without sending replies",
+             default=False)
+p.add_option('--replay-pacing', dest='replaypacing',
+             help="Replay updates at the pace they were originally sent",
+             default=False, action="store_true")
 
-(options, args) = p.parse_args()
-
+p.add_option('--metrics-port', dest='metricsport',
+             help="Port for local HTTP endpoint exporting Prometheus metrics",
+             default=False, type='int')
+p.add_option('--log-async', dest='logasync',
+             help="Write log from a background thread instead of the loop",
+             default=False, action="store_true")
+p.add_option('--log-max-size', dest='logmaxsize',
+             help="Rotate log file when reaching this size in MiB",
+             default=False, type='int')
+p.add_option('--log-backups', dest='logbackups',
+             help="Number of rotated log files to keep", default=False,
+             type='int')
+p.add_option('--startup-profile', dest='startupprofile',
+             help="Show time spent importing modules and initializing "
+                  "plugins at startup", default=False, action="store_true")
 
-# Set scheduler
-scheduler = BackgroundScheduler()
-scheduler.start()
+(options, args) = p.parse_args()
 
 
 # Implement switch from http://code.activestate.com/recipes/410692/
@@ -108,53 +157,309 @@ def createdb():
     return
 
 
-# Function definition
-def dbsql(sql=False):
+def upgradedb(con):
     """
-    Performs SQL operation on database
-    :param sql: sql command to execute
+    Creates tables added after the database was created
+    :param con: connection to database
     :return:
     """
+    cur = con.cursor()
+    cmd = 'CREATE TABLE IF NOT EXISTS inbox(update_id INTEGER PRIMARY KEY, \
+          status INT, date TEXT, data TEXT);'
+    cur.execute(cmd)
+    cmd = 'CREATE TABLE IF NOT EXISTS dedup(update_id INT, chat_id INT, \
+          message_id INT);'
+    cur.execute(cmd)
+    cmd = 'CREATE TABLE IF NOT EXISTS jobs(id TEXT PRIMARY KEY, \
+          next_run_time REAL, job_state BLOB);'
+    cur.execute(cmd)
+    con.commit()
+    return
+
+
+# Database connection for each thread, reused across calls
+db = threading.local()
+
+
+def dbconnect():
+    """
+    Gets database connection for current thread, creating database if needed
+    :return: connection to database
+    """
     logger = logging.getLogger(__name__)
 
+    if getattr(db, "con", False) and db.database == options.database:
+        return db.con
+
     # Initialize database access
-    con = False
     try:
-        con = lite.connect(options.database)
+        con = lite.connect(options.database, timeout=30)
         cur = con.cursor()
         cur.execute("SELECT * FROM config WHERE key='token';")
         cur.fetchone()
 
     except lite.Error, e:
         createdb()
-        logger.debug(msg="Error %s:" % e.args[0])
+        logger.debug("Error %s:", e.args[0])
         logger.debug(msg="DB has been created, continuing")
-        con = lite.connect(options.database)
+        con = lite.connect(options.database, timeout=30)
         cur = con.cursor()
         cur.execute("SELECT * FROM config WHERE key='token';")
         cur.fetchone()
 
+    upgradedb(con)
+
     # Database initialized
+    db.con = con
+    db.database = options.database
+    db.batch = False
+    return con
+
+
+def dbbegin():
+    """
+    Starts a batch on current thread so that SQL operations are not
+    committed until dbcommit() is called
+    :return:
+    """
+
+    dbconnect()
+    db.batch = True
+    return
+
+
+def dbcommit():
+    """
+    Commits all SQL operations since dbbegin() in a single transaction
+    :return:
+    """
+
+    dbconnect().commit()
+    db.batch = False
+    return
+
+
+def dbrollback():
+    """
+    Discards all SQL operations since dbbegin()
+    :return:
+    """
+
+    dbconnect().rollback()
+    db.batch = False
+    return
+
+
+# Function definition
+def dbsql(sql=False, params=False, many=False, strict=False):
+    """
+    Performs SQL operation on database
+    :param sql: sql command to execute
+    :param params: values for the placeholders in sql
+    :param many: execute sql once for each one of the items in params
+    :param strict: raise errors after logging them, for callers that must
+                   not go on if the data wasn't stored
+    :return:
+    """
+    logger = logging.getLogger(__name__)
+
+    con = dbconnect()
+    cur = con.cursor()
 
     worked = False
+    error = None
     if sql:
+        start = time.time()
         try:
-            cur.execute(sql)
-            con.commit()
+            if many:
+                cur.executemany(sql, params)
+            elif params:
+                cur.execute(sql, params)
+            else:
+                cur.execute(sql)
+            # Within a batch, commit is done at the end of it
+            if not db.batch:
+                con.commit()
             worked = True
         except:
             worked = False
+            error = sys.exc_info()
+        elapsed = time.time() - start
+        metrics.record("sql", elapsed)
+        querylog.record(db.database, sql, elapsed, params=params,
+                        many=many)
     if not worked:
-        logger.critical(msg="Error on SQL execution: %s" % sql)
+        logger.critical("Error on SQL execution: %s", sql)
+        if strict and error:
+            raise error[0], error[1], error[2]
 
     return cur
 
 
+# When enabled, outbound API calls are counted instead of sent
+capture = {"enabled": False, "calls": collections.Counter()}
+
+
+def apicall(url):
+    """
+    Calls a method of Telegram bot API
+    :param url: url for the method including the arguments
+    :return: result of the call as dict
+    """
+
+    logger = logging.getLogger(__name__)
+    (method, sep, args) = url.split("/")[-1].partition("?")
+    if capture["enabled"]:
+        capture["calls"][method] += 1
+        logger.debug("Captured call to %s: %s", method, args)
+        return {"ok": True, "result": []}
+    try:
+        with metrics.timed("api.%s" % method):
+            result = httpclient.getjson(url)
+    except:
+        metrics.inc("api_calls", method=method, result="exception")
+        raise
+    if result.get('ok'):
+        metrics.inc("api_calls", method=method, result="ok")
+    else:
+        metrics.inc("api_calls", method=method, result="error")
+    return result
+
+
+# Longest text accepted by Telegram in a message
+maxlength = 4096
+
+
+# Markdown markers opening an entity, escaped characters are skipped
+markdownopen = re.compile(r"\\.|```|[`*_\[]", re.DOTALL)
+
+# Text ending each entity, a link being followed by its url
+markdownend = {"```": "```", "`": "`", "*": "*", "_": "_", "[": "]",
+               "(": ")"}
+
+# Text closing each entity at the end of a message and opening it again at
+# the start of the next one, a url can't be opened again
+markdownsplit = {"```": ("\n```", "```\n"), "`": ("`", "`"),
+                 "*": ("*", "*"), "_": ("_", "_"), "[": ("]", "["),
+                 "(": (")", "")}
+
+
+def markdownentity(text, opened=""):
+    """
+    Gets the Markdown entity open at the end of text, as Telegram doesn't
+    nest them there's one at most and nothing is markup inside code
+    :param text: text to scan
+    :param opened: marker of the entity open at the start of text
+    :return: marker of the entity open at the end of text or empty
+    """
+
+    position = 0
+    while True:
+        if opened:
+            found = text.find(markdownend[opened], position)
+            if found < 0:
+                return opened
+            position = found + len(markdownend[opened])
+            if opened == "[" and text.startswith("(", position):
+                (opened, position) = ("(", position + 1)
+            else:
+                opened = ""
+        else:
+            match = markdownopen.search(text, position)
+            if not match:
+                return ""
+            position = match.end()
+            if not match.group().startswith("\\"):
+                opened = match.group()
+
+
+def markdownchunk(text, opened="", inside=""):
+    """
+    Closes the Markdown entity left open at the end of a message and opens
+    again the one left open by the previous message
+    :param text: text of the message
+    :param opened: marker of the entity open at the start of text
+    :param inside: marker of the entity open at the end of text
+    :return: text to send
+    """
+
+    if opened:
+        if text.startswith(markdownend[opened]):
+            # Entity closed right away, better than sending it empty
+            text = text[len(markdownend[opened]):]
+        else:
+            text = markdownsplit[opened][1] + text
+    if inside:
+        if markdownsplit[inside][1] and text.endswith(inside):
+            # Entity opened right at the end, the next message opens it
+            text = text[:-len(inside)]
+        else:
+            text += markdownsplit[inside][0]
+    return text
+
+
+def splitline(line, width):
+    """
+    Splits a line longer than width, at spaces when possible
+    :param line: line to split
+    :param width: maximum characters per piece
+    :return: list of pieces
+    """
+
+    pieces = []
+    while len(line) > width:
+        cut = line.rfind(" ", 0, width + 1)
+        if cut > 0:
+            (piece, line) = (line[:cut], line[cut + 1:])
+        else:
+            (piece, line) = (line[:width], line[width:])
+        pieces.append(piece)
+    pieces.append(line)
+    return pieces
+
+
+def splitmessage(text, limit=maxlength, markdown=False):
+    """
+    Packs text in as few messages up to limit characters as possible,
+    splitting at line ends unless a line doesn't fit
+    :param text: text to split
+    :param limit: maximum characters per message
+    :param markdown: close code, bold, italic and links at the end of a
+                     message and open them again in the next one
+    :return: list of texts to send in order
+    """
+
+    # Room for closing and opening an entity in each message, a code block
+    # taking the most
+    width = limit - len("".join(markdownsplit["```"])) if markdown else limit
+
+    chunks = []
+    lines = []
+    size = 0
+    # Entity open when starting this message and now
+    opened = ""
+    inside = ""
+    for line in text.split("\n"):
+        for piece in splitline(line, width):
+            if lines and size + 1 + len(piece) > width:
+                chunk = markdownchunk("\n".join(lines), opened, inside)
+                if chunk:
+                    chunks.append(chunk)
+                (lines, size, opened) = ([], 0, inside)
+            size += len(piece) + 1 if lines else len(piece)
+            lines.append(piece)
+            if markdown:
+                inside = markdownentity(piece, inside)
+
+    chunks.append(markdownchunk("\n".join(lines), opened))
+    return chunks
+
+
 def sendmessage(chat_id=0, text="", reply_to_message_id=False,
                 disable_web_page_preview=True, parse_mode=False,
                 extra=False):
     """
-    Sends a message to a chat
+    Sends a message to a chat, as several ones if too long
     :param chat_id: chat_id to receive the message
     :param text: message text
     :param reply_to_message_id: message_id to reply
@@ -168,66 +473,36 @@ def sendmessage(chat_id=0, text="", reply_to_message_id=False,
     logger = logging.getLogger(__name__)
     url = "%s%s/sendMessage" % (plugin.config.config(key="url"),
                                 plugin.config.config(key='token'))
-    lines = text.split("\n")
-    maxlines = 15
-    if len(lines) > maxlines:
-        # message might be too big for single message (max 4K)
-        if "```" in text:
-            markdown = True
-        else:
-            markdown = False
-
-        texto = string.join(lines[0:maxlines], "\n")
-        if markdown:
-            texto = "%s```" % texto
-
-        # Send first batch
-        sendmessage(chat_id=chat_id, text=texto,
-                    reply_to_message_id=reply_to_message_id,
-                    disable_web_page_preview=disable_web_page_preview,
-                    parse_mode=parse_mode, extra=extra)
-        # Send remaining batch
-        texto = string.join(lines[maxlines:], "\n")
-        if markdown:
-            texto = "```%s" % texto
-        sendmessage(chat_id=chat_id, text=texto, reply_to_message_id=False,
-                    disable_web_page_preview=disable_web_page_preview,
-                    parse_mode=parse_mode, extra=extra)
-        return
-
-    message = "%s?chat_id=%s&text=%s" % (
-              url, chat_id, urllib.quote_plus(text.encode('utf-8')))
-    if reply_to_message_id:
-        message += "&reply_to_message_id=%s" % reply_to_message_id
-    if disable_web_page_preview:
-        message += "&disable_web_page_preview=1"
-    if parse_mode:
-        message += "&parse_mode=%s" % parse_mode
-    if extra:
-        message += "&%s" % extra
-
-    code = False
-    attempt = 0
-    while not code:
-        result = json.load(urllib.urlopen(message))
-        code = result['ok']
-        logger.error(msg="ERROR (%s) sending message: Code: %s : Text: %s" % (
-                         attempt, code, result))
-        attempt = attempt + 1
-        sleep(1)
-        # exit after 60 retries with 1 second delay each
-        if attempt > 60:
-            logger.error(msg="PERM ERROR sending message: Code: %s : Text: "
-                             "%s" % (code, result))
-            code = True
-    logger.debug(msg="Sending message: Code: %s : Text: %s" % (code, text))
+    markdown = bool(parse_mode) and "markdown" in parse_mode.lower()
+    chunks = splitmessage(text, markdown=markdown)
+    for chunk in chunks:
+        message = "%s?chat_id=%s&text=%s" % (
+                  url, chat_id, urllib.quote_plus(chunk.encode('utf-8')))
+        if reply_to_message_id:
+            message += "&reply_to_message_id=%s" % reply_to_message_id
+        if disable_web_page_preview:
+            message += "&disable_web_page_preview=1"
+        if parse_mode:
+            message += "&parse_mode=%s" % parse_mode
+        if extra:
+            message += "&%s" % extra
+
+        # Queued for the workers when running, retried with backoff if
+        # failed, the outbox keeps the order of messages to a chat
+        result = outbox.send(chat_id, "sendMessage", message,
+                             reply_to_message_id=reply_to_message_id)
+        logger.debug("Sending message: Code: %s : Text: %s",
+                     result.get('ok'), chunk)
+        # Only the first one is a reply
+        reply_to_message_id = False
     return
 
 
 def getupdates(offset=0, limit=100):
     """
     Gets updates (new messages from server)
-    :param offset: last update id
+    :param offset: first update id to get, defaults to the one following
+                   last processed
     :param limit: maximum number of messages to gather
     :return: returns the items obtained
     """
@@ -235,35 +510,50 @@ def getupdates(offset=0, limit=100):
     logger = logging.getLogger(__name__)
     url = "%s%s/getUpdates" % (plugin.config.config(key='url'),
                                plugin.config.config(key='token'))
+
+    # Asking for updates after the last processed one also marks the
+    # previous ones as read at the server
+    if not offset:
+        lastupdateid = int(plugin.config.config(key='lastupdateid',
+                                                default=0))
+        if lastupdateid:
+            offset = lastupdateid + 1
+
     message = "%s?" % url
     if offset != 0:
         message += "offset=%s&" % offset
     message += "limit=%s" % limit
     try:
-        result = json.load(urllib.urlopen(message))['result']
+        result = apicall(message)['result']
     except:
         result = []
+
+    latency.pickedup(result)
+    if options.record and result:
+        replay.record(updates=result, filename=options.record)
+
     for item in result:
-        logger.info(msg="Getting updates and returning: %s" % item)
+        logger.debug("Getting updates and returning: %s", item)
         yield item
 
 
-def clearupdates(offset):
+def setwebhook(url=""):
     """
-    Marks updates as already processed so they are removed by API
-    :param offset:
-    :return:
+    Registers URL with Telegram to receive updates via webhook
+    :param url: public url for the webhook including secret path or empty to
+                remove it
+    :return: result of the API call
     """
 
     logger = logging.getLogger(__name__)
-    url = "%s%s/getUpdates" % (plugin.config.config(key='url'), plugin.config.config(key='token'))
-    message = "%s?" % url
-    message += "offset=%s&" % offset
+    message = "%s%s/setWebhook?url=%s" % (plugin.config.config(key='url'),
+                                          plugin.config.config(key='token'),
+                                          urllib.quote_plus(url))
     try:
-        result = json.load(urllib.urlopen(message))
+        result = apicall(message)
     except:
         result = False
-    logger.info(msg="Clearing messages")
+    logger.info("Setting webhook: %s", result)
     return result
 
 
@@ -323,7 +613,7 @@ def telegramcommands(texto, chat_id, message_id, who_un):
     if commandtext:
         sendmessage(chat_id=chat_id, text=commandtext,
                     reply_to_message_id=message_id, parse_mode="Markdown")
-        logger.debug(msg="Command: %s" % word)
+        logger.debug("Command: %s", word)
     return retv
 
 
@@ -343,8 +633,9 @@ def sendsticker(chat_id=0, sticker="", text="", reply_to_message_id=""):
     message = "%s&sticker=%s" % (message, sticker)
     if reply_to_message_id:
         message += "&reply_to_message_id=%s" % reply_to_message_id
-    logger.debug(msg="Sending sticker: %s" % text)
-    return json.load(urllib.urlopen(message))
+    logger.debug("Sending sticker: %s", text)
+    return outbox.send(chat_id, "sendSticker", message,
+                       reply_to_message_id=reply_to_message_id)
 
 
 def sendimage(chat_id=0, image="", text="", reply_to_message_id=""):
@@ -365,8 +656,9 @@ def sendimage(chat_id=0, image="", text="", reply_to_message_id=""):
         message += "&reply_to_message_id=%s" % reply_to_message_id
     if text:
         message += "&caption=%s" % urllib.quote_plus(text.encode('utf-8'))
-    logger.debug(msg="Sending image: %s" % text)
-    return json.load(urllib.urlopen(message))
+    logger.debug("Sending image: %s", text)
+    return outbox.send(chat_id, "sendPhoto", message,
+                       reply_to_message_id=reply_to_message_id)
 
 
 def replace_all(text, dictionary):
@@ -462,6 +754,8 @@ def process(messages):
     """
     This function processes the updates in the Updates URL at Telegram
     for finding commands, karma changes, config, etc
+    :param messages: updates to process
+    :return: number of updates processed
     """
 
     logger = logging.getLogger(__name__)
@@ -471,40 +765,93 @@ def process(messages):
 
     # Main code for processing the karma updates
     date = 0
-    lastupdateid = 0
-    logger.info(msg="Initial message at %s" % date)
+    logger.info("Initial message at %s", date)
+
+    ids = []
     texto = ""
     count = 0
+    lastupdateid = int(plugin.config.config(key='lastupdateid', default=0))
 
-    # Process each message available in URL and search for karma operators
     for message in messages:
-        # Count messages in each batch
-        count += 1
+        # Effects of each update and its update_id are stored together in a
+        # short transaction, so the webhook and fetcher can store new updates
+        # meanwhile and a crash reprocesses just the interrupted one. Calls
+        # to Telegram are held until then, so they aren't sent twice either
+        dbbegin()
+        outbox.hold()
+        try:
+            (processed, update_id, texto) = processupdate(message)
+            if update_id:
+                ids.append(update_id)
+                inbox.complete([update_id])
+                if update_id > lastupdateid:
+                    lastupdateid = update_id
+                    plugin.config.setconfig(key='lastupdateid',
+                                            value=lastupdateid)
+        except:
+            dbrollback()
+            dedup.rollback()
+            outbox.discard()
+            raise
+        dbcommit()
+        dedup.commit()
+        outbox.release()
+        count += processed
 
-        # Call plugins to process message
-        for i in plugins.getPlugins():
-            logger.debug(msg="Processing plugin: %s" % i["name"])
-            plug = plugins.loadPlugin(i)
+    metrics.inc("updates", count)
+    if ids:
+        metrics.observe("batch_size", len(ids))
+
+    logger.info("Last processed message at: %s", date)
+    logger.debug("Last processed update_id : %s", lastupdateid)
+    logger.debug("Last processed text: %s", texto)
+    logger.info("Number of messages in this batch: %s", count)
+
+    return count
+
+
+def processupdate(message):
+    """
+    Runs plugins against an update
+    :param message: update to process
+    :return: 1 if processed or 0 if duplicate, update_id and text
+    """
+
+    logger = logging.getLogger(__name__)
+    msgdetail = getmsgdetail(message)
+
+    # Drop updates received again before any plugin acts on them
+    if dedup.seen(msgdetail):
+        logger.info("Skipping duplicate update %s", msgdetail["update_id"])
+        metrics.inc("duplicates")
+        return 0, msgdetail["update_id"], msgdetail["text"]
+    dedup.add(msgdetail)
+
+    latency.started(msgdetail)
+
+    # Call plugins to process message
+    for i in plugins.getPlugins():
+        logger.debug("Processing plugin: %s", i["name"])
+        plug = plugins.loadPlugin(i)
+        with metrics.timed("plugin.%s" % i["name"]):
             plug.run(message=message)
+    latency.processed(msgdetail)
 
-        msgdetail = getmsgdetail(message)
+    # Write the line for debug
+    logger.debug("TEXT: %s : %s : %s", msgdetail["chat_name"],
+                 msgdetail["name"], msgdetail["text"])
 
-        # Update last message id to later clear it from the server
-        if msgdetail["update_id"] > lastupdateid:
-            lastupdateid = msgdetail["update_id"]
+    return 1, msgdetail["update_id"], msgdetail["text"]
 
-        # Write the line for debug
-        messageline = "TEXT: %s : %s : %s" % (msgdetail["chat_name"], msgdetail["name"], msgdetail["text"])
-        texto = msgdetail["text"]
-        logger.debug(msg=messageline)
 
-    logger.info(msg="Last processed message at: %s" % date)
-    logger.debug(msg="Last processed update_id : %s" % lastupdateid)
-    logger.debug(msg="Last processed text: %s" % texto)
-    logger.info(msg="Number of messages in this batch: %s" % count)
+def packagelogger():
+    """
+    Gets logger of the package, handlers and level are set on it so that
+    records of all modules reach them
+    :return: logger
+    """
 
-    # clear updates (marking messages as read)
-    clearupdates(offset=lastupdateid + 1)
+    return logging.getLogger(__name__.split(".")[0])
 
 
 def loglevel():
@@ -514,6 +861,7 @@ def loglevel():
     """
 
     logger = logging.getLogger(__name__)
+    package = packagelogger()
     level = False
 
     for case in Switch(plugin.config.config(key="verbosity").lower()):
@@ -536,14 +884,14 @@ def loglevel():
 
     # If logging level has changed, redefine in logger,
     # database and send message
-    if logging.getLevelName(logger.level).lower() != plugin.config.config(key="verbosity"):
-        logger.setLevel(level)
-        logger.info(msg="Logging level set to %s" % plugin.config.config(key="verbosity"))
+    if logging.getLevelName(package.level).lower() != plugin.config.config(key="verbosity"):
+        package.setLevel(level)
+        logger.info("Logging level set to %s", plugin.config.config(key="verbosity"))
         plugin.config.setconfig(key="verbosity",
-                                value=logging.getLevelName(logger.level).lower())
+                                value=logging.getLevelName(package.level).lower())
     else:
-        logger.debug(msg="Log level didn't changed from %s" % (
-                         plugin.config.config(key="verbosity").lower()))
+        logger.debug("Log level didn't changed from %s",
+                     plugin.config.config(key="verbosity").lower())
 
 
 def conflogging():
@@ -551,7 +899,8 @@ def conflogging():
     This function configures the logging handlers for console and file
     """
 
-    logger = logging.getLogger(__name__)
+    # Set on the package so records of other modules are written too
+    logger = packagelogger()
 
     # Define logging settings
     if not plugin.config.config(key="verbosity"):
@@ -571,15 +920,30 @@ def conflogging():
     console = logging.StreamHandler()
     console.setLevel(logging.DEBUG)
     console.setFormatter(formatter)
-    logger.addHandler(console)
 
-    # create file logger
+    # create file logger, rotated by size if set
     filename = '%s.log' % plugin.config.config(key='database').split(".")[0]
 
-    file = logging.FileHandler(filename)
+    for key in ['logasync', 'logmaxsize', 'logbackups']:
+        if getattr(options, key):
+            plugin.config.setconfig(key=key, value=getattr(options, key))
+    maxsize = int(plugin.config.config(key='logmaxsize', default=0))
+    backups = int(plugin.config.config(key='logbackups', default=5))
+
+    file = RotatingFileHandler(filename, maxBytes=maxsize * 1024 * 1024,
+                               backupCount=backups)
     file.setLevel(logging.DEBUG)
     file.setFormatter(formatter)
-    logger.addHandler(file)
+
+    if plugin.config.config(key='logasync', default=False) == 'True':
+        # Records are formatted and written by a background thread
+        handler = logqueue.QueueHandler(handlers=[console, file])
+        handler.setLevel(logging.DEBUG)
+        logger.addHandler(handler)
+        metrics.gauge("queue_depth", handler.waiting, queue="log")
+    else:
+        logger.addHandler(console)
+        logger.addHandler(file)
 
     return
 
@@ -596,7 +960,7 @@ def main():
     if options.database:
         plugin.config.setconfig(key='database', value=options.database)
 
-    if not logger.handlers:
+    if not packagelogger().handlers:
         conflogging()
 
     logger.info(msg="Started execution")
@@ -627,21 +991,84 @@ def main():
 
     # Initialize modules
     for i in plugins.getPlugins():
-        logger.debug(msg="Processing plugin initialization: %s" % i["name"])
-        plug = plugins.loadPlugin(i)
-        plug.init()
+        logger.debug("Processing plugin initialization: %s", i["name"])
+        with startup.timed("plugin.%s" % i["name"]):
+            plug = plugins.loadPlugin(i)
+            plug.init()
+
+    # Export metrics if a port is defined on cli or in config
+    if options.metricsport:
+        plugin.config.setconfig(key='metricsport', value=options.metricsport)
+    if plugin.config.config(key='metricsport'):
+        metrics.gauge("queue_depth", lambda: pipeline.batches.qsize(),
+                      queue="prefetch")
+        metrics.gauge("queue_depth", lambda: webhook.updates.qsize(),
+                      queue="webhook")
+        metrics.gauge("queue_depth", inbox.waiting, queue="inbox")
+        metrics.serve(port=plugin.config.config(key='metricsport'))
+
+    if options.startupprofile:
+        sys.stderr.write(startup.report())
+
+    # Run by the scheduler in daemon and webhook modes
+    inbox.schedulecompact()
 
     # Check operation mode and call process as required
-    if options.daemon or plugin.config.config(key='daemon'):
+    if options.replay:
+        logger.info(msg="Running in replay mode")
+        replay.replay(filename=options.replay, pacing=options.replaypacing)
+
+    elif options.webhook:
         plugin.config.setconfig(key='daemon', value=True)
-        logger.info(msg="Running in daemon mode")
+        if options.webhooksecret:
+            plugin.config.setconfig(key='webhooksecret',
+                                    value=options.webhooksecret)
+        if not plugin.config.config(key='webhooksecret'):
+            plugin.config.setconfig(key='webhooksecret',
+                                    value=binascii.hexlify(os.urandom(16)))
+        secret = plugin.config.config(key='webhooksecret')
+
+        scheduler.start()
+        outbox.start()
+        server = webhook.start(port=options.webhookport, secret=secret)
+        if options.webhookurl:
+            setwebhook(url="%s/%s" % (options.webhookurl.rstrip("/"), secret))
+
+        logger.info(msg="Running in webhook mode")
+        process(inbox.pending())
         while plugin.config.config(key='daemon') == 'True':
-            process(getupdates())
-            sleep(int(plugin.config.config(key='sleep')))
+            process(webhook.getupdates())
+        server.shutdown()
+
+    elif options.daemon or plugin.config.config(key='daemon'):
+        plugin.config.setconfig(key='daemon', value=True)
+        logger.info(msg="Running in daemon mode")
+        scheduler.start()
+        outbox.start()
+        depth = int(plugin.config.config(key='prefetch', default=3))
+        if depth > 0:
+            # Fetch next batches while the current one is processed
+            pipeline.start(getupdates=getupdates, depth=depth)
+            while plugin.config.config(key='daemon') == 'True':
+                batch = pipeline.getbatch()
+                if batch:
+                    process(batch)
+            pipeline.stop()
+        else:
+            while plugin.config.config(key='daemon') == 'True':
+                count = process(getupdates())
+                # Adapt polling interval to the observed message rate
+                sleep(polling.nextsleep(count=count))
     else:
         logger.info(msg="Running in one-shoot mode")
+        # Updates left in the inbox by a previous daemon run go first
+        process(inbox.pending())
         process(getupdates())
 
+    # Let running jobs finish and send replies still queued before exiting
+    scheduler.shutdown(wait=True)
+    outbox.stop()
+
     logger.info(msg="Stopped execution")
     logging.shutdown()
     sys.exit(0)
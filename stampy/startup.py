@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Timing of imports and initialization at startup
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+import __builtin__
+import contextlib
+import threading
+import time
+
+# Original import function and thread doing the startup, while installed
+state = {"import": None, "thread": None, "started": None}
+
+# Module name -> [seconds including its own imports, seconds excluding them]
+imports = {}
+
+# Time spent by imports running inside the one being timed
+nested = []
+
+# Steps like initializing plugins, as (name, seconds)
+steps = []
+
+
+def install():
+    """
+    Starts timing imports done by the calling thread
+    :return:
+    """
+
+    if state["import"]:
+        return
+    state["import"] = __builtin__.__import__
+    state["thread"] = threading.current_thread()
+    state["started"] = time.time()
+    __builtin__.__import__ = timedimport
+    return
+
+
+def uninstall():
+    """
+    Stops timing imports
+    :return:
+    """
+
+    if state["import"]:
+        __builtin__.__import__ = state["import"]
+        state["import"] = None
+    return
+
+
+def installed():
+    """
+    Checks if startup is being timed
+    :return: True if timing
+    """
+
+    return state["import"] is not None
+
+
+def timedimport(name, globals=None, locals=None, fromlist=None, level=-1):
+    """
+    Replacement for __import__ recording time spent for each module
+    """
+
+    original = state["import"]
+    if threading.current_thread() is not state["thread"]:
+        return original(name, globals, locals, fromlist, level)
+
+    start = time.time()
+    nested.append(0.0)
+    try:
+        return original(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.time() - start
+        inner = nested.pop()
+        if nested:
+            nested[-1] += elapsed
+        entry = imports.setdefault(name, [0.0, 0.0])
+        entry[0] += elapsed
+        entry[1] += elapsed - inner
+
+
+@contextlib.contextmanager
+def timed(name):
+    """
+    Records time spent in the with block as a startup step, if timing
+    :param name: name of the step, like plugin.karma
+    """
+
+    if not installed():
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        steps.append((name, time.time() - start))
+
+
+def report(limit=20):
+    """
+    Stops timing and shows the slowest imports and steps
+    :param limit: number of modules and steps to show
+    :return: text with the tables
+    """
+
+    total = time.time() - state["started"] if state["started"] else 0.0
+    uninstall()
+
+    text = "Startup took %.1f ms\n" % (total * 1000)
+    text += "%-40s %9s %9s\n" % ("import", "self ms", "total ms")
+    for (name, (inclusive, own)) in sorted(imports.items(),
+                                           key=lambda item: item[1][1],
+                                           reverse=True)[:limit]:
+        text += "%-40s %9.1f %9.1f\n" % (name[:40], own * 1000,
+                                         inclusive * 1000)
+    text += "%-40s %9s\n" % ("step", "ms")
+    for (name, seconds) in sorted(steps, key=lambda item: item[1],
+                                  reverse=True)[:limit]:
+        text += "%-40s %9.1f\n" % (name[:40], seconds * 1000)
+    return text
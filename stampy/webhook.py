@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Local HTTP server receiving updates via Telegram webhooks
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+import BaseHTTPServer
+import hmac
+import json
+import logging
+import Queue
+import SocketServer
+import threading
+
+import inbox
+import latency
+
+# Updates received and pending to be processed
+updates = Queue.Queue()
+
+
+class WebhookHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Validates the secret path and queues the update received, answering
+    right away so Telegram doesn't retry the delivery
+    """
+
+    def do_POST(self):
+        logger = logging.getLogger(__name__)
+
+        if not hmac.compare_digest(self.path.strip("/"),
+                                   str(self.server.secret)):
+            logger.warning("Webhook call to invalid path %s from %s",
+                           self.path, self.client_address[0])
+            self.send_error(404)
+            return
+
+        try:
+            length = int(self.headers.getheader('content-length', 0))
+            if length < 0:
+                raise ValueError("Negative Content-Length %s" % length)
+            update = json.loads(self.rfile.read(length))
+            update_id = update['update_id']
+        except (ValueError, KeyError, TypeError), e:
+            # Bad length, not JSON, or JSON without an update_id
+            logger.warning("Malformed webhook body from %s: %s",
+                           self.client_address[0], e)
+            self.send_error(400)
+            return
+
+        # Store it before answering, as Telegram won't send it again
+        logger.debug("Webhook received update %s", update_id)
+        try:
+            inbox.add([update])
+        except Exception, e:
+            # Telegram retries the delivery if not answered with 200
+            logger.error("Error storing webhook update %s: %s", update_id, e)
+            self.send_error(503)
+            return
+        latency.pickedup([update])
+        updates.put(update)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        return
+
+    def log_message(self, format, *args):
+        logger = logging.getLogger(__name__)
+        logger.debug("Webhook %s: " + format, self.client_address[0],
+                     *args)
+        return
+
+
+class WebhookServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Threaded HTTP server so slow clients don't delay other deliveries
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start(port=8443, address="", secret=""):
+    """
+    Starts webhook server in background thread
+    :param port: port to listen on (0 for a random one)
+    :param address: address to bind to (all by default)
+    :param secret: path that Telegram will post updates to
+    :return: server instance
+    """
+
+    logger = logging.getLogger(__name__)
+    server = WebhookServer((address, int(port)), WebhookHandler)
+    server.secret = secret
+
+    thread = threading.Thread(target=server.serve_forever, name="webhook")
+    thread.daemon = True
+    thread.start()
+
+    logger.info("Webhook listening on %s:%s", *server.server_address)
+    return server
+
+
+def getupdates(limit=100, timeout=10):
+    """
+    Gets updates received via webhook, waiting for the first one
+    :param limit: maximum number of updates to return
+    :param timeout: seconds to wait for the first update
+    :return: returns the items received
+    """
+
+    logger = logging.getLogger(__name__)
+    try:
+        item = updates.get(timeout=timeout)
+    except Queue.Empty:
+        return
+
+    count = 1
+    logger.debug("Getting webhook updates and returning: %s", item)
+    yield item
+
+    while count < limit:
+        try:
+            item = updates.get_nowait()
+        except Queue.Empty:
+            return
+        count += 1
+        logger.debug("Getting webhook updates and returning: %s", item)
+        yield item
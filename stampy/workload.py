@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Description: Synthetic chat traffic for benchmarks
+# Author: Pablo Iranzo Gomez (Pablo.Iranzo@gmail.com)
+
+from __future__ import absolute_import
+
+import bisect
+import collections
+import itertools
+import random
+import time
+
+# Default traffic mix, shares are per update
+defaultmix = {"chats": 10,        # group chats sending messages
+              "users": 100,       # users writing in them
+              "words": 1000,      # vocabulary for karma words
+              "zipf": 1.1,        # exponent for popularity of karma words
+              "karma": 0.3,       # updates with word++ or word--
+              "alias": 0.1,       # karma words hitting an alias
+              "autokarma": 0.05,  # updates containing an autokarma key
+              "rank": 0.02,       # rank and srank commands
+              "quote": 0.02,      # /quote commands
+              "all": 0.005,       # @all pings
+              "channel": 0.1,     # channel posts instead of group messages
+              "aliases": 20,      # aliases defined by setup()
+              "autokeys": 10,     # autokarma keys defined by setup()
+              "interval": 1}      # seconds between update dates
+
+syllables = ["ka", "lo", "mi", "ne", "pu", "ra", "si", "to", "vu", "ze"]
+
+
+def getmix(**kwargs):
+    """
+    Gets traffic mix overriding defaults with arguments
+    :param kwargs: values to override from defaultmix
+    :return: mix as dict
+    """
+
+    mix = dict(defaultmix)
+    for key in kwargs:
+        if key not in mix:
+            raise KeyError("Unknown workload setting %s" % key)
+        mix[key] = kwargs[key]
+    return mix
+
+
+def getword(index):
+    """
+    Gets word for a position in vocabulary
+    :param index: position of word
+    :return: word made of syllables
+    """
+
+    word = ""
+    while True:
+        word += syllables[index % len(syllables)]
+        index //= len(syllables)
+        if not index:
+            break
+    return word + "x"
+
+
+def zipfweights(size, exponent):
+    """
+    Gets cumulative weights for Zipf distribution
+    :param size: number of elements
+    :param exponent: exponent of distribution
+    :return: list of cumulative weights
+    """
+
+    total = 0
+    weights = []
+    for rank in range(1, size + 1):
+        total += 1.0 / (rank ** exponent)
+        weights.append(total)
+    return weights
+
+
+def pick(weights, rng):
+    """
+    Picks an index according to cumulative weights
+    :param weights: cumulative weights
+    :param rng: random generator
+    :return: index picked
+    """
+
+    return bisect.bisect_left(weights, rng.random() * weights[-1])
+
+
+def gettext(mix, weights, rng):
+    """
+    Gets text for a message according to traffic mix
+    :param mix: traffic mix
+    :param weights: cumulative weights of karma words
+    :param rng: random generator
+    :return: message text
+    """
+
+    word = getword(pick(weights, rng))
+    choice = rng.random()
+
+    for share, kind in ((mix["rank"], "rank"), (mix["quote"], "quote"),
+                        (mix["all"], "all"),
+                        (mix["autokarma"], "autokarma"),
+                        (mix["karma"], "karma")):
+        if choice < share:
+            break
+        choice -= share
+    else:
+        kind = "text"
+
+    if kind == "rank":
+        if rng.random() < 0.5:
+            return "rank %s" % word
+        return "srank %s" % word[:3]
+    if kind == "quote":
+        if rng.random() < 0.1:
+            return "/quote add user%s %s said something" % (
+                rng.randrange(mix["users"]), word)
+        return "/quote user%s" % rng.randrange(mix["users"])
+    if kind == "all":
+        return "@all look at %s" % word
+    if kind == "autokarma" and mix["autokeys"]:
+        return "talking about autok%s again" % rng.randrange(mix["autokeys"])
+    if kind == "karma":
+        if mix["aliases"] and rng.random() < mix["alias"]:
+            word = "alias%s" % rng.randrange(mix["aliases"])
+        return "%s%s for that" % (word, rng.choice(["++", "--"]))
+    return "just chatting about %s and %s" % (word, getword(
+        rng.randrange(mix["words"])))
+
+
+def updates(count=False, start=1, seed=None, date=False, **kwargs):
+    """
+    Generates Telegram updates lazily, so any number can be streamed
+    :param count: number of updates to generate, endless if False
+    :param start: update_id of first update
+    :param seed: seed for random generator to repeat same traffic
+    :param date: date of first update, now by default
+    :param kwargs: traffic mix settings overriding defaultmix
+    :return: generator of updates
+    """
+
+    mix = getmix(**kwargs)
+    rng = random.Random(seed)
+    weights = zipfweights(mix["words"], mix["zipf"])
+    messageids = collections.Counter()
+    if not date:
+        date = int(time.time())
+
+    if count is False:
+        ids = itertools.count(start)
+    else:
+        ids = xrange(start, start + count)
+
+    for update_id in ids:
+        user = rng.randrange(mix["users"])
+        chat = rng.randrange(mix["chats"])
+        if rng.random() < mix["channel"]:
+            kind = "channel_post"
+            chat = {"id": -1002000000 - chat, "type": "channel",
+                    "title": "Channel %s" % chat}
+        else:
+            kind = "message"
+            chat = {"id": -1001000000 - chat, "type": "group",
+                    "title": "Chat %s" % chat}
+        messageids[chat["id"]] += 1
+
+        yield {"update_id": update_id,
+               kind: {"message_id": messageids[chat["id"]],
+                      "date": date + (update_id - start) * mix["interval"],
+                      "text": gettext(mix, weights, rng),
+                      "from": {"id": 1000 + user,
+                               "first_name": "User",
+                               "last_name": "%s" % user,
+                               "username": "user%s" % user},
+                      "chat": chat}}
+
+
+def setup(**kwargs):
+    """
+    Defines the aliases and autokarma keys that generated traffic hits
+    :param kwargs: traffic mix settings overriding defaultmix
+    :return:
+    """
+
+    # Imported here as plugins need stampy.stampy options parsed
+    import stampy.plugin.alias
+    import stampy.plugin.autokarma
+
+    mix = getmix(**kwargs)
+    for index in range(0, mix["aliases"]):
+        stampy.plugin.alias.createalias(word="alias%s" % index,
+                                        value=getword(index))
+    for index in range(0, mix["autokeys"]):
+        stampy.plugin.autokarma.createautok(word="autok%s" % index,
+                                            value=getword(index))
+    return
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
+import stampy.dedup
 import stampy.stampy
 import stampy.plugin.config
 
@@ -21,6 +22,9 @@ def clean():
     stampy.plugin.config.setconfig('owner', 'iranzo')
     stampy.plugin.config.setconfig('url', 'https://api.telegram.org/bot')
     stampy.plugin.config.setconfig('verbosity', 'DEBUG')
+    # Sends to the real API fail without network, don't wait to retry them
+    stampy.plugin.config.setconfig('retryattempts', 1)
+    stampy.plugin.config.deleteconfig('lastupdateid')
 
     # Empty karma database in case it contained some leftover
     stampy.stampy.dbsql('DELETE from karma')
@@ -28,4 +32,6 @@ def clean():
     stampy.stampy.dbsql('DELETE from autokarma')
     stampy.stampy.dbsql('DELETE from stats')
     stampy.stampy.dbsql('DELETE from quote')
+    stampy.stampy.dbsql('DELETE from inbox')
+    stampy.dedup.clear()
     stampy.stampy.dbsql('UPDATE SQLITE_SEQUENCE SET SEQ=0 WHERE NAME="quote"')
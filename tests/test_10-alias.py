@@ -58,8 +58,9 @@ class TestStampy(TestCase):
 
         stampy.plugin.alias.createalias('patata', 'creilla')
 
-        # Process alias instead via process()
-        text = [{u'message': {u'date': 1478361249, u'text': u'patata++', u'from': {u'username': u'iranzo', u'first_name': u'Pablo', u'last_name': u'Iranzo G\xf3mez', u'id': 5812695}, u'message_id': 108, u'chat': {u'all_members_are_administrators': True, u'type': u'group', u'id': -158164217, u'title': u'BOTdevel'}}, u'update_id': 837253571}]
+        # Process alias instead via process(), using a new update as repeated
+        # ones are discarded
+        text = [{u'message': {u'date': 1478361249, u'text': u'patata++', u'from': {u'username': u'iranzo', u'first_name': u'Pablo', u'last_name': u'Iranzo G\xf3mez', u'id': 5812695}, u'message_id': 109, u'chat': {u'all_members_are_administrators': True, u'type': u'group', u'id': -158164217, u'title': u'BOTdevel'}}, u'update_id': 837253572}]
         stampy.stampy.process(text)
 
         # Karma has been given to patata, but alias gave it to creilla and also it was combined with previous karma
@@ -74,7 +75,7 @@ class TestStampy(TestCase):
         self.assertEqual(stampy.plugin.karma.getkarma('patata'), 0)
 
         # Increase  karma again via process and revalidate
-        text = [{u'message': {u'date': 1478361249, u'text': u'patata++', u'from': {u'username': u'iranzo', u'first_name': u'Pablo', u'last_name': u'Iranzo G\xf3mez', u'id': 5812695}, u'message_id': 108, u'chat': {u'all_members_are_administrators': True, u'type': u'group', u'id': -158164217, u'title': u'BOTdevel'}}, u'update_id': 837253571}]
+        text = [{u'message': {u'date': 1478361249, u'text': u'patata++', u'from': {u'username': u'iranzo', u'first_name': u'Pablo', u'last_name': u'Iranzo G\xf3mez', u'id': 5812695}, u'message_id': 110, u'chat': {u'all_members_are_administrators': True, u'type': u'group', u'id': -158164217, u'title': u'BOTdevel'}}, u'update_id': 837253573}]
         stampy.stampy.process(text)
 
         self.assertEqual(stampy.plugin.karma.getkarma('creilla'), 2)
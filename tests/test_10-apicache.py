@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import threading
+import time
+from unittest import TestCase
+
+import cleanup
+import stampy.apicache
+import stampy.fakeapi
+import stampy.httpclient
+import stampy.plugin.config
+import stampy.plugin.stats
+import stampy.stampy
+
+calls = []
+
+
+def lookup():
+    calls.append(True)
+    time.sleep(0.05)
+    return len(calls)
+
+
+def failing():
+    calls.append(True)
+    raise ValueError("Failed lookup")
+
+
+class TestStampy(TestCase):
+    def setUp(self):
+        cleanup.clean()
+        stampy.apicache.clear()
+        del calls[:]
+
+    def tearDown(self):
+        for key in ['cachettl', 'cachesize']:
+            stampy.plugin.config.deleteconfig(key)
+        stampy.apicache.clear()
+        cleanup.clean()
+
+    def test_ttl(self):
+        key = stampy.apicache.getkey("getChat", 1)
+        self.assertEqual(stampy.apicache.get(key, lookup), 1)
+        self.assertEqual(stampy.apicache.get(key, lookup), 1)
+        self.assertEqual(len(calls), 1)
+
+        stampy.plugin.config.setconfig('cachettl', 0)
+        other = stampy.apicache.getkey("getChat", 2)
+        stampy.apicache.get(other, lookup)
+        # Expired at once, asked again
+        self.assertEqual(stampy.apicache.get(other, lookup), 3)
+
+    def test_lru(self):
+        stampy.plugin.config.setconfig('cachesize', 2)
+        keys = [stampy.apicache.getkey("getChat", chat) for chat in range(3)]
+        stampy.apicache.get(keys[0], lookup)
+        stampy.apicache.get(keys[1], lookup)
+        # Using the first one makes the second the least recently used
+        stampy.apicache.get(keys[0], lookup)
+        stampy.apicache.get(keys[2], lookup)
+        self.assertEqual(list(stampy.apicache.entries), [keys[0], keys[2]])
+
+    def test_coalesce(self):
+        key = stampy.apicache.getkey("getChatMember", 1, 5812695)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            stampy.apicache.get(key, lookup))) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # All threads got the answer of a single call
+        self.assertEqual(results, [1] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_errors(self):
+        key = stampy.apicache.getkey("getChat", 1)
+        self.assertRaises(ValueError, stampy.apicache.get, key, failing)
+        self.assertRaises(ValueError, stampy.apicache.get, key, failing)
+        self.assertEqual(len(calls), 2)
+
+    def test_invalidate(self):
+        stampy.httpclient.reset()
+        fake = stampy.fakeapi.FakeAPI(members=10)
+        stampy.plugin.config.setconfig('url', fake.start())
+        try:
+            self.assertEqual(
+                stampy.plugin.stats.getchatmemberscount(-158164217), "10")
+            fake.members = 11
+            self.assertEqual(
+                stampy.plugin.stats.getchatmemberscount(-158164217), "10")
+            self.assertEqual(fake.calls["getChatMembersCount"], 1)
+
+            # Someone joining the chat makes it ask again
+            message = {u'message': {u'date': 1478361249, u'new_chat_member': {u'username': u'other', u'first_name': u'Other', u'id': 1234}, u'from': {u'username': u'iranzo', u'first_name': u'Pablo', u'last_name': u'Iranzo G\xf3mez', u'id': 5812695}, u'message_id': 113, u'chat': {u'all_members_are_administrators': True, u'type': u'group', u'id': -158164217, u'title': u'BOTdevel'}}, u'update_id': 837253576}
+            stampy.plugin.stats.run(message)
+            self.assertEqual(
+                stampy.plugin.stats.getchatmemberscount(-158164217), "11")
+            self.assertEqual(fake.calls["getChatMembersCount"], 2)
+        finally:
+            stampy.httpclient.reset()
+            fake.stop()
@@ -4,6 +4,8 @@
 from unittest import TestCase
 
 import stampy.plugin.autokarma
+import stampy.plugin.karma
+import stampy.stampy
 import cleanup
 
 
@@ -18,3 +20,17 @@ class TestStampy(TestCase):
 
     def test_removeautok(self):
         self.assertEqual(stampy.plugin.autokarma.deleteautok('transcod', 'chupito'), True)
+
+    def test_wordsautok(self):
+        stampy.plugin.autokarma.createautok('pasta', 'tomate')
+        stampy.plugin.autokarma.createautok('pasta', 'queso')
+        message = {u'message': {u'date': 1478361249, u'text': u'some pasta for lunch', u'from': {u'username': u'iranzo', u'first_name': u'Pablo', u'last_name': u'Iranzo G\xf3mez', u'id': 5812695}, u'message_id': 112, u'chat': {u'all_members_are_administrators': True, u'type': u'group', u'id': -158164217, u'title': u'BOTdevel'}}, u'update_id': 837253575}
+        stampy.stampy.capture["enabled"] = True
+        try:
+            stampy.plugin.autokarma.autokarmawords(message)
+        finally:
+            stampy.stampy.capture["enabled"] = False
+        self.assertEqual(stampy.plugin.karma.getkarma('tomate'), 1)
+        self.assertEqual(stampy.plugin.karma.getkarma('queso'), 1)
+        stampy.plugin.autokarma.deleteautok('pasta', 'tomate')
+        stampy.plugin.autokarma.deleteautok('pasta', 'queso')
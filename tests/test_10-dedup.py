@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from unittest import TestCase
+
+import cleanup
+import stampy.dedup
+import stampy.plugin.karma
+import stampy.stampy
+
+update = {u'message': {u'date': 1478361249, u'text': u'hello', u'from': {u'username': u'iranzo', u'first_name': u'Pablo', u'last_name': u'Iranzo G\xf3mez', u'id': 5812695}, u'message_id': 108, u'chat': {u'all_members_are_administrators': True, u'type': u'group', u'id': -158164217, u'title': u'BOTdevel'}}, u'update_id': 837253571}
+
+
+class TestStampy(TestCase):
+    def test_duplicateupdate(self):
+        cleanup.clean()
+        self.assertEqual(stampy.stampy.process([update]), 1)
+        self.assertEqual(stampy.stampy.process([update, update]), 0)
+
+    def test_duplicatemessage(self):
+        cleanup.clean()
+        stampy.stampy.process([update])
+
+        # Same message delivered with a different update_id
+        other = dict(update)
+        other[u'update_id'] = 837253572
+        self.assertEqual(stampy.stampy.process([other]), 0)
+
+    def test_persisted(self):
+        cleanup.clean()
+        stampy.stampy.process([update])
+
+        # Window is loaded again from database as after a restart
+        stampy.dedup.window["loaded"] = False
+        self.assertTrue(stampy.dedup.seen(stampy.stampy.getmsgdetail(update)))
+
+    def test_window(self):
+        cleanup.clean()
+        stampy.plugin.config.setconfig('dedupwindow', 2)
+        for i in range(0, 3):
+            stampy.dedup.add({"update_id": i + 1, "chat_id": "",
+                              "message_id": ""})
+        stampy.dedup.commit()
+        self.assertFalse(stampy.dedup.seen({"update_id": 1, "chat_id": "",
+                                            "message_id": ""}))
+        self.assertTrue(stampy.dedup.seen({"update_id": 3, "chat_id": "",
+                                           "message_id": ""}))
+        stampy.plugin.config.deleteconfig('dedupwindow')
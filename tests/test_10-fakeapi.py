@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from unittest import TestCase
+
+import cleanup
+import stampy.fakeapi
+import stampy.plugin.config
+import stampy.stampy
+
+update = {u'message': {u'date': 1478361249, u'text': u'hello fake api', u'from': {u'username': u'iranzo', u'first_name': u'Pablo', u'last_name': u'Iranzo G\xf3mez', u'id': 5812695}, u'message_id': 111, u'chat': {u'all_members_are_administrators': True, u'type': u'group', u'id': -158164217, u'title': u'BOTdevel'}}, u'update_id': 837253574}
+
+
+class TestStampy(TestCase):
+    def test_getupdates(self):
+        cleanup.clean()
+        fake = stampy.fakeapi.FakeAPI()
+        stampy.plugin.config.setconfig('url', fake.start())
+        fake.addupdates([update])
+        try:
+            self.assertEqual(list(stampy.stampy.getupdates()), [update])
+            self.assertIn(update['update_id'], fake.delivered)
+            # Asking for following ones confirms it
+            self.assertEqual(list(stampy.stampy.getupdates(
+                offset=update['update_id'] + 1)), [])
+        finally:
+            fake.stop()
+            cleanup.clean()
+
+    def test_sendmessage(self):
+        cleanup.clean()
+        fake = stampy.fakeapi.FakeAPI()
+        stampy.plugin.config.setconfig('url', fake.start())
+        try:
+            stampy.stampy.sendmessage(chat_id=-158164217, text="fake",
+                                      reply_to_message_id=111)
+            (date, method, args) = fake.sent[0]
+            self.assertEqual(method, "sendMessage")
+            self.assertEqual(args["chat_id"], "-158164217")
+            self.assertEqual(args["reply_to_message_id"], "111")
+            self.assertEqual(fake.calls["sendMessage"], 1)
+        finally:
+            fake.stop()
+            cleanup.clean()
+
+    def test_injectederrors(self):
+        fake = stampy.fakeapi.FakeAPI(errorrate=1, errorcode=429)
+        (code, result) = fake.call("sendMessage", {"chat_id": "1"})
+        self.assertEqual(code, 429)
+        self.assertEqual(result["parameters"]["retry_after"], 1)
+        self.assertEqual(fake.errors["sendMessage"], 1)
+        self.assertEqual(fake.sent, [])
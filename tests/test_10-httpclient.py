@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import threading
+from unittest import TestCase
+
+import cleanup
+import stampy.fakeapi
+import stampy.httpclient
+import stampy.plugin.config
+import stampy.stampy
+
+
+class TestStampy(TestCase):
+    def test_keepalive(self):
+        cleanup.clean()
+        stampy.httpclient.reset()
+        fake = stampy.fakeapi.FakeAPI()
+        url = "%s/sendMessage?chat_id=-158164217&text=pooled" % fake.start()
+        try:
+            for i in range(5):
+                self.assertTrue(stampy.stampy.apicall(url)["ok"])
+            self.assertEqual(fake.calls["sendMessage"], 5)
+            # All calls went over the same connection
+            self.assertEqual(fake.connections, 1)
+        finally:
+            stampy.httpclient.reset()
+            fake.stop()
+            cleanup.clean()
+
+    def test_connectionlimit(self):
+        cleanup.clean()
+        stampy.httpclient.reset()
+        stampy.plugin.config.setconfig('httpconnections', 2)
+        fake = stampy.fakeapi.FakeAPI(latency=0.05)
+        url = "%s/getChatMembersCount?chat_id=1" % fake.start()
+        results = []
+        try:
+            threads = [threading.Thread(target=lambda: results.append(
+                stampy.httpclient.getjson(url))) for i in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(results), 6)
+            self.assertTrue(all(result["ok"] for result in results))
+            # Threads waited for the pooled connections instead of opening
+            # one each
+            self.assertLessEqual(fake.connections, 2)
+        finally:
+            stampy.httpclient.reset()
+            stampy.plugin.config.deleteconfig('httpconnections')
+            fake.stop()
+            cleanup.clean()
+
+    def test_errorbody(self):
+        cleanup.clean()
+        stampy.httpclient.reset()
+        fake = stampy.fakeapi.FakeAPI(errorrate=1, errorcode=429)
+        url = "%s/sendMessage?chat_id=1&text=limited" % fake.start()
+        try:
+            # Errors from Telegram come with a JSON body explaining them
+            result = stampy.httpclient.getjson(url)
+            self.assertFalse(result["ok"])
+            self.assertEqual(result["error_code"], 429)
+        finally:
+            stampy.httpclient.reset()
+            fake.stop()
+            cleanup.clean()
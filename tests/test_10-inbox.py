@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import threading
+import time
+from unittest import TestCase
+
+import cleanup
+import stampy.inbox
+import stampy.plugin.config
+import stampy.scheduler
+import stampy.stampy
+
+updates = [{u'message': {u'date': 1478361249, u'text': u'hello', u'from': {u'username': u'iranzo', u'first_name': u'Pablo', u'last_name': u'Iranzo G\xf3mez', u'id': 5812695}, u'message_id': 108, u'chat': {u'all_members_are_administrators': True, u'type': u'group', u'id': -158164217, u'title': u'BOTdevel'}}, u'update_id': 837253571}, {u'message': {u'date': 1478361259, u'text': u'it\'s me', u'from': {u'username': u'iranzo', u'first_name': u'Pablo', u'last_name': u'Iranzo G\xf3mez', u'id': 5812695}, u'message_id': 109, u'chat': {u'all_members_are_administrators': True, u'type': u'group', u'id': -158164217, u'title': u'BOTdevel'}}, u'update_id': 837253572}]
+
+
+class TestStampy(TestCase):
+    def test_addpending(self):
+        cleanup.clean()
+        self.assertEqual(stampy.inbox.add(updates), 2)
+
+        # Adding again the same updates is ignored
+        stampy.inbox.add(updates)
+        self.assertEqual(stampy.inbox.pending(), updates)
+        self.assertEqual(stampy.inbox.lastid(), 837253572)
+
+    def test_claimedarepending(self):
+        cleanup.clean()
+        stampy.inbox.add(updates)
+        stampy.inbox.claim(updates)
+
+        # Claimed updates not completed are returned again after a restart
+        self.assertEqual(stampy.inbox.pending(), updates)
+
+    def test_processcompletes(self):
+        cleanup.clean()
+        stampy.inbox.add(updates)
+        stampy.stampy.process(stampy.inbox.pending())
+        self.assertEqual(stampy.inbox.pending(), [])
+
+        stampy.inbox.compact()
+        self.assertEqual(stampy.inbox.lastid(), 0)
+
+    def test_schedulecompact(self):
+        cleanup.clean()
+        stampy.scheduler.shutdown()
+        stampy.inbox.add(updates)
+        stampy.stampy.process(stampy.inbox.pending())
+        try:
+            # Same job for polling and webhook modes
+            stampy.inbox.schedulecompact()
+            scheduler = stampy.scheduler.start(persistent=False)
+            job = scheduler.get_job('inboxcompact')
+            self.assertEqual(job.trigger.interval.total_seconds(),
+                             stampy.inbox.compactevery)
+            stampy.scheduler.runjob('inboxcompact')
+            self.assertEqual(stampy.inbox.lastid(), 0)
+        finally:
+            stampy.scheduler.shutdown()
+            stampy.scheduler.registry.clear()
+
+    def test_writeswhilesending(self):
+        cleanup.clean()
+        stampy.inbox.add(updates[0:1])
+        later = dict(updates[1])
+        stored = []
+        apicall = stampy.stampy.apicall
+
+        def storing(url):
+            # Another thread storing an update while the reply is sent
+            def add():
+                start = time.time()
+                stampy.inbox.add([later])
+                stored.append(time.time() - start)
+            thread = threading.Thread(target=add)
+            thread.start()
+            thread.join()
+            return {"ok": True, "result": []}
+
+        stampy.stampy.apicall = storing
+        try:
+            stampy.stampy.sendmessage(chat_id=1, text="direct")
+            del stored[:]
+            stampy.stampy.process([dict(updates[0], message=dict(
+                updates[0]["message"], text=u"stored++"))])
+        finally:
+            stampy.stampy.apicall = apicall
+        # The transaction of the update was over before sending
+        self.assertTrue(stored)
+        self.assertLess(max(stored), 1)
+        self.assertEqual(stampy.inbox.pending(), [later])
+
+    def test_failedupdate(self):
+        cleanup.clean()
+        stampy.inbox.add(updates)
+        processupdate = stampy.stampy.processupdate
+
+        def failing(message):
+            if message["update_id"] == updates[1]["update_id"]:
+                raise ValueError("Plugin failed")
+            return processupdate(message)
+
+        stampy.stampy.processupdate = failing
+        try:
+            self.assertRaises(ValueError, stampy.stampy.process,
+                              stampy.inbox.pending())
+        finally:
+            stampy.stampy.processupdate = processupdate
+        # Only the failed update is left to process again
+        self.assertEqual(stampy.inbox.pending(), updates[1:])
+        self.assertEqual(stampy.plugin.config.config('lastupdateid'),
+                         str(updates[0]["update_id"]))
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+import pstats
+import shutil
+import tempfile
+from unittest import TestCase
+
+import stampy.introspect
+import stampy.plugin.karma
+
+
+class TestStampy(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.prefix = os.path.join(self.directory, "stampy")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_profile(self):
+        self.assertFalse(stampy.introspect.stop(prefix=self.prefix))
+        self.assertTrue(stampy.introspect.start())
+        self.assertFalse(stampy.introspect.start())
+        stampy.plugin.karma.getkarma("patata")
+        (name, text) = stampy.introspect.stop(prefix=self.prefix)
+        self.assertTrue(name.startswith(self.prefix + "-profile-"))
+        self.assertIn("getkarma", text)
+        self.assertIn("karma.py", "".join(
+            [key[0] for key in pstats.Stats(name).stats]))
+
+    def test_memsnap(self):
+        (name, text) = stampy.introspect.memsnap(prefix=self.prefix)
+        self.assertTrue(os.path.exists(name))
+        self.assertIn("dict", text)
+        keep = [Exception() for i in range(0, 10000)]
+        (name, text) = stampy.introspect.memsnap(prefix=self.prefix)
+        self.assertIn("+10000", text)
+        del keep
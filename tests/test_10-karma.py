@@ -4,8 +4,11 @@
 from unittest import TestCase
 
 import stampy.plugin.karma
+import stampy.stampy
 import cleanup
 
+message = {u'message': {u'date': 1478361249, u'text': u'', u'from': {u'username': u'iranzo', u'first_name': u'Pablo', u'last_name': u'Iranzo G\xf3mez', u'id': 5812695}, u'message_id': 112, u'chat': {u'all_members_are_administrators': True, u'type': u'group', u'id': -158164217, u'title': u'BOTdevel'}}, u'update_id': 837253575}
+
 
 class TestStampy(TestCase):
     cleanup.clean()
@@ -21,3 +24,44 @@ class TestStampy(TestCase):
     def test_updatekarmarem(self):
         stampy.plugin.karma.updatekarma('patata', -1)
         self.assertEqual(stampy.plugin.karma.getkarma('patata'), 1)
+
+    def test_singlereply(self):
+        msgdetail = stampy.stampy.getmsgdetail(message)
+        msgdetail["text"] = u"uno++ dos++ tres++ cuatro-- cinco++"
+        stampy.stampy.capture["calls"].clear()
+        stampy.stampy.capture["enabled"] = True
+        try:
+            stampy.plugin.karma.karmaprocess(msgdetail)
+        finally:
+            stampy.stampy.capture["enabled"] = False
+        # All words answered in one message
+        self.assertEqual(stampy.stampy.capture["calls"]["sendMessage"], 1)
+        self.assertEqual(stampy.plugin.karma.getkarma('cuatro'), -1)
+
+    def test_stickersdeduped(self):
+        stampy.plugin.karma.putkarma('seis', 99)
+        stampy.plugin.karma.putkarma('siete', 99)
+        msgdetail = stampy.stampy.getmsgdetail(message)
+        msgdetail["text"] = u"seis++ siete++"
+        stampy.stampy.capture["calls"].clear()
+        stampy.stampy.capture["enabled"] = True
+        try:
+            stampy.plugin.karma.karmaprocess(msgdetail)
+        finally:
+            stampy.stampy.capture["enabled"] = False
+        self.assertEqual(stampy.stampy.capture["calls"]["sendMessage"], 1)
+        self.assertEqual(stampy.stampy.capture["calls"]["sendSticker"], 1)
+
+    def test_karmatokens(self):
+        tokens = stampy.plugin.karma.karmatokens
+        self.assertEqual(tokens(u"no operators here"), [])
+        self.assertEqual(tokens(u"Foo++ bar-- c++ foo++ x-y"),
+                         [(u"foo", u"++"), (u"bar", u"--")])
+        # Quotes and at signs are removed, new lines split words
+        self.assertEqual(tokens(u"@iranzo++\nit's-- ba'r+'+"),
+                         [(u"iranzo", u"++"), (u"its", u"--"),
+                          (u"bar", u"++")])
+        # Long dash written by phones counts as --
+        self.assertEqual(tokens(u"patata—"), [(u"patata", u"--")])
+        # Only operators ending the word count
+        self.assertEqual(tokens(u"c++rocks foo+++ a--b"), [(u"foo+", u"++")])
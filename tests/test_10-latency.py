@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from unittest import TestCase
+
+import cleanup
+import stampy.fakeapi
+import stampy.latency
+import stampy.plugin.config
+import stampy.stampy
+
+update = {u'message': {u'date': 1478361249, u'text': u'latency++', u'from': {u'username': u'iranzo', u'first_name': u'Pablo', u'last_name': u'Iranzo G\xf3mez', u'id': 5812695}, u'message_id': 114, u'chat': {u'all_members_are_administrators': True, u'type': u'group', u'id': -158164217, u'title': u'BOTdevel'}}, u'update_id': 837253577}
+
+
+class TestStampy(TestCase):
+    def test_stages(self):
+        stampy.latency.reset()
+        msgdetail = stampy.stampy.getmsgdetail(update)
+        date = msgdetail["date"]
+        stampy.latency.pickedup([update], now=date + 1)
+        stampy.latency.started(msgdetail, now=date + 2)
+        stampy.latency.processed(msgdetail, now=date + 3)
+        stampy.latency.replied(-158164217, 114, now=date + 4)
+        # Only first reply counts
+        stampy.latency.replied(-158164217, 114, now=date + 9)
+
+        percentiles = stampy.latency.getpercentiles()
+        self.assertEqual(percentiles["pickup"], (1, 1, 1, 1))
+        self.assertEqual(percentiles["processed"], (1, 3, 3, 3))
+        self.assertEqual(percentiles["replied"], (1, 4, 4, 4))
+        self.assertEqual(stampy.latency.getpercentiles(
+            chat_id=-158164217)["replied"][0], 1)
+        self.assertEqual(stampy.latency.getpercentiles(
+            chat_id=1)["replied"][0], 0)
+        self.assertEqual(stampy.latency.slowest(), [("-158164217", 4)])
+        self.assertIn("-158164217", stampy.latency.showlatency())
+
+    def test_boundedchats(self):
+        stampy.latency.reset()
+        for chat in range(0, stampy.latency.maxchats + 10):
+            stampy.latency.add("pickup", chat, 1)
+        self.assertEqual(len(stampy.latency.samples["chats"]),
+                         stampy.latency.maxchats)
+        self.assertEqual(stampy.latency.getpercentiles()["pickup"][0],
+                         stampy.latency.globalsamples)
+
+    def test_processreply(self):
+        cleanup.clean()
+        stampy.latency.reset()
+        fake = stampy.fakeapi.FakeAPI()
+        stampy.plugin.config.setconfig('url', fake.start())
+        fake.addupdates([update])
+        try:
+            stampy.stampy.process(stampy.stampy.getupdates())
+        finally:
+            fake.stop()
+            cleanup.clean()
+        percentiles = stampy.latency.getpercentiles(chat_id=-158164217)
+        for stage in stampy.latency.stages:
+            self.assertEqual(percentiles[stage][0], 1)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import logging
+import threading
+from unittest import TestCase
+
+import stampy.logqueue
+import stampy.metrics
+
+
+class ListHandler(logging.Handler):
+    """
+    Keeps formatted records, optionally waiting before writing them
+    """
+
+    def __init__(self, wait=None):
+        logging.Handler.__init__(self)
+        self.lines = []
+        self.threads = []
+        self.wait = wait
+
+    def emit(self, record):
+        if self.wait:
+            self.wait.wait()
+        self.threads.append(threading.current_thread().name)
+        self.lines.append(self.format(record))
+
+
+class TestStampy(TestCase):
+    def getlogger(self, handler):
+        logger = logging.getLogger("stampy.test.logqueue")
+        logger.handlers = []
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(handler)
+        return logger
+
+    def test_writtenbythread(self):
+        target = ListHandler()
+        handler = stampy.logqueue.QueueHandler(handlers=[target])
+        logger = self.getlogger(handler)
+        logger.debug("Update %s in chat %s", 1, -2)
+        handler.close()
+        self.assertEqual(target.lines, ["Update 1 in chat -2"])
+        self.assertEqual(target.threads, ["logwriter"])
+
+    def test_argschanged(self):
+        wait = threading.Event()
+        target = ListHandler(wait=wait)
+        handler = stampy.logqueue.QueueHandler(handlers=[target])
+        logger = self.getlogger(handler)
+        members = [1, 2]
+        logger.debug("Members %s", members)
+        # Caller changes args before the writer gets the record
+        members.remove(1)
+        wait.set()
+        handler.close()
+        self.assertEqual(target.lines, ["Members [1, 2]"])
+
+    def test_handlerlevel(self):
+        target = ListHandler()
+        target.setLevel(logging.INFO)
+        handler = stampy.logqueue.QueueHandler(handlers=[target])
+        logger = self.getlogger(handler)
+        logger.debug("hidden")
+        logger.info("shown")
+        handler.close()
+        self.assertEqual(target.lines, ["shown"])
+
+    def test_exception(self):
+        target = ListHandler()
+        handler = stampy.logqueue.QueueHandler(handlers=[target])
+        logger = self.getlogger(handler)
+        try:
+            raise ValueError("broken")
+        except ValueError:
+            logger.exception("Failed")
+        handler.close()
+        self.assertIn("Failed", target.lines[0])
+        self.assertIn("ValueError: broken", target.lines[0])
+
+    def test_dropwhenfull(self):
+        stampy.metrics.reset()
+        wait = threading.Event()
+        target = ListHandler(wait=wait)
+        handler = stampy.logqueue.QueueHandler(handlers=[target], maxsize=2)
+        logger = self.getlogger(handler)
+        for i in range(10):
+            logger.info("Line %s", i)
+        self.assertLessEqual(handler.waiting(), 2)
+        dropped = stampy.metrics.counters[("log_dropped", ())]
+        wait.set()
+        handler.close()
+        self.assertEqual(len(target.lines) + dropped, 10)
+        self.assertGreaterEqual(dropped, 7)
+        stampy.metrics.reset()
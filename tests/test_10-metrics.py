@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import urllib2
+from unittest import TestCase
+
+import cleanup
+import stampy.metrics
+import stampy.stampy
+
+update = {u'message': {u'date': 1478361249, u'text': u'hello metrics', u'from': {u'username': u'iranzo', u'first_name': u'Pablo', u'last_name': u'Iranzo G\xf3mez', u'id': 5812695}, u'message_id': 113, u'chat': {u'all_members_are_administrators': True, u'type': u'group', u'id': -158164217, u'title': u'BOTdevel'}}, u'update_id': 837253576}
+
+
+class TestStampy(TestCase):
+    def test_percentile(self):
+        stampy.metrics.reset()
+        for i in range(0, 99):
+            stampy.metrics.record("fast", 0.001)
+        stampy.metrics.record("fast", 2)
+        histogram = stampy.metrics.gethistogram("fast")
+        self.assertEqual(histogram["count"], 100)
+        self.assertEqual(histogram["max"], 2)
+        # Upper bound of the bucket holding 1ms
+        self.assertEqual(stampy.metrics.percentile(histogram, 50), 0.0016)
+        self.assertEqual(stampy.metrics.percentile(histogram, 100), 2)
+
+    def test_window(self):
+        stampy.metrics.reset()
+        now = 1478361249
+        stampy.metrics.record("old", 1, now=now - 3600)
+        stampy.metrics.record("old", 1, now=now)
+        self.assertEqual(stampy.metrics.gethistogram(
+            "old", window=10, now=now)["count"], 1)
+        self.assertEqual(stampy.metrics.gethistogram("old")["count"], 2)
+
+    def test_boundedslots(self):
+        stampy.metrics.reset()
+        for minute in range(0, stampy.metrics.maxslots * 2):
+            stampy.metrics.record("many", 0.1, now=minute * 60)
+        self.assertEqual(len(stampy.metrics.timers["many"]["slots"]),
+                         stampy.metrics.maxslots)
+
+    def test_top(self):
+        stampy.metrics.reset()
+        stampy.metrics.record("plugin.slow", 1)
+        stampy.metrics.record("plugin.busy", 0.1)
+        stampy.metrics.record("plugin.busy", 0.1)
+        stampy.metrics.record("plugin.busy", 0.9)
+        self.assertEqual([item[0] for item in stampy.metrics.top()],
+                         ["plugin.busy", "plugin.slow"])
+        self.assertEqual([item[0] for item in stampy.metrics.top("p99")],
+                         ["plugin.slow", "plugin.busy"])
+        self.assertIn("plugin.busy", stampy.metrics.showperf())
+
+    def test_processtimed(self):
+        cleanup.clean()
+        stampy.metrics.reset()
+        stampy.stampy.process([update])
+        names = [item[0] for item in stampy.metrics.top(limit=100)]
+        self.assertIn("plugin.karma", names)
+        self.assertIn("sql", names)
+        cleanup.clean()
+
+    def test_exposition(self):
+        stampy.metrics.reset()
+        stampy.metrics.inc("api_calls", method="sendMessage", result="ok")
+        stampy.metrics.inc("api_calls", method="sendMessage", result="ok")
+        stampy.metrics.observe("batch_size", 3)
+        stampy.metrics.record("sql", 0.001)
+        stampy.metrics.gauge("queue_depth", lambda: 7, queue="test")
+        text = stampy.metrics.exposition()
+        self.assertIn('stampy_api_calls_total{method="sendMessage",'
+                      'result="ok"} 2', text)
+        self.assertIn('stampy_batch_size_bucket{le="2"} 0', text)
+        self.assertIn('stampy_batch_size_bucket{le="5"} 1', text)
+        self.assertIn('stampy_batch_size_count 1', text)
+        self.assertIn('stampy_duration_seconds_count{timer="sql"} 1', text)
+        self.assertIn('stampy_queue_depth{queue="test"} 7', text)
+        del stampy.metrics.gauges[("queue_depth", (("queue", "test"),))]
+
+    def test_serve(self):
+        stampy.metrics.reset()
+        stampy.metrics.inc("updates", 5)
+        server = stampy.metrics.serve(port=0)
+        try:
+            url = "http://127.0.0.1:%s" % server.server_address[1]
+            text = urllib2.urlopen(url + "/metrics", timeout=5).read()
+            self.assertIn("stampy_updates_total 5", text)
+            with self.assertRaises(urllib2.HTTPError):
+                urllib2.urlopen(url + "/other", timeout=5)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_processcounted(self):
+        cleanup.clean()
+        stampy.metrics.reset()
+        stampy.stampy.process([update, update])
+        text = stampy.metrics.exposition()
+        self.assertIn("stampy_updates_total 1", text)
+        self.assertIn("stampy_duplicates_total 1", text)
+        self.assertIn("stampy_batch_size_count 1", text)
+        cleanup.clean()
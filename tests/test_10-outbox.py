@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+import cleanup
+import stampy.fakeapi
+import stampy.httpclient
+import stampy.outbox
+import stampy.plugin.config
+import stampy.stampy
+
+
+class TestStampy(TestCase):
+    def setUp(self):
+        cleanup.clean()
+        # Retries are tested with the default number of attempts
+        stampy.plugin.config.deleteconfig('retryattempts')
+        stampy.httpclient.reset()
+
+    def tearDown(self):
+        stampy.outbox.stop(timeout=0)
+        stampy.outbox.chats.clear()
+        del stampy.outbox.ready[:]
+        for key in ['chatrate', 'globalrate', 'retrydelay', 'retryattempts']:
+            stampy.plugin.config.deleteconfig(key)
+        stampy.httpclient.reset()
+        cleanup.clean()
+
+    def test_bucket(self):
+        bucket = stampy.outbox.newbucket(rate=1, now=100)
+        self.assertEqual(stampy.outbox.wait(bucket, now=100), 0)
+        bucket["tokens"] -= 1
+        self.assertAlmostEqual(stampy.outbox.wait(bucket, now=100.25), 0.75)
+        self.assertEqual(stampy.outbox.wait(bucket, now=101), 0)
+
+        # Faster buckets allow bursts up to their rate
+        bucket = stampy.outbox.newbucket(rate=30, now=100)
+        bucket["tokens"] -= 30
+        self.assertAlmostEqual(stampy.outbox.wait(bucket, now=100), 1 / 30.0)
+        self.assertEqual(stampy.outbox.wait(bucket, now=200), 0)
+        self.assertEqual(bucket["tokens"], 30)
+
+    def test_nonblocking(self):
+        fake = stampy.fakeapi.FakeAPI(latency=0.2)
+        stampy.plugin.config.setconfig('url', fake.start())
+        stampy.plugin.config.setconfig('chatrate', 100)
+        stampy.outbox.start(workers=2)
+        try:
+            start = time.time()
+            for i in range(3):
+                stampy.stampy.sendmessage(chat_id=-158164217, text="%s" % i)
+            # Caller moves on while workers wait for the API
+            self.assertLess(time.time() - start, 0.1)
+            self.assertTrue(stampy.outbox.flush(timeout=5))
+            self.assertEqual([args["text"] for (date, method, args) in
+                              fake.sent], ["0", "1", "2"])
+        finally:
+            fake.stop()
+
+    def test_chatorder(self):
+        fake = stampy.fakeapi.FakeAPI(jitter=0.02)
+        stampy.plugin.config.setconfig('url', fake.start())
+        stampy.plugin.config.setconfig('chatrate', 1000)
+        stampy.plugin.config.setconfig('globalrate', 1000)
+        stampy.outbox.start(workers=4)
+        try:
+            for i in range(10):
+                for chat in [1, 2, 3]:
+                    stampy.stampy.sendmessage(chat_id=chat, text="%s" % i)
+            self.assertTrue(stampy.outbox.flush(timeout=5))
+            for chat in ["1", "2", "3"]:
+                # Several workers but messages of each chat keep their order
+                self.assertEqual([args["text"] for (date, method, args) in
+                                  fake.sent if args["chat_id"] == chat],
+                                 ["%s" % i for i in range(10)])
+        finally:
+            fake.stop()
+
+    def test_chatrate(self):
+        fake = stampy.fakeapi.FakeAPI()
+        stampy.plugin.config.setconfig('url', fake.start())
+        stampy.plugin.config.setconfig('chatrate', 10)
+        stampy.outbox.start(workers=4)
+        try:
+            for i in range(13):
+                stampy.stampy.sendmessage(chat_id=1, text="%s" % i)
+            stampy.stampy.sendmessage(chat_id=2, text="other")
+            self.assertTrue(stampy.outbox.flush(timeout=5))
+            times = dict((args["text"], date) for (date, method, args) in
+                         fake.sent)
+            # After a burst of 10, the chat gets one message each 0.1s
+            self.assertGreaterEqual(times["12"] - times["0"], 0.25)
+            # Other chats are not held by it
+            self.assertLess(times["other"] - times["0"], 0.1)
+        finally:
+            fake.stop()
+
+    def test_globalrate(self):
+        fake = stampy.fakeapi.FakeAPI()
+        stampy.plugin.config.setconfig('url', fake.start())
+        stampy.plugin.config.setconfig('globalrate', 10)
+        stampy.outbox.start(workers=4)
+        try:
+            for chat in range(13):
+                stampy.stampy.sendmessage(chat_id=chat, text="%s" % chat)
+            self.assertTrue(stampy.outbox.flush(timeout=5))
+            dates = sorted(date for (date, method, args) in fake.sent)
+            self.assertEqual(len(dates), 13)
+            self.assertGreaterEqual(dates[-1] - dates[0], 0.25)
+        finally:
+            fake.stop()
+
+    def test_retryafter(self):
+        fake = stampy.fakeapi.FakeAPI(errorrate=1, errorcode=429)
+        stampy.plugin.config.setconfig('url', fake.start())
+        stampy.outbox.start(workers=2)
+        try:
+            stampy.stampy.sendmessage(chat_id=1, text="limited")
+            while not fake.errors["sendMessage"]:
+                time.sleep(0.01)
+            limited = time.time()
+            fake.errorrate = 0
+            self.assertTrue(stampy.outbox.flush(timeout=5))
+            # Sent again only after the retry_after answered
+            (date, method, args) = fake.sent[0]
+            self.assertGreaterEqual(date - limited, 0.9)
+            self.assertEqual(args["text"], "limited")
+            self.assertEqual(fake.calls["sendMessage"], 2)
+        finally:
+            fake.stop()
+
+    def test_floodlimit(self):
+        fake = stampy.fakeapi.FakeAPI(errorrate=1, errorcode=429)
+        stampy.plugin.config.setconfig('url', fake.start())
+        stampy.outbox.start(workers=2)
+        try:
+            stampy.stampy.sendmessage(chat_id=1, text="limited")
+            while not fake.errors["sendMessage"]:
+                time.sleep(0.01)
+            limited = time.time()
+            fake.errorrate = 0
+            stampy.stampy.sendmessage(chat_id=2, text="other")
+            self.assertTrue(stampy.outbox.flush(timeout=5))
+            # Other chats also wait for the retry_after, as it's per bot
+            for (date, method, args) in fake.sent:
+                self.assertGreaterEqual(date - limited, 0.9)
+            self.assertEqual(len(fake.sent), 2)
+        finally:
+            fake.stop()
+
+    def test_deadletterpath(self):
+        database = stampy.stampy.options.database
+        directory = tempfile.mkdtemp(suffix=".stampy")
+        stampy.stampy.options.database = os.path.join(directory, "stampy.db")
+        try:
+            stampy.outbox.deadletter(1, {"method": "sendMessage",
+                                         "url": "url?chat_id=1&text=lost",
+                                         "attempts": 1}, {"ok": False})
+            self.assertEqual(os.listdir(directory),
+                             ["stampy-deadletter.jsonl"])
+        finally:
+            stampy.stampy.options.database = database
+            shutil.rmtree(directory)
+
+    def test_retryable(self):
+        self.assertTrue(stampy.outbox.retryable({"ok": False,
+                                                 "description": "timeout"}))
+        self.assertTrue(stampy.outbox.retryable({"ok": False,
+                                                 "error_code": 429}))
+        self.assertTrue(stampy.outbox.retryable({"ok": False,
+                                                 "error_code": 502}))
+        self.assertFalse(stampy.outbox.retryable({"ok": False,
+                                                  "error_code": 400}))
+        self.assertFalse(stampy.outbox.retryable({"ok": False,
+                                                  "error_code": 403}))
+
+    def test_backoff(self):
+        stampy.outbox.loadretry()
+        failed = {"ok": False, "error_code": 502}
+        for attempts in range(1, 6):
+            delay = stampy.outbox.backoff(attempts, failed)
+            self.assertGreaterEqual(delay, 2 ** (attempts - 1) / 2.0)
+            self.assertLessEqual(delay, 2 ** (attempts - 1))
+        self.assertLessEqual(stampy.outbox.backoff(20, failed), 300)
+        self.assertEqual(stampy.outbox.backoff(1, {
+            "ok": False, "error_code": 429,
+            "parameters": {"retry_after": 7}}), 7)
+
+    def test_nodelay(self):
+        fake = stampy.fakeapi.FakeAPI()
+        stampy.plugin.config.setconfig('url', fake.start())
+        try:
+            start = time.time()
+            for i in range(5):
+                stampy.stampy.sendmessage(chat_id=1, text="%s" % i)
+            # Successful sends don't wait
+            self.assertLess(time.time() - start, 0.5)
+            self.assertEqual(fake.calls["sendMessage"], 5)
+        finally:
+            fake.stop()
+
+    def test_deadletter(self):
+        filename = "%s-deadletter.jsonl" % (
+            os.path.splitext(stampy.stampy.options.database)[0])
+        if os.path.exists(filename):
+            os.remove(filename)
+        fake = stampy.fakeapi.FakeAPI(errorrate=1, errorcode=403)
+        stampy.plugin.config.setconfig('url', fake.start())
+        try:
+            result = stampy.stampy.sendsticker(chat_id=1, sticker="kicked")
+            self.assertEqual(result["error_code"], 403)
+            # Permanent errors are not retried
+            self.assertEqual(fake.calls["sendSticker"], 1)
+            with open(filename) as f:
+                lines = [json.loads(line) for line in f]
+            self.assertEqual(len(lines), 1)
+            self.assertEqual(lines[0]["method"], "sendSticker")
+            self.assertEqual(lines[0]["args"], "chat_id=1&sticker=kicked")
+            self.assertNotIn(stampy.plugin.config.config('token'),
+                             json.dumps(lines[0]))
+        finally:
+            fake.stop()
+            os.remove(filename)
+
+    def test_queuedbackoff(self):
+        fake = stampy.fakeapi.FakeAPI(errorrate=1, errorcode=502)
+        stampy.plugin.config.setconfig('url', fake.start())
+        stampy.plugin.config.setconfig('retrydelay', 0.2)
+        stampy.outbox.start(workers=2)
+        try:
+            stampy.stampy.sendmessage(chat_id=1, text="failing")
+            stampy.stampy.sendmessage(chat_id=2, text="other")
+            while fake.errors["sendMessage"] < 2:
+                time.sleep(0.01)
+            fake.errorrate = 0
+            self.assertTrue(stampy.outbox.flush(timeout=5))
+            self.assertEqual(sorted(args["text"] for (date, method, args) in
+                                    fake.sent), ["failing", "other"])
+        finally:
+            fake.stop()
+
+    def test_queuedgiveup(self):
+        filename = "%s-deadletter.jsonl" % (
+            os.path.splitext(stampy.stampy.options.database)[0])
+        fake = stampy.fakeapi.FakeAPI(errorrate=1, errorcode=500)
+        stampy.plugin.config.setconfig('url', fake.start())
+        stampy.plugin.config.setconfig('retrydelay', 0.01)
+        stampy.plugin.config.setconfig('retryattempts', 3)
+        stampy.outbox.start(workers=2)
+        try:
+            stampy.stampy.sendmessage(chat_id=1, text="lost")
+            self.assertTrue(stampy.outbox.flush(timeout=5))
+            self.assertEqual(fake.calls["sendMessage"], 3)
+            with open(filename) as f:
+                self.assertEqual(json.loads(f.readline())["attempts"], 3)
+        finally:
+            fake.stop()
+            os.remove(filename)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from unittest import TestCase
+
+import cleanup
+import stampy.pipeline
+import stampy.plugin.config
+
+
+def getupdates(offset=0, limit=100):
+    """
+    Returns updates starting at offset, as server would do
+    """
+    offsets.append(offset)
+    limits.append(limit)
+    if not offset:
+        offset = 1
+    return [{u'update_id': i} for i in range(offset, min(offset + limit, 21))]
+
+
+offsets = []
+limits = []
+
+
+class TestStampy(TestCase):
+    cleanup.clean()
+    stampy.plugin.config.setconfig('sleep', 1)
+
+    def test_prefetch(self):
+        stampy.pipeline.start(getupdates=getupdates, depth=2, maxlimit=10)
+        received = []
+        while len(received) < 20:
+            batch = stampy.pipeline.getbatch(timeout=5)
+            self.assertTrue(batch)
+            received.extend(batch)
+        stampy.pipeline.stop()
+
+        # All updates arrive in order and offsets advance after each batch
+        self.assertEqual([i['update_id'] for i in received], range(1, 21))
+        self.assertEqual(offsets[0], 0)
+        self.assertEqual(offsets[1], 11)
+        self.assertEqual(limits[0], 10)
+
+    def test_batchlimit(self):
+        stampy.pipeline.batches = stampy.pipeline.Queue.Queue(maxsize=4)
+        self.assertEqual(stampy.pipeline.batchlimit(maxlimit=100), 100)
+        stampy.pipeline.batches.put([])
+        stampy.pipeline.batches.put([])
+        self.assertEqual(stampy.pipeline.batchlimit(maxlimit=100), 50)
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import datetime
+from unittest import TestCase
+
+import cleanup
+import stampy.plugin.config
+import stampy.polling
+
+
+class TestStampy(TestCase):
+    cleanup.clean()
+    stampy.plugin.config.setconfig('sleep', 10)
+    stampy.plugin.config.setconfig('minsleep', 1)
+    now = datetime.datetime(2016, 11, 5, 16, 0, 0)
+
+    def test_quiet(self):
+        stampy.polling.rates["batch"] = 0.0
+        stampy.polling.rates["hours"] = [0.0] * 24
+        self.assertEqual(stampy.polling.nextsleep(count=0, now=self.now), 10)
+
+    def test_busy(self):
+        for i in range(0, 20):
+            sleep = stampy.polling.nextsleep(count=20, now=self.now)
+        self.assertEqual(sleep, 1)
+
+    def test_fullbatch(self):
+        self.assertEqual(stampy.polling.nextsleep(count=100, limit=100,
+                                                  now=self.now), 0)
+
+    def test_showpolling(self):
+        self.assertIn("Sleep:", stampy.polling.showpolling())
@@ -3,6 +3,8 @@
 
 from unittest import TestCase
 
+import cleanup
+import stampy.plugin.config
 import stampy.stampy
 
 true = True
@@ -26,3 +28,11 @@ class TestStampy(TestCase):
     def test_process(self):
         text = ""
         stampy.stampy.process(text)
+
+    def test_lastupdateid(self):
+        cleanup.clean()
+        update = [{u'message': {u'date': 1478361249, u'text': u'hello', u'from': {u'username': u'iranzo', u'first_name': u'Pablo', u'last_name': u'Iranzo G\xf3mez', u'id': 5812695}, u'message_id': 108, u'chat': {u'all_members_are_administrators': True, u'type': u'group', u'id': -158164217, u'title': u'BOTdevel'}}, u'update_id': 837253571}]
+        stampy.stampy.process(update)
+
+        # Last update processed is stored to be used as offset
+        self.assertEqual(stampy.plugin.config.config('lastupdateid'), '837253571')
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import logging
+from unittest import TestCase
+
+import cleanup
+import stampy.plugin.config
+import stampy.plugin.karma
+import stampy.querylog
+import stampy.stampy
+
+
+class TestStampy(TestCase):
+    def test_normalize(self):
+        self.assertEqual(stampy.querylog.normalize(
+            "SELECT * FROM karma WHERE word='it''s'  AND value>10;"),
+            "SELECT * FROM karma WHERE word=? AND value>?;")
+        self.assertEqual(stampy.querylog.normalize(
+            "DELETE FROM stats WHERE id IN (1, 2, 3)"),
+            "DELETE FROM stats WHERE id IN (...)")
+
+    def test_shapes(self):
+        stampy.querylog.reset()
+        stampy.plugin.karma.getkarma("patata")
+        stampy.plugin.karma.getkarma("tomate")
+        shapes = dict(stampy.querylog.top(key="count", limit=100))
+        stats = shapes["SELECT * FROM karma WHERE word=?;"]
+        self.assertEqual(stats["count"], 2)
+        self.assertEqual(stats["slow"], 0)
+
+    def test_slowquery(self):
+        cleanup.clean()
+        stampy.plugin.config.setconfig('slowquery', 0)
+        stampy.querylog.settings["calls"] = 0
+        stampy.querylog.reset()
+        try:
+            stampy.plugin.karma.getkarma("patata")
+            shapes = dict(stampy.querylog.top(key="slow", limit=100))
+            stats = shapes["SELECT * FROM karma WHERE word=?;"]
+            self.assertEqual(stats["slow"], 1)
+            self.assertEqual(stats["caller"], "plugin.karma")
+            self.assertIn("karma", stats["plan"])
+            self.assertIn("plugin.karma",
+                          stampy.querylog.showqueries(key="slow"))
+        finally:
+            stampy.plugin.config.deleteconfig('slowquery')
+            stampy.querylog.settings["calls"] = 0
+            stampy.querylog.reset()
+
+    def test_slowqueryinbatch(self):
+        cleanup.clean()
+        stampy.plugin.config.setconfig('slowquery', 0)
+        stampy.querylog.settings["calls"] = 0
+        stampy.querylog.reset()
+        try:
+            stampy.stampy.dbbegin()
+            stampy.plugin.karma.putkarma("patata", 5)
+            stampy.stampy.dbrollback()
+            # Getting the plan didn't commit the batch
+            self.assertEqual(stampy.plugin.karma.getkarma("patata"), 0)
+            shapes = dict(stampy.querylog.top(key="slow", limit=100))
+            self.assertNotIn("unavailable",
+                             shapes["DELETE FROM karma WHERE word = ?;"][
+                                 "plan"])
+        finally:
+            stampy.plugin.config.deleteconfig('slowquery')
+            stampy.querylog.settings["calls"] = 0
+            stampy.querylog.reset()
+
+    def test_slowquerylogged(self):
+        cleanup.clean()
+        package = stampy.stampy.packagelogger()
+        (handlers, level) = (list(package.handlers), package.level)
+        stampy.plugin.config.setconfig('database', 'stampy.db')
+        stampy.stampy.conflogging()
+        added = [handler for handler in package.handlers if
+                 handler not in handlers]
+        # Only the file is kept, to not write on the console
+        for handler in added:
+            if not isinstance(handler, logging.FileHandler):
+                package.removeHandler(handler)
+        stampy.plugin.config.setconfig('slowquery', 0)
+        stampy.querylog.settings["calls"] = 0
+        stampy.querylog.reset()
+        try:
+            stampy.plugin.karma.getkarma("patata")
+            files = [handler.baseFilename for handler in package.handlers
+                     if handler in added]
+            self.assertEqual(len(files), 1)
+            with open(files[0]) as log:
+                self.assertIn("stampy.querylog : record", log.read())
+        finally:
+            for handler in added:
+                package.removeHandler(handler)
+                handler.close()
+            package.setLevel(level)
+            stampy.plugin.config.deleteconfig('database')
+            stampy.plugin.config.deleteconfig('slowquery')
+            stampy.querylog.settings["calls"] = 0
+            stampy.querylog.reset()
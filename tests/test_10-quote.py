@@ -8,8 +8,8 @@ import stampy.plugin.quote
 
 class TestStampy(TestCase):
     def test_addquote(self):
-        # Last row was 0 before insert
-        self.assertEqual(stampy.plugin.quote.addquote('iranzo', 'now', 'Test'), 0)
+        # Returns the id of the quote just inserted
+        self.assertEqual(stampy.plugin.quote.addquote('iranzo', 'now', 'Test'), 1)
 
     def test_getquote(self):
         self.assertEqual(stampy.plugin.quote.getquote(),
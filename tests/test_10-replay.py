@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+import sqlite3
+import tempfile
+from unittest import TestCase
+
+import cleanup
+import stampy.plugin.config
+import stampy.plugin.karma
+import stampy.replay
+import stampy.stampy
+
+updates = [{u'message': {u'date': 1478361249, u'text': u'replay++', u'from': {u'username': u'iranzo', u'first_name': u'Pablo', u'last_name': u'Iranzo G\xf3mez', u'id': 5812695}, u'message_id': 108, u'chat': {u'all_members_are_administrators': True, u'type': u'group', u'id': -158164217, u'title': u'BOTdevel'}}, u'update_id': 837253571}, {u'message': {u'date': 1478361250, u'text': u'replay++', u'from': {u'username': u'iranzo', u'first_name': u'Pablo', u'last_name': u'Iranzo G\xf3mez', u'id': 5812695}, u'message_id': 109, u'chat': {u'all_members_are_administrators': True, u'type': u'group', u'id': -158164217, u'title': u'BOTdevel'}}, u'update_id': 837253572}]
+
+
+class TestStampy(TestCase):
+    def test_recordreplay(self):
+        cleanup.clean()
+        (handle, filename) = tempfile.mkstemp(suffix=".jsonl.gz")
+        os.close(handle)
+
+        # Each batch is appended to the file
+        stampy.replay.record(updates=updates[0:1], filename=filename)
+        stampy.replay.record(updates=updates[1:], filename=filename)
+        self.assertEqual(list(stampy.replay.readupdates(filename)), updates)
+
+        self.assertEqual(stampy.replay.replay(filename=filename), 2)
+        os.remove(filename)
+
+        # Replies were captured instead of sent
+        self.assertEqual(stampy.stampy.capture["calls"]["sendMessage"], 2)
+        self.assertFalse(stampy.stampy.capture["enabled"])
+
+    def test_scratchdatabase(self):
+        cleanup.clean()
+        stampy.plugin.config.setconfig('lastupdateid', 1000)
+        (handle, filename) = tempfile.mkstemp(suffix=".jsonl.gz")
+        os.close(handle)
+        (handle, database) = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        stampy.replay.record(updates=updates, filename=filename)
+        real = stampy.stampy.options.database
+        try:
+            self.assertEqual(stampy.replay.replay(filename=filename,
+                                                  database=database), 2)
+            self.assertEqual(stampy.stampy.options.database, real)
+
+            # Effects went to the copy
+            con = sqlite3.connect(database)
+            self.assertEqual(con.execute(
+                "SELECT value FROM karma WHERE word='replay'").fetchone(),
+                (2,))
+            con.close()
+
+            # The real database is left as it was
+            self.assertEqual(stampy.plugin.karma.getkarma('replay'), 0)
+            self.assertEqual(stampy.plugin.config.config('lastupdateid'),
+                             '1000')
+            self.assertEqual(stampy.stampy.dbsql(
+                "SELECT COUNT(*) FROM dedup").fetchone(), (0,))
+
+            # So the same file can be replayed again
+            self.assertEqual(stampy.replay.replay(filename=filename), 2)
+        finally:
+            os.remove(filename)
+            os.remove(database)
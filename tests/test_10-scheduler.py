@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import datetime
+import threading
+import time
+from unittest import TestCase
+
+import cleanup
+import stampy.metrics
+import stampy.scheduler
+import stampy.stampy
+
+runs = []
+
+
+def job():
+    runs.append(True)
+    return
+
+
+class TestStampy(TestCase):
+    def setUp(self):
+        cleanup.clean()
+        stampy.scheduler.shutdown()
+        stampy.scheduler.registry.clear()
+        stampy.stampy.dbsql("DELETE FROM jobs")
+
+    def tearDown(self):
+        stampy.scheduler.shutdown()
+        stampy.scheduler.registry.clear()
+        stampy.stampy.dbsql("DELETE FROM jobs")
+
+    def test_pending(self):
+        stampy.scheduler.add_job('testjob', job, 'interval', minutes=60)
+        # Nothing is scheduled until the scheduler is started
+        self.assertFalse(stampy.scheduler.running())
+        self.assertIn('testjob', stampy.scheduler.pending)
+
+        scheduler = stampy.scheduler.start()
+        self.assertTrue(stampy.scheduler.running())
+        self.assertEqual(stampy.scheduler.pending, {})
+        self.assertEqual([item.id for item in scheduler.get_jobs()],
+                         ['testjob'])
+        self.assertIs(stampy.scheduler.start(), scheduler)
+
+        # Jobs added later go straight to the scheduler
+        stampy.scheduler.add_job('otherjob', job, 'interval', minutes=30)
+        self.assertEqual(len(scheduler.get_jobs()), 2)
+
+    def test_sharedbounded(self):
+        stampy.scheduler.add_job('testjob', job, 'interval', minutes=60)
+        scheduler = stampy.scheduler.start()
+        job_defaults = scheduler._job_defaults
+        self.assertTrue(job_defaults["coalesce"])
+        self.assertEqual(job_defaults["max_instances"], 1)
+        self.assertEqual(scheduler._executors["default"]._pool._max_workers,
+                         2)
+
+    def test_cronjitter(self):
+        stampy.scheduler.add_job('testjob', job, 'cron', hour='11')
+        scheduler = stampy.scheduler.start()
+        self.assertEqual(scheduler.get_job('testjob').trigger.jitter, 300)
+
+    def test_persistent(self):
+        stampy.scheduler.add_job('testjob', job, 'interval', minutes=60)
+        scheduler = stampy.scheduler.start()
+        nextrun = scheduler.get_job('testjob').next_run_time
+        stampy.scheduler.shutdown()
+
+        # Stored job keeps its next run instead of starting over
+        cur = stampy.stampy.dbsql("SELECT id FROM jobs")
+        self.assertEqual(cur.fetchall(), [('testjob',)])
+        stampy.scheduler.add_job('testjob', job, 'interval', minutes=60)
+        scheduler = stampy.scheduler.start()
+        self.assertEqual(scheduler.get_job('testjob').next_run_time, nextrun)
+        stampy.scheduler.shutdown()
+
+        # But it's replaced when the trigger changed
+        stampy.scheduler.add_job('testjob', job, 'interval', minutes=5)
+        scheduler = stampy.scheduler.start()
+        self.assertEqual(str(scheduler.get_job('testjob').trigger),
+                         'interval[0:05:00]')
+
+    def test_stale(self):
+        stampy.scheduler.add_job('oldjob', job, 'interval', minutes=60)
+        stampy.scheduler.start()
+        stampy.scheduler.shutdown()
+        stampy.scheduler.registry.clear()
+
+        # Jobs stored for plugins no longer registering them are removed
+        stampy.scheduler.add_job('testjob', job, 'interval', minutes=60)
+        scheduler = stampy.scheduler.start()
+        self.assertEqual([item.id for item in scheduler.get_jobs()],
+                         ['testjob'])
+
+    def test_runjob(self):
+        stampy.metrics.reset()
+        del runs[:]
+        stampy.scheduler.add_job('testjob', job, 'interval', minutes=60)
+        stampy.scheduler.runjob('testjob')
+        stampy.scheduler.runjob('missingjob')
+        self.assertEqual(runs, [True])
+        self.assertEqual(stampy.metrics.gethistogram('job.testjob')["count"],
+                         1)
+        stampy.metrics.reset()
+
+    def test_shutdownwaits(self):
+        del runs[:]
+        started = threading.Event()
+
+        def slowjob():
+            started.set()
+            time.sleep(0.3)
+            runs.append(True)
+
+        stampy.scheduler.add_job('slowjob', slowjob, 'date',
+                                 run_date=datetime.datetime.now())
+        stampy.scheduler.start(persistent=False)
+        self.assertTrue(started.wait(5))
+        stampy.scheduler.shutdown(wait=True)
+        # Job finished before returning, as when exiting
+        self.assertEqual(runs, [True])
+        self.assertFalse(stampy.scheduler.running())
@@ -3,9 +3,109 @@
 
 from unittest import TestCase
 
+import cleanup
+import stampy.fakeapi
+import stampy.httpclient
+import stampy.plugin.config
 import stampy.stampy
 
 
 class TestStampy(TestCase):
     def test_sendmessage(self):
-        stampy.stampy.sendmessage(chat_id="-158164217", text="UT test")
+        cleanup.clean()
+        stampy.httpclient.reset()
+        fake = stampy.fakeapi.FakeAPI()
+        stampy.plugin.config.setconfig('url', fake.start())
+        try:
+            stampy.stampy.sendmessage(chat_id="-158164217", text="UT test")
+            self.assertEqual([args["text"] for (date, method, args) in
+                              fake.sent], ["UT test"])
+        finally:
+            stampy.httpclient.reset()
+            fake.stop()
+            cleanup.clean()
+
+    def test_splitshort(self):
+        text = "\n".join(["line %s" % i for i in range(100)])
+        # Many lines go in one message while they fit
+        self.assertEqual(stampy.stampy.splitmessage(text), [text])
+        self.assertEqual(stampy.stampy.splitmessage(""), [""])
+
+    def test_splitlines(self):
+        text = "\n".join(["line %s" % i for i in range(100)])
+        chunks = stampy.stampy.splitmessage(text, limit=100)
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        self.assertEqual("\n".join(chunks), text)
+
+    def test_splitlongline(self):
+        text = "a" * 250
+        chunks = stampy.stampy.splitmessage(text, limit=100)
+        self.assertEqual(chunks, ["a" * 100, "a" * 100, "a" * 50])
+
+        text = " ".join(["word"] * 50)
+        chunks = stampy.stampy.splitmessage(text, limit=100)
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        # Split at spaces, words are kept whole
+        self.assertTrue(all(set(chunk.split(" ")) == set(["word"]) for
+                            chunk in chunks))
+
+    def test_splitcodeblock(self):
+        text = "Title\n```%s```" % "\n".join(["| row %s |" % i for i in
+                                             range(50)])
+        chunks = stampy.stampy.splitmessage(text, limit=100, markdown=True)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk), 100)
+            # Each message has its code block closed
+            self.assertEqual(chunk.count("```") % 2, 0)
+        self.assertTrue(chunks[1].startswith("```\n| row"))
+
+    def test_splitinlinecode(self):
+        text = "`%s`" % " ".join(["word"] * 50)
+        chunks = stampy.stampy.splitmessage(text, limit=100, markdown=True)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk), 100)
+            self.assertTrue(chunk.startswith("`") and chunk.endswith("`"))
+
+    def test_splitbold(self):
+        text = "Top: *%s*" % " ".join(["word"] * 50)
+        chunks = stampy.stampy.splitmessage(text, limit=100, markdown=True)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk), 100)
+            self.assertEqual(stampy.stampy.markdownentity(chunk), "")
+            self.assertTrue(chunk.endswith("*"))
+        self.assertTrue(chunks[0].startswith("Top: *word"))
+        self.assertTrue(all(chunk.startswith("*word") for chunk in
+                            chunks[1:]))
+
+    def test_splitentities(self):
+        text = "_%s_\n" % "\n".join(["line %s" % i for i in range(20)])
+        text += "\n".join(["[link %s](http://example.com) `a*b_c`" % i for
+                           i in range(20)])
+        chunks = stampy.stampy.splitmessage(text, limit=100, markdown=True)
+        self.assertGreater(len(chunks), 2)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk), 100)
+            self.assertEqual(stampy.stampy.markdownentity(chunk), "")
+        # Italic spanning lines is closed and opened again
+        self.assertTrue(chunks[0].startswith("_line 0") and
+                        chunks[0].endswith("_"))
+        self.assertTrue(chunks[1].startswith("_line"))
+
+        # Escaped markers and markup inside code open nothing
+        self.assertEqual(stampy.stampy.markdownentity(r"2 \* 3 `*`"), "")
+        self.assertEqual(stampy.stampy.markdownentity("[a"), "[")
+        self.assertEqual(stampy.stampy.markdownentity("[a](http"), "(")
+
+    def test_sendlong(self):
+        text = "\n".join(["`word%s` now has `1` karma points." % i for i in
+                          range(200)])
+        stampy.stampy.capture["calls"].clear()
+        stampy.stampy.capture["enabled"] = True
+        try:
+            stampy.stampy.sendmessage(chat_id="-158164217", text=text,
+                                      parse_mode="Markdown")
+        finally:
+            stampy.stampy.capture["enabled"] = False
+        self.assertEqual(stampy.stampy.capture["calls"]["sendMessage"], 2)
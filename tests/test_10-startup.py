@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import __builtin__
+import sys
+from unittest import TestCase
+
+import stampy.plugins
+import stampy.startup
+
+
+class TestStampy(TestCase):
+    def test_pluginsloadedonce(self):
+        found = stampy.plugins.getPlugins()
+        self.assertIs(stampy.plugins.getPlugins(), found)
+        karma = [item for item in found if item["name"] == "karma"][0]
+        module = stampy.plugins.loadPlugin(karma)
+        self.assertIs(stampy.plugins.loadPlugin(karma), module)
+        self.assertIs(sys.modules["stampy.stampy.karma"], module)
+
+    def test_startupreport(self):
+        original = __builtin__.__import__
+        stampy.startup.install()
+        try:
+            self.assertTrue(stampy.startup.installed())
+            import wave
+            with stampy.startup.timed("plugin.test"):
+                pass
+        finally:
+            text = stampy.startup.report()
+        self.assertIs(__builtin__.__import__, original)
+        self.assertFalse(stampy.startup.installed())
+        self.assertIn("wave", stampy.startup.imports)
+        self.assertIn("plugin.test", text)
+        self.assertTrue(wave)
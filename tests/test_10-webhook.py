@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import json
+import urllib2
+from unittest import TestCase
+
+import cleanup
+import stampy.inbox
+import stampy.stampy
+import stampy.webhook
+
+update = {u'message': {u'date': 1478361249, u'text': u'hello webhook', u'from': {u'username': u'iranzo', u'first_name': u'Pablo', u'last_name': u'Iranzo G\xf3mez', u'id': 5812695}, u'message_id': 108, u'chat': {u'all_members_are_administrators': True, u'type': u'group', u'id': -158164217, u'title': u'BOTdevel'}}, u'update_id': 837253571}
+
+
+class TestStampy(TestCase):
+    cleanup.clean()
+    server = stampy.webhook.start(port=0, address="127.0.0.1",
+                                  secret="s3cr3t")
+    url = "http://127.0.0.1:%s" % server.server_address[1]
+
+    def post(self, path, data):
+        request = urllib2.Request(self.url + path, json.dumps(data),
+                                  {'Content-Type': 'application/json'})
+        return urllib2.urlopen(request, timeout=5)
+
+    def test_invalidpath(self):
+        with self.assertRaises(urllib2.HTTPError) as context:
+            self.post("/wrong", update)
+        self.assertEqual(context.exception.code, 404)
+
+    def test_receiveupdate(self):
+        self.assertEqual(self.post("/s3cr3t", update).getcode(), 200)
+        received = list(stampy.webhook.getupdates(timeout=5))
+        self.assertEqual(received, [update])
+
+    def test_processupdate(self):
+        cleanup.clean()
+        self.post("/s3cr3t", update)
+        self.assertEqual(stampy.stampy.process(
+                         stampy.webhook.getupdates(timeout=5)), 1)
+
+    def test_malformed(self):
+        for body in ['not json', json.dumps([1, 2]),
+                     json.dumps({"message": {}})]:
+            request = urllib2.Request(self.url + "/s3cr3t", body,
+                                      {'Content-Type': 'application/json'})
+            with self.assertRaises(urllib2.HTTPError) as context:
+                urllib2.urlopen(request, timeout=5)
+            self.assertEqual(context.exception.code, 400)
+
+    def test_inboxerror(self):
+        add = stampy.inbox.add
+
+        def failing(updates):
+            raise stampy.stampy.lite.OperationalError("database is locked")
+
+        stampy.inbox.add = failing
+        try:
+            with self.assertRaises(urllib2.HTTPError) as context:
+                self.post("/s3cr3t", update)
+        finally:
+            stampy.inbox.add = add
+        # Not answered with 200, so Telegram delivers it again
+        self.assertEqual(context.exception.code, 503)
+        self.assertEqual(list(stampy.webhook.getupdates(timeout=0.1)), [])
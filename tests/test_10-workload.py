@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import itertools
+import types
+from unittest import TestCase
+
+import cleanup
+import stampy.plugin.alias
+import stampy.plugin.autokarma
+import stampy.stampy
+import stampy.workload
+
+
+class TestStampy(TestCase):
+    def test_repeatable(self):
+        first = list(stampy.workload.updates(count=50, seed=1, date=1))
+        second = list(stampy.workload.updates(count=50, seed=1, date=1))
+        self.assertEqual(first, second)
+        self.assertEqual([update["update_id"] for update in first],
+                         range(1, 51))
+
+    def test_lazy(self):
+        updates = stampy.workload.updates(seed=1)
+        self.assertIsInstance(updates, types.GeneratorType)
+        self.assertEqual(len(list(itertools.islice(updates, 1000))), 1000)
+
+    def test_msgdetail(self):
+        for update in stampy.workload.updates(count=200, seed=1, channel=0.5):
+            msgdetail = stampy.stampy.getmsgdetail(update)
+            self.assertFalse(msgdetail["error"])
+            self.assertIn(msgdetail["type"], ["message", "channel_post"])
+            self.assertTrue(msgdetail["text"])
+
+    def test_mix(self):
+        texts = [stampy.stampy.getmsgdetail(update)["text"] for update in
+                 stampy.workload.updates(count=1000, seed=1, karma=1,
+                                         alias=0, rank=0, quote=0, all=0,
+                                         autokarma=0)]
+        for text in texts:
+            self.assertTrue(text.split()[0][-2:] in ["++", "--"])
+
+        # Most popular word gets most of the karma changes
+        words = [text.split()[0][:-2] for text in texts]
+        self.assertEqual(max(set(words), key=words.count),
+                         stampy.workload.getword(0))
+
+    def test_unknownsetting(self):
+        with self.assertRaises(KeyError):
+            stampy.workload.getmix(unknown=1)
+
+    def test_setup(self):
+        cleanup.clean()
+        stampy.workload.setup(aliases=2, autokeys=2)
+        self.assertEqual(stampy.plugin.alias.getalias("alias1"),
+                         stampy.workload.getword(1))
+        self.assertEqual(stampy.plugin.autokarma.getautok("autok0"),
+                         [stampy.workload.getword(0)])
+        cleanup.clean()